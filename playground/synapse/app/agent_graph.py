@@ -0,0 +1,80 @@
+import json
+import uuid
+import hashlib
+
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+
+@dataclass(frozen=True)
+class AgentNode:
+    id: uuid.UUID
+    name: str
+    description: str
+    instructions: str
+    model: str
+    model_settings: Mapping[str, Any]
+    sub_agents: Tuple[uuid.UUID, ...]
+    generation: int = 0
+
+@dataclass(frozen=True)
+class AgentGraph:
+    root_id: uuid.UUID
+    nodes: Mapping[uuid.UUID, AgentNode]
+    order: Tuple[uuid.UUID, ...]
+
+    @property
+    def root(self) -> AgentNode:
+        return self.nodes[self.root_id]
+
+    def sub_agents(self, agent_id: uuid.UUID) -> Tuple[AgentNode, ...]:
+        return tuple(self.nodes[sub_agent_id] for sub_agent_id in self.nodes[agent_id].sub_agents)
+
+    @property
+    def generations(self) -> Dict[uuid.UUID, int]:
+        return {node.id: node.generation for node in self.nodes.values()}
+
+    def __contains__(self, agent_id: uuid.UUID) -> bool:
+        return agent_id in self.nodes
+
+    def __iter__(self) -> Iterator[AgentNode]:
+        return (self.nodes[agent_id] for agent_id in self.order)
+
+def fingerprint(graph: AgentGraph) -> str:
+    payload = [
+        [str(node.id), node.instructions, node.model, dict(node.model_settings), [str(sub_agent_id) for sub_agent_id in node.sub_agents]]
+        for node in graph
+    ]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+def compile_graph(root_id: uuid.UUID, nodes: List[AgentNode]) -> AgentGraph:
+    index: Dict[uuid.UUID, AgentNode] = {node.id: node for node in nodes}
+    if root_id not in index:
+        raise ValueError(f"Agent {root_id} not found")
+    order: List[uuid.UUID] = []
+    state: Dict[uuid.UUID, int] = {}
+    path: List[uuid.UUID] = []
+
+    def visit(agent_id: uuid.UUID):
+        if state.get(agent_id) == 2:
+            return
+        if state.get(agent_id) == 1:
+            cycle = path[path.index(agent_id):] + [agent_id]
+            raise ValueError("Agent graph contains a cycle: " + " -> ".join(map(str, cycle)))
+        node: Optional[AgentNode] = index.get(agent_id)
+        if node is None:
+            raise ValueError(f"Agent {agent_id} not found")
+        state[agent_id] = 1
+        path.append(agent_id)
+        for sub_agent_id in node.sub_agents:
+            visit(sub_agent_id)
+        path.pop()
+        state[agent_id] = 2
+        order.append(agent_id)
+
+    visit(root_id)
+    return AgentGraph(
+        root_id=root_id,
+        nodes=MappingProxyType({agent_id: index[agent_id] for agent_id in order}),
+        order=tuple(reversed(order))
+    )
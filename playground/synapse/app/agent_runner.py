@@ -0,0 +1,213 @@
+import time
+import uuid
+import asyncio
+
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional, Tuple
+from openai import AsyncOpenAI
+
+from .agent_graph import AgentGraph, AgentNode
+from .settings import settings
+
+AgentEvent = Tuple[str, Dict[str, Any]]
+
+class AgentRun:
+
+    def __init__(
+        self,
+        runner: "AgentRunner",
+        graph: AgentGraph,
+        input: str,
+        history: List[Dict[str, str]],
+        context: Optional[Awaitable[Optional[str]]],
+        stream_sub_agents: bool
+    ):
+        self.runner = runner
+        self.graph = graph
+        self.input = input
+        self.history = history
+        self.context = context
+        self.stream_sub_agents = stream_sub_agents
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.tasks: Dict[uuid.UUID, asyncio.Task] = {}
+        self.started = time.perf_counter()
+        self.sequential = 0.0
+
+    def elapsed_ms(self, since: Optional[float] = None) -> float:
+        return ((since or time.perf_counter()) - self.started) * 1000
+
+    async def execute(self):
+        retrieval = asyncio.ensure_future(self.context) if self.context is not None else None
+        try:
+            fanout_started = time.perf_counter()
+            inputs = await self._sub_agents(self.graph.root)
+            fanout = time.perf_counter() - fanout_started
+            context = None
+            if retrieval is not None:
+                try:
+                    context = await retrieval
+                    self.queue.put_nowait(("context", {"status": "ok", "elapsed_ms": self.elapsed_ms()}))
+                except Exception as e:
+                    self.queue.put_nowait(("context", {"status": "error", "error": str(e)}))
+            messages = self.runner.messages(self.graph.root, self.input, inputs, context, self.history)
+            _, ttft = await self.runner.call(self.graph.root, messages, self.queue, stream=True)
+            latency = self.elapsed_ms()
+            self.runner.record(self.elapsed_ms(ttft) if ttft else None, latency)
+            self.queue.put_nowait(("done", {
+                "agent_id": str(self.graph.root_id),
+                "ttft_ms": self.elapsed_ms(ttft) if ttft else None,
+                "latency_ms": latency,
+                "fanout_ms": fanout * 1000,
+                "sequential_ms": self.sequential * 1000,
+                "sub_agents": len(self.tasks),
+            }))
+        except Exception as e:
+            self.runner.errors += 1
+            self.queue.put_nowait(("error", {"agent_id": str(self.graph.root_id), "error": str(e) or type(e).__name__}))
+        finally:
+            for task in self.tasks.values():
+                task.cancel()
+            if retrieval is not None:
+                retrieval.cancel()
+            self.queue.put_nowait(None)
+
+    async def _sub_agents(self, node: AgentNode) -> List[Tuple[AgentNode, str]]:
+        for sub_agent_id in node.sub_agents:
+            if sub_agent_id not in self.tasks:
+                self.tasks[sub_agent_id] = asyncio.create_task(self._sub_agent(self.graph.nodes[sub_agent_id]))
+        results = await asyncio.gather(*(self.tasks[sub_agent_id] for sub_agent_id in node.sub_agents))
+        return [(self.graph.nodes[sub_agent_id], output) for sub_agent_id, output in zip(node.sub_agents, results) if output is not None]
+
+    async def _sub_agent(self, node: AgentNode) -> Optional[str]:
+        inputs = await self._sub_agents(node)
+        started = time.perf_counter()
+        try:
+            output, ttft = await self.runner.call(
+                node,
+                self.runner.messages(node, self.input, inputs),
+                self.queue,
+                stream=self.stream_sub_agents
+            )
+        except asyncio.TimeoutError:
+            self.runner.timeouts += 1
+            self.queue.put_nowait(("agent", {"agent_id": str(node.id), "name": node.name, "status": "timeout"}))
+            return None
+        except Exception as e:
+            self.runner.errors += 1
+            self.queue.put_nowait(("agent", {"agent_id": str(node.id), "name": node.name, "status": "error", "error": str(e)}))
+            return None
+        latency = time.perf_counter() - started
+        self.sequential += latency
+        self.queue.put_nowait(("agent", {
+            "agent_id": str(node.id),
+            "name": node.name,
+            "status": "ok",
+            "ttft_ms": (ttft - started) * 1000 if ttft else None,
+            "latency_ms": latency * 1000,
+        }))
+        return output
+
+class AgentRunner:
+
+    def __init__(self, max_concurrency: int = 8, timeout: float = 60.0):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.client: Optional[AsyncOpenAI] = None
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.runs = 0
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.total_ttft = 0.0
+        self.max_ttft = 0.0
+        self.total_latency = 0.0
+
+    def messages(
+        self,
+        node: AgentNode,
+        input: str,
+        inputs: List[Tuple[AgentNode, str]],
+        context: Optional[str] = None,
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> List[Dict[str, str]]:
+        content = input
+        if inputs:
+            content += "\n\nResults from sub-agents:\n\n" + "\n\n".join(
+                f"### {sub_agent.name}\n{output}" for sub_agent, output in inputs
+            )
+        if context:
+            content += "\n\nRelevant knowledge:\n\n" + context
+        return [
+            {"role": "system", "content": node.instructions},
+            *(history or []),
+            {"role": "user", "content": content},
+        ]
+
+    async def call(
+        self,
+        node: AgentNode,
+        messages: List[Dict[str, str]],
+        queue: asyncio.Queue,
+        stream: bool
+    ) -> Tuple[str, Optional[float]]:
+        self.client = self.client or AsyncOpenAI()
+        self.semaphore = self.semaphore or asyncio.Semaphore(self.max_concurrency)
+        async with self.semaphore:
+            self.calls += 1
+            ttft = None
+            parts = []
+            async with asyncio.timeout(self.timeout):
+                response = await self.client.chat.completions.create(
+                    model=node.model,
+                    messages=messages,
+                    stream=True,
+                    **node.model_settings
+                )
+                async for chunk in response:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if not delta:
+                        continue
+                    ttft = ttft or time.perf_counter()
+                    parts.append(delta)
+                    if stream:
+                        queue.put_nowait(("token", {"agent_id": str(node.id), "content": delta}))
+            return "".join(parts), ttft
+
+    def record(self, ttft_ms: Optional[float], latency_ms: float):
+        self.runs += 1
+        self.total_latency += latency_ms
+        if ttft_ms is not None:
+            self.total_ttft += ttft_ms
+            self.max_ttft = max(self.max_ttft, ttft_ms)
+
+    async def run(
+        self,
+        graph: AgentGraph,
+        input: str,
+        history: Optional[List[Dict[str, str]]] = None,
+        context: Optional[Awaitable[Optional[str]]] = None,
+        stream_sub_agents: bool = False
+    ) -> AsyncIterator[AgentEvent]:
+        run = AgentRun(self, graph, input, history or [], context, stream_sub_agents)
+        task = asyncio.create_task(run.execute())
+        try:
+            yield "start", {"agent_id": str(graph.root_id), "agents": len(graph.nodes)}
+            while (event := await run.queue.get()) is not None:
+                yield event
+        finally:
+            task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "avg_ttft_ms": self.total_ttft / self.runs if self.runs else 0.0,
+            "max_ttft_ms": self.max_ttft,
+            "avg_latency_ms": self.total_latency / self.runs if self.runs else 0.0,
+        }
+
+runner = AgentRunner(
+    max_concurrency=settings.AGENT_MAX_CONCURRENCY,
+    timeout=settings.AGENT_CALL_TIMEOUT
+)
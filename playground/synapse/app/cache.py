@@ -0,0 +1,237 @@
+import re
+import time
+import unicodedata
+
+import numpy as np
+
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, Hashable, List, Optional, Sequence, Tuple
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+
+class LRUCache:
+
+    def __init__(self, max_size: int, ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self.data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        expires_at, value = entry
+        if expires_at and expires_at < time.monotonic():
+            del self.data[key]
+            self.misses += 1
+            return default
+        self.data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        expires_at = time.monotonic() + self.ttl if self.ttl else 0.0
+        self.data[key] = (expires_at, value)
+        self.data.move_to_end(key)
+        while len(self.data) > self.max_size:
+            self.data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self.data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def discard(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        keys = [key for key, (_, value) in self.data.items() if predicate(key, value)]
+        for key in keys:
+            del self.data[key]
+        return len(keys)
+
+    def clear(self):
+        self.data.clear()
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+class ResultCache:
+
+    def __init__(self, max_size: int, ttl: Optional[float] = None):
+        self.entries = LRUCache(max_size, ttl)
+        self.saved_seconds = 0.0
+
+    def get(self, key: Hashable) -> Any:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        value, cost = entry
+        self.saved_seconds += cost
+        return value
+
+    def set(self, key: Hashable, value: Any, cost: float):
+        self.entries.set(key, (value, cost))
+
+    def stats(self) -> dict:
+        return {**self.entries.stats(), "saved_seconds": self.saved_seconds}
+
+class SemanticPartition:
+
+    def __init__(self, version: Hashable, dimensions: int, tags: FrozenSet[Hashable]):
+        self.version = version
+        self.tags = tags
+        self.vectors = np.empty((16, dimensions), dtype=np.float32)
+        self.expires = np.empty(16, dtype=np.float64)
+        self.ids: List[int] = []
+        self.positions: Dict[int, int] = {}
+
+    def nearest(self, qemb: np.ndarray, now: float) -> Tuple[Optional[int], float]:
+        if not self.ids:
+            return None, 0.0
+        similarities = self.vectors[:len(self.ids)] @ qemb
+        similarities[self.expires[:len(self.ids)] < now] = -np.inf
+        i = int(np.argmax(similarities))
+        return self.ids[i], float(similarities[i])
+
+    def expired(self, now: float) -> List[int]:
+        return [self.ids[i] for i in np.flatnonzero(self.expires[:len(self.ids)] < now)]
+
+    def add(self, entry_id: int, qemb: np.ndarray, expires_at: float):
+        if len(self.ids) == len(self.vectors):
+            self.vectors = np.concatenate([self.vectors, np.empty_like(self.vectors)])
+            self.expires = np.concatenate([self.expires, np.empty_like(self.expires)])
+        self.positions[entry_id] = len(self.ids)
+        self.vectors[len(self.ids)] = qemb
+        self.expires[len(self.ids)] = expires_at
+        self.ids.append(entry_id)
+
+    def remove(self, entry_id: int):
+        i = self.positions.pop(entry_id)
+        last = self.ids.pop()
+        if last != entry_id:
+            self.vectors[i] = self.vectors[len(self.ids)]
+            self.expires[i] = self.expires[len(self.ids)]
+            self.ids[i] = last
+            self.positions[last] = i
+
+class SemanticCache:
+
+    def __init__(self, max_size: int, ttl: Optional[float] = None, threshold: float = 0.95):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self.partitions: Dict[Hashable, SemanticPartition] = {}
+        self.entries: OrderedDict[int, Tuple[Hashable, Any, float]] = OrderedDict()
+        self.next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.saved_seconds = 0.0
+
+    def normalize(self, qemb: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(qemb, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def partition(self, key: Hashable, version: Hashable) -> Optional[SemanticPartition]:
+        partition = self.partitions.get(key)
+        if partition is not None and partition.version != version:
+            self.discard(key)
+            self.invalidations += 1
+            return None
+        return partition
+
+    def get(self, key: Hashable, version: Hashable, qemb: Sequence[float]) -> Optional[Tuple[Any, float]]:
+        partition = self.partition(key, version)
+        vector = self.normalize(qemb)
+        if partition is None or partition.vectors.shape[1] != len(vector):
+            self.misses += 1
+            return None
+        entry_id, similarity = partition.nearest(vector, time.monotonic())
+        if entry_id is None or similarity < self.threshold:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(entry_id)
+        _, value, cost = self.entries[entry_id]
+        self.hits += 1
+        self.saved_seconds += cost
+        return value, similarity
+
+    def set(
+        self,
+        key: Hashable,
+        version: Hashable,
+        qemb: Sequence[float],
+        value: Any,
+        cost: float,
+        tags: FrozenSet[Hashable] = frozenset()
+    ):
+        now = time.monotonic()
+        vector = self.normalize(qemb)
+        partition = self.partition(key, version)
+        if partition is not None and partition.vectors.shape[1] != len(vector):
+            self.discard(key)
+            partition = None
+        if partition is None:
+            partition = self.partitions[key] = SemanticPartition(version, len(vector), tags)
+        for entry_id in partition.expired(now):
+            partition.remove(entry_id)
+            del self.entries[entry_id]
+        entry_id = self.next_id
+        self.next_id += 1
+        partition.add(entry_id, vector, now + self.ttl if self.ttl else np.inf)
+        self.entries[entry_id] = (key, value, cost)
+        while len(self.entries) > self.max_size:
+            evicted, (evicted_key, _, _) = self.entries.popitem(last=False)
+            self.partitions[evicted_key].remove(evicted)
+            if not self.partitions[evicted_key].ids:
+                del self.partitions[evicted_key]
+            self.evictions += 1
+
+    def discard(self, key: Hashable):
+        partition = self.partitions.pop(key, None)
+        if partition is not None:
+            for entry_id in partition.ids:
+                del self.entries[entry_id]
+
+    def invalidate(self, tag: Hashable):
+        for key, partition in list(self.partitions.items()):
+            if tag in partition.tags:
+                self.discard(key)
+                self.invalidations += 1
+
+    def clear(self):
+        self.partitions.clear()
+        self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "partitions": len(self.partitions),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "saved_seconds": self.saved_seconds,
+        }
@@ -0,0 +1,93 @@
+import re
+
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Iterator, Tuple
+
+from .settings import settings
+from .tokenizer import count_tokens
+
+PARAGRAPH = re.compile(r"\n[ \t]*\n\s*")
+SENTENCE = re.compile(r"(?<=[.!?;:])\s+")
+WORD = re.compile(r"\S+")
+
+@dataclass
+class Chunk:
+    index: int
+    start: int
+    end: int
+    content: str
+    tokens: int
+
+def spans(text: str, pattern: re.Pattern, start: int, end: int) -> Iterator[Tuple[int, int, bool]]:
+    previous = None
+    position = start
+    for match in pattern.finditer(text, start, end):
+        if match.start() > position:
+            if previous:
+                yield previous + (False,)
+            previous = (position, match.start())
+        position = match.end()
+    if end > position:
+        if previous:
+            yield previous + (False,)
+        previous = (position, end)
+    if previous:
+        yield previous + (True,)
+
+def pieces(text: str, start: int, end: int, max_tokens: int) -> Iterator[Tuple[int, int, int]]:
+    tokens = count_tokens(text[start:end])
+    if tokens <= max_tokens or end - start <= 1:
+        yield start, end, tokens
+        return
+    middle = (start + end) // 2
+    yield from pieces(text, start, middle, max_tokens)
+    yield from pieces(text, middle, end, max_tokens)
+
+def units(text: str, max_tokens: int) -> Iterator[Tuple[int, int, int, bool]]:
+    for paragraph_start, paragraph_end, _ in spans(text, PARAGRAPH, 0, len(text)):
+        for start, end, last in spans(text, SENTENCE, paragraph_start, paragraph_end):
+            tokens = count_tokens(text[start:end])
+            if tokens <= max_tokens:
+                yield start, end, tokens, last
+                continue
+            position = start
+            for word in WORD.finditer(text, start, end):
+                word_tokens = count_tokens(text[position:word.end()])
+                position = word.end()
+                if word_tokens <= max_tokens:
+                    yield word.start(), word.end(), word_tokens, last and word.end() == end
+                    continue
+                for piece_start, piece_end, piece_tokens in pieces(text, word.start(), word.end(), max_tokens):
+                    yield piece_start, piece_end, piece_tokens, last and piece_end == end
+
+def chunk_text(
+    text: str,
+    max_tokens: int = settings.CHUNK_MAX_TOKENS,
+    overlap: int = settings.CHUNK_OVERLAP_TOKENS
+) -> Iterator[Chunk]:
+    if overlap >= max_tokens:
+        raise ValueError("Chunk overlap must be smaller than the chunk size")
+    window: Deque[Tuple[int, int, int]] = deque()
+    tokens = 0
+    index = 0
+    fresh = False
+    for start, end, size, paragraph_end in units(text, max_tokens):
+        if window and tokens + size > max_tokens:
+            if fresh:
+                yield Chunk(index, window[0][0], window[-1][1], text[window[0][0]:window[-1][1]], tokens)
+                index += 1
+            while window and (tokens > overlap or tokens + size > max_tokens):
+                tokens -= window.popleft()[2]
+            fresh = False
+        window.append((start, end, size))
+        tokens += size
+        fresh = True
+        if paragraph_end and tokens >= max_tokens // 2:
+            yield Chunk(index, window[0][0], window[-1][1], text[window[0][0]:window[-1][1]], tokens)
+            index += 1
+            window.clear()
+            tokens = 0
+            fresh = False
+    if window and fresh:
+        yield Chunk(index, window[0][0], window[-1][1], text[window[0][0]:window[-1][1]], tokens)
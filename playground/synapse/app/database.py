@@ -1,24 +1,100 @@
-from typing import AsyncGenerator
+import time
+import itertools
 
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from typing import AsyncGenerator, List
+
+from pgvector.psycopg import register_vector_async
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
+from .metrics import observe, phase_seconds
 from .settings import settings
 
-engine = create_async_engine(
-    settings.DATABASE_URL, 
-    echo=settings.ECHO_SQL,
-    future=True
-)
+class InstrumentedPool(AsyncAdaptedQueuePool):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            wait = time.perf_counter() - started
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            observe(phase_seconds, wait, "pool", "checkout")
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size(),
+            "checked_in": self.checkedin(),
+            "checked_out": self.checkedout(),
+            "overflow": self.overflow(),
+            "checkouts": self.checkouts,
+            "avg_wait_ms": self.total_wait * 1000 / self.checkouts if self.checkouts else 0.0,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+def build_engine(url: str) -> AsyncEngine:
+    engine = create_async_engine(
+        url,
+        echo=settings.ECHO_SQL,
+        future=True,
+        poolclass=InstrumentedPool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args={
+            "prepare_threshold": None if settings.DB_PGBOUNCER else settings.DB_PREPARE_THRESHOLD
+        }
+    )
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        dbapi_connection.run_async(register_vector_async)
+
+    return engine
+
+engine = build_engine(settings.DATABASE_URL)
+
+replica_engines: List[AsyncEngine] = [build_engine(url) for url in settings.DATABASE_REPLICA_URLS]
 
 AsyncSessionLocal = sessionmaker(
-    engine, 
-    class_=AsyncSession, 
+    engine,
+    class_=AsyncSession,
     expire_on_commit=False,
     autoflush=False,
     autocommit=False
 )
 
+ReadSessionLocals = itertools.cycle([
+    sessionmaker(
+        replica_engine,
+        class_=AsyncSession,
+        expire_on_commit=False,
+        autoflush=False,
+        autocommit=False
+    )
+    for replica_engine in replica_engines
+] or [AsyncSessionLocal])
+
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
     async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+async def get_read_session() -> AsyncGenerator[AsyncSession, None]:
+    async with next(ReadSessionLocals)() as session:
+        yield session
+
+def pool_stats() -> List[dict]:
+    engines = [("primary", engine)] + [(f"replica-{i}", replica_engine) for i, replica_engine in enumerate(replica_engines)]
+    return [{"name": name, **engine.sync_engine.pool.stats()} for name, engine in engines]
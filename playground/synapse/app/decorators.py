@@ -1,10 +1,15 @@
 from functools import wraps
 from sqlalchemy.ext.asyncio import AsyncSession
 
-def transactional(fn):
-    @wraps(fn)
-    async def wrapper(self, *args, **kwargs):
-        session: AsyncSession = getattr(self, "session")
-        async with session.begin():
-            return await fn(self, *args, **kwargs)
-    return wrapper
+from .metrics import span
+
+def transactional(fn=None, *, session: str = "session"):
+    def decorator(fn):
+        @wraps(fn)
+        async def wrapper(self, *args, **kwargs):
+            current: AsyncSession = getattr(self, session)
+            with span("transaction", fn.__qualname__):
+                async with current.begin():
+                    return await fn(self, *args, **kwargs)
+        return wrapper
+    return decorator(fn) if fn else decorator
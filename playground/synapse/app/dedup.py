@@ -0,0 +1,91 @@
+import re
+import uuid
+import hashlib
+
+import numpy as np
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from .settings import settings
+
+WORD = re.compile(r"\w+")
+PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+@dataclass
+class Signature:
+    values: np.ndarray
+    bands: List[int]
+
+    def similarity(self, other: np.ndarray) -> float:
+        return float(np.mean(self.values == other))
+
+class MinHash:
+
+    def __init__(self, num_perm: int = 128, bands: int = 16, shingle_size: int = 5, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+        self.num_perm = num_perm
+        self.num_bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def shingles(self, text: str) -> List[str]:
+        words = WORD.findall(text.lower())
+        if len(words) <= self.shingle_size:
+            return [" ".join(words)]
+        return [" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)]
+
+    def values(self, text: str) -> np.ndarray:
+        hashes = np.fromiter(
+            (
+                int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little")
+                for shingle in set(self.shingles(text))
+            ),
+            dtype=np.uint64
+        )
+        permuted = (np.outer(hashes, self.a) + self.b) % PRIME & MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def bands(self, knowledge_group_id: uuid.UUID, values: np.ndarray) -> List[int]:
+        return [
+            int.from_bytes(
+                hashlib.blake2b(
+                    knowledge_group_id.bytes + band.to_bytes(2, "little") + values[band * self.rows:(band + 1) * self.rows].tobytes(),
+                    digest_size=8
+                ).digest(),
+                "little",
+                signed=True
+            )
+            for band in range(self.num_bands)
+        ]
+
+    def signature(self, knowledge_group_id: uuid.UUID, text: str) -> Signature:
+        values = self.values(text)
+        return Signature(values, self.bands(knowledge_group_id, values))
+
+class SignatureIndex:
+
+    def __init__(self):
+        self.values: Dict[uuid.UUID, np.ndarray] = {}
+        self.buckets: Dict[int, List[uuid.UUID]] = {}
+
+    def add(self, document_id: uuid.UUID, signature: Signature):
+        self.values[document_id] = signature.values
+        for band in signature.bands:
+            self.buckets.setdefault(band, []).append(document_id)
+
+    def match(self, signature: Signature, threshold: float) -> Optional[Tuple[uuid.UUID, float]]:
+        best = None
+        candidates = {document_id for band in signature.bands for document_id in self.buckets.get(band, ())}
+        for document_id in candidates:
+            similarity = signature.similarity(self.values[document_id])
+            if similarity >= threshold and (best is None or similarity > best[1]):
+                best = (document_id, similarity)
+        return best
+
+minhash = MinHash(settings.DEDUP_NUM_PERM, settings.DEDUP_BANDS, settings.DEDUP_SHINGLE_SIZE)
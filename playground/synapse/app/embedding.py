@@ -0,0 +1,441 @@
+import time
+import asyncio
+import hashlib
+
+import numpy as np
+
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Protocol, Tuple
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from openai import AsyncOpenAI
+
+try:
+    import onnxruntime
+    from tokenizers import Tokenizer
+except ImportError:
+    onnxruntime = None
+
+from .cache import LRUCache, normalize_text
+from .settings import settings
+from .database import AsyncSessionLocal
+from .metrics import batch_sizes, observe, span
+from .repositories.embedding_cache import EmbeddingCacheRepository
+
+class EmbeddingProvider(Protocol):
+    name: str
+    model: str
+    dimensions: int
+
+    async def embed(self, texts: List[str]) -> List[List[float]]: ...
+
+    async def close(self): ...
+
+class OpenAIEmbeddingProvider:
+
+    def __init__(self, model: str, dimensions: int):
+        self.name = "openai"
+        self.model = model
+        self.dimensions = dimensions
+        self.client: Optional[AsyncOpenAI] = None
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        self.client = self.client or AsyncOpenAI()
+        response = await self.client.embeddings.create(model=self.model, input=texts)
+        return [data.embedding for data in response.data]
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+
+def load_onnx(path: Path, max_length: int) -> Tuple[Any, Any, List[str]]:
+    if onnxruntime is None:
+        raise RuntimeError("ONNX models require onnxruntime and tokenizers")
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = 1
+    session = onnxruntime.InferenceSession(str(path / "model.onnx"), options, providers=["CPUExecutionProvider"])
+    tokenizer = Tokenizer.from_file(str(path / "tokenizer.json"))
+    tokenizer.enable_truncation(max_length=max_length)
+    tokenizer.enable_padding()
+    return session, tokenizer, [item.name for item in session.get_inputs()]
+
+def onnx_feed(encodings: List[Any]) -> Dict[str, np.ndarray]:
+    return {
+        "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+        "attention_mask": np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64),
+        "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64),
+    }
+
+class LocalEmbeddingProvider:
+
+    def __init__(self, path: str, dimensions: int, max_length: int = 256, max_workers: int = 4):
+        if onnxruntime is None:
+            raise RuntimeError("ONNX models require onnxruntime and tokenizers")
+        self.name = "local"
+        self.path = Path(path)
+        self.model = f"local:{self.path.name}"
+        self.dimensions = dimensions
+        self.max_length = max_length
+        self.max_workers = max_workers
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.session = None
+        self.tokenizer = None
+        self.inputs: List[str] = []
+
+    def load(self):
+        if self.session is None:
+            self.session, self.tokenizer, self.inputs = load_onnx(self.path, self.max_length)
+
+    def infer(self, texts: List[str]) -> List[List[float]]:
+        self.load()
+        encodings = self.tokenizer.encode_batch(texts)
+        feed = onnx_feed(encodings)
+        [output, *_] = self.session.run(None, {name: feed[name] for name in self.inputs})
+        if output.ndim == 3:
+            weights = feed["attention_mask"][:, :, None].astype(np.float32)
+            output = (output * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        output = output / np.maximum(np.linalg.norm(output, axis=1, keepdims=True), 1e-12)
+        return output.astype(np.float32).tolist()
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="embed")
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.infer, texts)
+
+    async def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+@dataclass
+class EmbeddingRequest:
+    texts: List[str]
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+class EmbeddingScheduler:
+
+    def __init__(
+        self,
+        provider: EmbeddingProvider,
+        max_batch_size: int = 256,
+        max_wait_ms: float = 5.0,
+        max_concurrency: int = 4,
+        max_pending: int = 1024
+    ):
+        self.provider = provider
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.queue: Optional[asyncio.Queue] = None
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.worker: Optional[asyncio.Task] = None
+        self.flushes: set[asyncio.Task] = set()
+        self.batches = 0
+        self.requests = 0
+        self.texts = 0
+        self.errors = 0
+        self.max_batch = 0
+        self.total_wait = 0.0
+        self.max_wait_seen = 0.0
+        self.total_call = 0.0
+
+    async def start(self):
+        if self.worker is not None:
+            return
+        self.queue = asyncio.Queue(maxsize=self.max_pending)
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.worker is None:
+            return
+        self.worker.cancel()
+        try:
+            await self.worker
+        except asyncio.CancelledError:
+            pass
+        self.worker = None
+        if self.flushes:
+            await asyncio.gather(*self.flushes, return_exceptions=True)
+        while not self.queue.empty():
+            request = self.queue.get_nowait()
+            if not request.future.done():
+                request.future.set_exception(RuntimeError("Embedding scheduler stopped"))
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        await self.start()
+        loop = asyncio.get_running_loop()
+        futures = []
+        for i in range(0, len(texts), self.max_batch_size):
+            request = EmbeddingRequest(texts[i:i + self.max_batch_size], loop.create_future())
+            await self.queue.put(request)
+            futures.append(request.future)
+        embeddings = []
+        for part in await asyncio.gather(*futures):
+            embeddings.extend(part)
+        return embeddings
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            size = len(batch[0].texts)
+            deadline = loop.time() + self.max_wait
+            try:
+                while size < self.max_batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        request = await asyncio.wait_for(self.queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                    batch.append(request)
+                    if size + len(request.texts) > self.max_batch_size:
+                        await self.semaphore.acquire()
+                        self._dispatch(batch[:-1])
+                        batch, size = batch[-1:], 0
+                    size += len(request.texts)
+                await self.semaphore.acquire()
+            except asyncio.CancelledError:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(RuntimeError("Embedding scheduler stopped"))
+                raise
+            self._dispatch(batch)
+
+    def _dispatch(self, batch: List[EmbeddingRequest]):
+        task = asyncio.create_task(self._flush(batch))
+        self.flushes.add(task)
+        task.add_done_callback(self.flushes.discard)
+
+    async def _flush(self, batch: List[EmbeddingRequest]):
+        started = time.perf_counter()
+        texts = [text for request in batch for text in request.texts]
+        observe(batch_sizes, len(texts), "embedding_call")
+        try:
+            with span("embedding", "provider_call"):
+                embeddings = await self.provider.embed(texts)
+        except Exception as e:
+            self.errors += 1
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+        finally:
+            self.semaphore.release()
+        finished = time.perf_counter()
+        offset = 0
+        for request in batch:
+            wait = started - request.enqueued_at
+            self.total_wait += wait
+            self.max_wait_seen = max(self.max_wait_seen, wait)
+            if not request.future.done():
+                request.future.set_result(embeddings[offset:offset + len(request.texts)])
+            offset += len(request.texts)
+        self.batches += 1
+        self.requests += len(batch)
+        self.texts += len(texts)
+        self.max_batch = max(self.max_batch, len(texts))
+        self.total_call += finished - started
+
+    def stats(self) -> dict:
+        return {
+            "model": self.provider.model,
+            "batches": self.batches,
+            "requests": self.requests,
+            "texts": self.texts,
+            "errors": self.errors,
+            "pending": self.queue.qsize() if self.queue else 0,
+            "in_flight": len(self.flushes),
+            "avg_batch_size": self.texts / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch,
+            "avg_wait_ms": self.total_wait * 1000 / self.requests if self.requests else 0.0,
+            "max_wait_ms": self.max_wait_seen * 1000,
+            "avg_call_ms": self.total_call * 1000 / self.batches if self.batches else 0.0,
+        }
+
+
+class EmbeddingCache:
+
+    def __init__(
+        self,
+        model: str,
+        max_size: int,
+        ttl: Optional[float] = None,
+        persistent: bool = False,
+        persistent_ttl: Optional[float] = None,
+        purge_interval: float = 3600.0
+    ):
+        self.model = model
+        self.memory = LRUCache(max_size, ttl)
+        self.persistent = persistent
+        self.persistent_ttl = persistent_ttl
+        self.purge_interval = purge_interval
+        self.purged_at = time.monotonic()
+        self.persistent_hits = 0
+        self.purged = 0
+        self.misses = 0
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+    async def embed(
+        self,
+        texts: List[str],
+        embed: Callable[[List[str]], Awaitable[List[List[float]]]]
+    ) -> List[List[float]]:
+        keys = [self.key(text) for text in texts]
+        found: Dict[str, List[float]] = {}
+        for key in set(keys):
+            embedding = self.memory.get((self.model, key))
+            if embedding is not None:
+                found[key] = embedding.tolist()
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing and self.persistent:
+            async with AsyncSessionLocal() as session:
+                stored = await EmbeddingCacheRepository(session).get_many(self.model, missing, self.persistent_ttl)
+            for key, embedding in stored.items():
+                self.memory.set((self.model, key), embedding)
+                found[key] = embedding.tolist()
+            self.persistent_hits += len(stored)
+            missing = [key for key in missing if key not in stored]
+        if missing:
+            self.misses += len(missing)
+            index = {key: i for i, key in reversed(list(enumerate(keys)))}
+            computed = dict(zip(missing, await embed([texts[index[key]] for key in missing])))
+            vectors = {key: np.asarray(embedding, dtype=np.float32) for key, embedding in computed.items()}
+            for key, vector in vectors.items():
+                self.memory.set((self.model, key), vector)
+            if self.persistent:
+                async with AsyncSessionLocal() as session, session.begin():
+                    repository = EmbeddingCacheRepository(session)
+                    await repository.put_many(self.model, vectors)
+                    if self.persistent_ttl and time.monotonic() - self.purged_at >= self.purge_interval:
+                        self.purged_at = time.monotonic()
+                        self.purged += await repository.purge(self.persistent_ttl, settings.EMBED_CACHE_PURGE_BATCH)
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    def stats(self) -> dict:
+        memory = self.memory.stats()
+        return {
+            "model": self.model,
+            "size": memory["size"],
+            "max_size": memory["max_size"],
+            "evictions": memory["evictions"],
+            "memory_hits": memory["hits"],
+            "persistent_hits": self.persistent_hits,
+            "persistent_purged": self.purged,
+            "misses": self.misses,
+            "persistent": self.persistent,
+        }
+
+class Embedder:
+
+    def __init__(self, provider: EmbeddingProvider, scheduler: EmbeddingScheduler, cache: EmbeddingCache, dimensions: int):
+        if provider.dimensions > dimensions:
+            raise ValueError(
+                f"Embedding provider '{provider.name}' has {provider.dimensions} dimensions, "
+                f"the vector column has {dimensions}"
+            )
+        self.provider = provider
+        self.scheduler = scheduler
+        self.cache = cache
+        self.dimensions = dimensions
+
+    async def embed(self, texts: List[str], cached: bool = True) -> List[List[float]]:
+        if not cached:
+            return await self._embed(texts)
+        return await self.cache.embed(texts, self._embed)
+
+    async def _embed(self, texts: List[str]) -> List[List[float]]:
+        embeddings = await self.scheduler.embed(texts)
+        padding = [0.0] * (self.dimensions - self.provider.dimensions)
+        for embedding in embeddings:
+            if len(embedding) != self.provider.dimensions:
+                raise ValueError(
+                    f"Embedding provider '{self.provider.name}' returned {len(embedding)} dimensions, "
+                    f"expected {self.provider.dimensions}"
+                )
+        return [list(embedding) + padding for embedding in embeddings] if padding else embeddings
+
+    async def start(self):
+        await self.scheduler.start()
+
+    async def stop(self):
+        await self.scheduler.stop()
+        await self.provider.close()
+
+def create_embedder(provider: EmbeddingProvider, max_batch_size: int, max_wait_ms: float, max_concurrency: int) -> Embedder:
+    return Embedder(
+        provider,
+        EmbeddingScheduler(
+            provider,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            max_concurrency=max_concurrency,
+            max_pending=settings.EMBED_MAX_PENDING
+        ),
+        EmbeddingCache(
+            model=provider.model,
+            max_size=settings.EMBED_CACHE_SIZE,
+            ttl=settings.EMBED_CACHE_TTL,
+            persistent=settings.EMBED_CACHE_PERSISTENT,
+            persistent_ttl=settings.EMBED_CACHE_PERSISTENT_TTL,
+            purge_interval=settings.EMBED_CACHE_PURGE_INTERVAL
+        ),
+        settings.EMBED_DIMENSIONS
+    )
+
+embedders: Dict[str, Embedder] = {
+    "openai": create_embedder(
+        OpenAIEmbeddingProvider(settings.EMBED_MODEL, settings.EMBED_DIMENSIONS),
+        settings.EMBED_BATCH_SIZE,
+        settings.EMBED_BATCH_WAIT_MS,
+        settings.EMBED_MAX_CONCURRENCY
+    )
+}
+
+if settings.LOCAL_EMBED_MODEL_PATH:
+    embedders["local"] = create_embedder(
+        LocalEmbeddingProvider(
+            settings.LOCAL_EMBED_MODEL_PATH,
+            settings.LOCAL_EMBED_DIMENSIONS,
+            settings.LOCAL_EMBED_MAX_LENGTH,
+            settings.LOCAL_EMBED_THREADS
+        ),
+        settings.LOCAL_EMBED_BATCH_SIZE,
+        settings.LOCAL_EMBED_BATCH_WAIT_MS,
+        settings.LOCAL_EMBED_THREADS
+    )
+
+def get_embedder(name: Optional[str] = None, model: Optional[str] = None) -> Embedder:
+    name = name or settings.EMBED_PROVIDER
+    if name not in embedders:
+        raise ValueError(f"Unknown embedding provider '{name}', available: {', '.join(embedders)}")
+    embedder = embedders[name]
+    if model is None or model == embedder.provider.model:
+        return embedder
+    key = f"{name}:{model}"
+    if key not in embedders:
+        if name != "openai":
+            raise ValueError(f"Embedding provider '{name}' only serves model '{embedder.provider.model}'")
+        embedders[key] = create_embedder(
+            OpenAIEmbeddingProvider(model, settings.EMBED_DIMENSIONS),
+            settings.EMBED_BATCH_SIZE,
+            settings.EMBED_BATCH_WAIT_MS,
+            settings.EMBED_MAX_CONCURRENCY
+        )
+    return embedders[key]
+
+def check_dimensions(dimensions: int):
+    if dimensions != settings.EMBED_DIMENSIONS:
+        raise RuntimeError(
+            f"knowledge_bases.embedding has {dimensions} dimensions, EMBED_DIMENSIONS is {settings.EMBED_DIMENSIONS}"
+        )
@@ -1,19 +1,46 @@
 import os
+import asyncio
 
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
-from .routers import agent, knowledge_group, knowledge_base
+from .routers import agent, health, knowledge_group, knowledge_base, metrics, session, stats
 from .settings import settings
+from .database import AsyncSessionLocal
+from .embedding import check_dimensions, embedders
+from .repositories.knowledge_base import KnowledgeBaseRepository
+from .metrics import MetricsMiddleware, configure_tracing
+from .warmup import warmup
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     if settings.OPENAI_API_KEY and not os.getenv("OPENAI_API_KEY"):
         os.environ["OPENAI_API_KEY"] = settings.OPENAI_API_KEY
+    configure_tracing()
+    if settings.VECTOR_STORE == "pgvector":
+        async with AsyncSessionLocal() as session:
+            check_dimensions(await KnowledgeBaseRepository(session).dimensions())
+    for embedder in embedders.values():
+        await embedder.start()
+    if settings.WARMUP_ENABLED:
+        task = asyncio.create_task(warmup.run())
+    else:
+        warmup.skip()
     yield
+    if settings.WARMUP_ENABLED:
+        task.cancel()
+    for embedder in list(embedders.values()):
+        await embedder.stop()
 
 app = FastAPI(title=settings.APP_NAME, version="1.0.0", lifespan=lifespan)
 
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 app.include_router(agent.router)
 app.include_router(knowledge_group.router)
-app.include_router(knowledge_base.router)
\ No newline at end of file
+app.include_router(knowledge_base.router)
+app.include_router(session.router)
+app.include_router(stats.router)
+app.include_router(metrics.router)
+app.include_router(health.router)
\ No newline at end of file
@@ -0,0 +1,143 @@
+import time
+import bisect
+
+from contextlib import nullcontext
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .settings import settings
+
+try:
+    from opentelemetry import trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+except ImportError:
+    trace = None
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+
+tracing = settings.TRACING_ENABLED and trace is not None
+enabled = settings.METRICS_ENABLED or tracing
+tracer = trace.get_tracer("synapse") if tracing else None
+
+class Histogram:
+
+    def __init__(self, name: str, help: str, labels: Sequence[str], buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0.0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self.series.items()):
+            pairs = [f'{key}="{value}"' for key, value in zip(self.labels, labels)]
+            cumulative = 0
+            for bucket, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                le = ",".join(pairs + [f'le="{bucket}"'])
+                lines.append(f"{self.name}_bucket{{{le}}} {int(cumulative)}")
+            suffix = "{" + ",".join(pairs) + "}" if pairs else ""
+            lines.append(f"{self.name}_sum{suffix} {series[-1]}")
+            lines.append(f"{self.name}_count{suffix} {int(cumulative)}")
+        return lines
+
+phase_seconds = Histogram("synapse_phase_seconds", "Latency of instrumented phases in seconds", ["phase", "operation"])
+batch_sizes = Histogram("synapse_batch_size", "Items per batch", ["phase"], SIZE_BUCKETS)
+row_counts = Histogram("synapse_rows", "Rows returned or written per repository call", ["operation"], SIZE_BUCKETS)
+http_seconds = Histogram("synapse_http_request_seconds", "HTTP request latency in seconds", ["method", "route", "status"])
+
+HISTOGRAMS = [phase_seconds, batch_sizes, row_counts, http_seconds]
+
+class Span:
+
+    __slots__ = ("phase", "operation", "started", "span")
+
+    def __init__(self, phase: str, operation: str):
+        self.phase = phase
+        self.operation = operation
+        self.span = None
+
+    def __enter__(self) -> "Span":
+        if tracer is not None:
+            self.span = tracer.start_as_current_span(f"{self.phase}.{self.operation}")
+            self.span.__enter__()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any):
+        if settings.METRICS_ENABLED:
+            phase_seconds.observe(time.perf_counter() - self.started, self.phase, self.operation)
+        if self.span is not None:
+            self.span.__exit__(*exc_info)
+
+def span(phase: str, operation: str) -> Any:
+    return Span(phase, operation) if enabled else nullcontext()
+
+def observe(histogram: Histogram, value: float, *labels: str):
+    if settings.METRICS_ENABLED:
+        histogram.observe(value, *labels)
+
+def instrument(phase: str, operation: Optional[str] = None, rows: bool = False) -> Callable:
+    def decorator(fn: Callable) -> Callable:
+        if not enabled:
+            return fn
+        name = operation or fn.__qualname__
+
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with Span(phase, name):
+                result = await fn(*args, **kwargs)
+            if rows and isinstance(result, list):
+                observe(row_counts, len(result), name)
+            return result
+        return wrapper
+    return decorator
+
+class MetricsMiddleware:
+
+    def __init__(self, app: Callable):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = ["500"]
+
+        async def wrapped(message: Dict[str, Any]):
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, wrapped)
+        finally:
+            route = scope.get("route")
+            http_seconds.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                status[0]
+            )
+
+def configure_tracing():
+    if not tracing or isinstance(trace.get_tracer_provider(), TracerProvider):
+        return
+    provider = TracerProvider(resource=Resource.create({"service.name": settings.APP_NAME}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=settings.TRACING_ENDPOINT, insecure=True)))
+    trace.set_tracer_provider(provider)
+
+def render() -> str:
+    return "\n".join(line for histogram in HISTOGRAMS for line in histogram.render()) + "\n"
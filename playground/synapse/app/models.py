@@ -6,9 +6,9 @@ from pydantic import BaseModel
 from pgvector.sqlalchemy import Vector
 from sqlmodel import SQLModel, Field, Relationship
 
-from sqlalchemy import Index
+from sqlalchemy import BigInteger, Column, Computed, Index, LargeBinary
 from sqlalchemy.types import TypeDecorator
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, TSVECTOR
 from sqlalchemy.dialects.postgresql import UUID as PG_UUID
 
 class LLMConfig(BaseModel):
@@ -45,6 +45,7 @@ class AgentModel(SQLModel, table=True):
         nullable=False,
         sa_type=LLMConfigType,
     )
+    generation: int = Field(default=0, nullable=False)
 
 class NestedAgentModel(SQLModel, table=True):
     __tablename__ = "nested_agents"
@@ -82,12 +83,14 @@ class MessageModel(SQLModel, table=True):
         sa_type=PG_UUID(as_uuid=True),
     )
     session_id: uuid.UUID = Field(
-        foreign_key="session.id",
+        foreign_key="sessions.id",
         nullable=False,
         index=True,
         sa_type=PG_UUID(as_uuid=True),
     )
+    role: str = Field(default="user", nullable=False)
     content: str = Field(nullable=False)
+    tokens: int = Field(default=0, nullable=False)
     labels: Optional[Dict[str, Any]] = Field(default=None, sa_type=JSONB)
     created_at: datetime = Field(nullable=False, default_factory=datetime.now)
 
@@ -101,6 +104,9 @@ class KnowledgeGroupModel(SQLModel, table=True):
     )
     name: str = Field(nullable=False)
     description: str = Field(nullable=True)
+    generation: int = Field(default=0, nullable=False)
+    embedding_provider: str = Field(default="openai", nullable=False)
+    embedding_model: str = Field(nullable=False)
 
 class KnowledgeBaseModel(SQLModel, table=True):
     __tablename__ = "knowledge_bases"
@@ -112,10 +118,102 @@ class KnowledgeBaseModel(SQLModel, table=True):
     )
     knowledge_group_id: uuid.UUID = Field(
         foreign_key="knowledge_groups.id",
+        primary_key=True,
+        nullable=False,
+        index=True,
+        sa_type=PG_UUID(as_uuid=True),
+    )
+    document_id: uuid.UUID = Field(
         nullable=False,
         index=True,
         sa_type=PG_UUID(as_uuid=True),
     )
+    chunk_index: int = Field(default=0, nullable=False)
+    start_offset: int = Field(default=0, nullable=False)
+    end_offset: int = Field(default=0, nullable=False)
     name: str = Field(nullable=False)
     content: str = Field(nullable=False)
-    embedding: list[float] = Field(sa_type=Vector(dim=1536), nullable=False)
\ No newline at end of file
+    content_tsv: Optional[str] = Field(
+        default=None,
+        sa_column=Column(TSVECTOR, Computed("to_tsvector('simple', content)", persisted=True)),
+    )
+    embedding: list[float] = Field(sa_type=Vector(dim=1536), nullable=False)
+
+class EmbeddingCacheModel(SQLModel, table=True):
+    __tablename__ = "embedding_cache"
+    model: str = Field(nullable=False, primary_key=True)
+    text_hash: str = Field(nullable=False, primary_key=True)
+    embedding: list[float] = Field(sa_type=Vector(dim=1536), nullable=False)
+    created_at: datetime = Field(nullable=False, default_factory=datetime.now)
+
+class DocumentSignatureModel(SQLModel, table=True):
+    __tablename__ = "document_signatures"
+    knowledge_group_id: uuid.UUID = Field(
+        foreign_key="knowledge_groups.id",
+        primary_key=True,
+        sa_type=PG_UUID(as_uuid=True),
+    )
+    document_id: uuid.UUID = Field(primary_key=True, sa_type=PG_UUID(as_uuid=True))
+    signature: bytes = Field(sa_type=LargeBinary, nullable=False)
+    bands: List[int] = Field(sa_type=ARRAY(BigInteger), nullable=False)
+
+class ReembeddingJobModel(SQLModel, table=True):
+    __tablename__ = "reembedding_jobs"
+    id: uuid.UUID = Field(
+        default_factory=uuid.uuid4,
+        primary_key=True,
+        sa_type=PG_UUID(as_uuid=True),
+    )
+    knowledge_group_id: uuid.UUID = Field(
+        foreign_key="knowledge_groups.id",
+        nullable=False,
+        sa_type=PG_UUID(as_uuid=True),
+    )
+    embedding_provider: str = Field(nullable=False)
+    embedding_model: str = Field(nullable=False)
+    status: str = Field(default="pending", nullable=False)
+    cursor: Optional[uuid.UUID] = Field(default=None, nullable=True, sa_type=PG_UUID(as_uuid=True))
+    processed: int = Field(default=0, nullable=False)
+    total: int = Field(default=0, nullable=False)
+    attempts: int = Field(default=0, nullable=False)
+    error: Optional[str] = Field(default=None, nullable=True)
+    locked_by: Optional[str] = Field(default=None, nullable=True)
+    locked_until: Optional[datetime] = Field(default=None, nullable=True)
+    created_at: datetime = Field(nullable=False, default_factory=datetime.now)
+    updated_at: datetime = Field(nullable=False, default_factory=datetime.now)
+
+class KnowledgeBaseEmbeddingModel(SQLModel, table=True):
+    __tablename__ = "knowledge_base_embeddings"
+    job_id: uuid.UUID = Field(
+        foreign_key="reembedding_jobs.id",
+        primary_key=True,
+        sa_type=PG_UUID(as_uuid=True),
+    )
+    knowledge_base_id: uuid.UUID = Field(primary_key=True, sa_type=PG_UUID(as_uuid=True))
+    embedding: list[float] = Field(sa_type=Vector(dim=1536), nullable=False)
+
+class IngestionJobModel(SQLModel, table=True):
+    __tablename__ = "ingestion_jobs"
+    id: uuid.UUID = Field(
+        default_factory=uuid.uuid4,
+        primary_key=True,
+        sa_type=PG_UUID(as_uuid=True),
+    )
+    knowledge_group_id: uuid.UUID = Field(
+        foreign_key="knowledge_groups.id",
+        nullable=False,
+        sa_type=PG_UUID(as_uuid=True),
+    )
+    status: str = Field(default="pending", nullable=False)
+    payload: Optional[List[Dict[str, Any]]] = Field(default=None, sa_type=JSONB, nullable=True)
+    documents: int = Field(default=0, nullable=False)
+    duplicates: int = Field(default=0, nullable=False)
+    document_ids: Optional[List[str]] = Field(default=None, sa_type=JSONB, nullable=True)
+    attempts: int = Field(default=0, nullable=False)
+    error: Optional[str] = Field(default=None, nullable=True)
+    locked_by: Optional[str] = Field(default=None, nullable=True)
+    locked_until: Optional[datetime] = Field(default=None, nullable=True)
+    available_at: datetime = Field(nullable=False, default_factory=datetime.now)
+    created_at: datetime = Field(nullable=False, default_factory=datetime.now)
+    started_at: Optional[datetime] = Field(default=None, nullable=True)
+    finished_at: Optional[datetime] = Field(default=None, nullable=True)
@@ -0,0 +1,77 @@
+import uuid
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID, aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from ..metrics import instrument
+from ..models import AgentModel, NestedAgentModel
+
+class AgentRepository:
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def create(self, model: AgentModel):
+        self.session.add(model)
+
+    async def get(self, agent_id: uuid.UUID, lock: bool = False) -> Optional[AgentModel]:
+        return await self.session.get(AgentModel, agent_id, with_for_update=lock)
+
+    async def generations(self, agent_ids: List[uuid.UUID]) -> Dict[uuid.UUID, int]:
+        result = await self.session.execute(select(AgentModel.id, AgentModel.generation).where(AgentModel.id.in_(agent_ids)))
+        return dict(result.all())
+
+    @instrument("repository")
+    async def add_edges(self, agent_id: uuid.UUID, sub_agent_ids: List[uuid.UUID]):
+        if not sub_agent_ids:
+            return
+        now = datetime.now()
+        await self.session.execute(insert(NestedAgentModel).values([
+            {"agent_id": agent_id, "sub_agent_id": sub_agent_id, "created_at": now + timedelta(microseconds=i)}
+            for i, sub_agent_id in enumerate(sub_agent_ids)
+        ]))
+
+    async def delete_edges(self, agent_id: uuid.UUID):
+        await self.session.execute(delete(NestedAgentModel).where(NestedAgentModel.agent_id == agent_id))
+
+    async def parents(self, agent_id: uuid.UUID) -> List[uuid.UUID]:
+        result = await self.session.execute(
+            select(NestedAgentModel.agent_id).where(NestedAgentModel.sub_agent_id == agent_id)
+        )
+        return list(result.scalars().all())
+
+    @instrument("repository", rows=True)
+    async def tree(self, root_id: uuid.UUID) -> List[Tuple[AgentModel, List[uuid.UUID]]]:
+        edges = select(
+            NestedAgentModel.agent_id,
+            NestedAgentModel.sub_agent_id,
+            NestedAgentModel.created_at
+        ).where(NestedAgentModel.agent_id == root_id).cte("tree", recursive=True)
+        nested = aliased(NestedAgentModel)
+        edges = edges.union(
+            select(
+                nested.agent_id,
+                nested.sub_agent_id,
+                nested.created_at
+            ).join(edges, nested.agent_id == edges.c.sub_agent_id)
+        )
+        nodes = select(literal(root_id, PG_UUID(as_uuid=True))).union(select(edges.c.sub_agent_id))
+        sub_agents = func.coalesce(
+            func.array_agg(aggregate_order_by(edges.c.sub_agent_id, edges.c.created_at)).filter(edges.c.sub_agent_id.is_not(None)),
+            literal([], ARRAY(PG_UUID(as_uuid=True)))
+        )
+        stmt = select(
+            AgentModel,
+            sub_agents.label("sub_agents")
+        ).outerjoin(
+            edges, edges.c.agent_id == AgentModel.id
+        ).where(
+            AgentModel.id.in_(nodes)
+        ).group_by(AgentModel.id)
+        result = await self.session.execute(stmt)
+        return [(model, list(sub_agent_ids)) for model, sub_agent_ids in result.all()]
@@ -0,0 +1,33 @@
+import uuid
+
+from typing import Any, Dict, List
+
+import numpy as np
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..metrics import instrument, observe, row_counts
+from ..models import DocumentSignatureModel
+
+class DocumentSignatureRepository:
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    @instrument("repository")
+    async def candidates(self, knowledge_group_id: uuid.UUID, bands: List[int]) -> Dict[uuid.UUID, np.ndarray]:
+        stmt = select(
+            DocumentSignatureModel.document_id,
+            DocumentSignatureModel.signature
+        ).where(
+            DocumentSignatureModel.knowledge_group_id == knowledge_group_id,
+            DocumentSignatureModel.bands.overlap(bands)
+        )
+        result = await self.session.execute(stmt)
+        return {document_id: np.frombuffer(signature, dtype=np.uint32) for document_id, signature in result.all()}
+
+    @instrument("repository")
+    async def add(self, rows: List[Dict[str, Any]]):
+        observe(row_counts, len(rows), "DocumentSignatureRepository.add")
+        await self.session.execute(insert(DocumentSignatureModel).values(rows))
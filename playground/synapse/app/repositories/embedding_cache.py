@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..metrics import instrument
+from ..models import EmbeddingCacheModel
+
+class EmbeddingCacheRepository:
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    @instrument("repository")
+    async def get_many(self, model: str, text_hashes: List[str], ttl: Optional[float] = None) -> Dict[str, np.ndarray]:
+        stmt = select(
+            EmbeddingCacheModel.text_hash,
+            EmbeddingCacheModel.embedding
+        ).where(
+            EmbeddingCacheModel.model == model,
+            EmbeddingCacheModel.text_hash.in_(text_hashes)
+        )
+        if ttl:
+            stmt = stmt.where(EmbeddingCacheModel.created_at >= datetime.now(timezone.utc) - timedelta(seconds=ttl))
+        result = await self.session.execute(stmt)
+        return {text_hash: np.asarray(embedding, dtype=np.float32) for text_hash, embedding in result.all()}
+
+    @instrument("repository")
+    async def put_many(self, model: str, embeddings: Dict[str, Sequence[float]]):
+        stmt = insert(EmbeddingCacheModel).values([
+            {"model": model, "text_hash": text_hash, "embedding": embedding}
+            for text_hash, embedding in embeddings.items()
+        ])
+        await self.session.execute(stmt.on_conflict_do_nothing(index_elements=["model", "text_hash"]))
+
+    @instrument("repository")
+    async def purge(self, ttl: float, limit: int) -> int:
+        expired = select(EmbeddingCacheModel.model, EmbeddingCacheModel.text_hash).where(
+            EmbeddingCacheModel.created_at < datetime.now(timezone.utc) - timedelta(seconds=ttl)
+        ).limit(limit)
+        stmt = delete(EmbeddingCacheModel).where(
+            tuple_(EmbeddingCacheModel.model, EmbeddingCacheModel.text_hash).in_(expired)
+        )
+        result = await self.session.execute(stmt)
+        return result.rowcount
@@ -0,0 +1,142 @@
+import uuid
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import and_, case, func, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..metrics import instrument
+from ..models import IngestionJobModel
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+class IngestionJobRepository:
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    @instrument("repository")
+    async def enqueue(self, knowledge_group_id: uuid.UUID, payload: List[Dict[str, Any]]) -> uuid.UUID:
+        job_id = uuid.uuid4()
+        now = utcnow()
+        await self.session.execute(insert(IngestionJobModel).values(
+            id=job_id,
+            knowledge_group_id=knowledge_group_id,
+            payload=payload,
+            documents=len(payload),
+            available_at=now,
+            created_at=now
+        ))
+        return job_id
+
+    async def get(self, knowledge_group_id: uuid.UUID, job_id: uuid.UUID) -> Optional[IngestionJobModel]:
+        stmt = select(IngestionJobModel).where(
+            IngestionJobModel.id == job_id,
+            IngestionJobModel.knowledge_group_id == knowledge_group_id
+        )
+        result = await self.session.execute(stmt)
+        return result.scalar_one_or_none()
+
+    @instrument("repository")
+    async def claim(self, worker: str, lease: float, max_attempts: int) -> Optional[IngestionJobModel]:
+        now = utcnow()
+        await self.session.execute(update(IngestionJobModel).where(
+            IngestionJobModel.status == "running",
+            IngestionJobModel.locked_until < now,
+            IngestionJobModel.attempts >= max_attempts
+        ).values(
+            status="failed",
+            payload=None,
+            error=f"Lease expired after {max_attempts} attempts",
+            locked_by=None,
+            locked_until=None,
+            finished_at=now
+        ))
+        candidate = select(IngestionJobModel.id).where(
+            or_(
+                and_(IngestionJobModel.status == "pending", IngestionJobModel.available_at <= now),
+                and_(
+                    IngestionJobModel.status == "running",
+                    IngestionJobModel.locked_until < now,
+                    IngestionJobModel.attempts < max_attempts
+                )
+            )
+        ).order_by(IngestionJobModel.available_at).limit(1).with_for_update(skip_locked=True).scalar_subquery()
+        stmt = update(IngestionJobModel).where(IngestionJobModel.id == candidate).values(
+            status="running",
+            locked_by=worker,
+            locked_until=now + timedelta(seconds=lease),
+            attempts=IngestionJobModel.attempts + 1,
+            started_at=func.coalesce(IngestionJobModel.started_at, now)
+        ).returning(IngestionJobModel)
+        result = await self.session.execute(stmt)
+        return result.scalar_one_or_none()
+
+    async def heartbeat(self, job_id: uuid.UUID, worker: str, lease: float) -> bool:
+        stmt = update(IngestionJobModel).where(
+            IngestionJobModel.id == job_id,
+            IngestionJobModel.locked_by == worker
+        ).values(locked_until=utcnow() + timedelta(seconds=lease)).returning(IngestionJobModel.id)
+        result = await self.session.execute(stmt)
+        return result.scalar_one_or_none() is not None
+
+    @instrument("repository")
+    async def complete(self, job_id: uuid.UUID, worker: str, document_ids: List[uuid.UUID], duplicates: int) -> bool:
+        stmt = update(IngestionJobModel).where(
+            IngestionJobModel.id == job_id,
+            IngestionJobModel.locked_by == worker
+        ).values(
+            status="completed",
+            payload=None,
+            duplicates=duplicates,
+            document_ids=[str(document_id) for document_id in document_ids],
+            error=None,
+            locked_by=None,
+            locked_until=None,
+            finished_at=utcnow()
+        ).returning(IngestionJobModel.id)
+        result = await self.session.execute(stmt)
+        return result.scalar_one_or_none() is not None
+
+    @instrument("repository")
+    async def fail(self, job_id: uuid.UUID, worker: str, error: str, retry_in: Optional[float] = None):
+        now = utcnow()
+        values = {"error": error, "locked_by": None, "locked_until": None}
+        if retry_in is None:
+            values.update(status="failed", payload=None, finished_at=now)
+        else:
+            values.update(status="pending", available_at=now + timedelta(seconds=retry_in))
+        stmt = update(IngestionJobModel).where(
+            IngestionJobModel.id == job_id,
+            IngestionJobModel.locked_by == worker
+        ).values(**values)
+        await self.session.execute(stmt)
+
+    async def stats(self, window: float) -> Dict[str, Any]:
+        since = utcnow() - timedelta(seconds=window)
+        finished = and_(IngestionJobModel.status == "completed", IngestionJobModel.finished_at >= since)
+        stmt = select(
+            func.count().filter(IngestionJobModel.status == "pending").label("pending"),
+            func.count().filter(IngestionJobModel.status == "running").label("running"),
+            func.count().filter(finished).label("completed"),
+            func.count().filter(
+                IngestionJobModel.status == "failed", IngestionJobModel.finished_at >= since
+            ).label("failed"),
+            func.count().filter(finished, IngestionJobModel.attempts > 1).label("retried"),
+            func.avg(func.extract("epoch", IngestionJobModel.started_at - IngestionJobModel.created_at)).filter(finished).label("queue"),
+            func.avg(func.extract("epoch", IngestionJobModel.finished_at - IngestionJobModel.started_at)).filter(finished).label("run"),
+            func.sum(case((finished, IngestionJobModel.documents), else_=0)).label("documents"),
+        )
+        row = (await self.session.execute(stmt)).one()
+        return {
+            "pending": row.pending,
+            "running": row.running,
+            "completed": row.completed,
+            "failed": row.failed,
+            "retried": row.retried,
+            "avg_queue_ms": float(row.queue or 0) * 1000,
+            "avg_run_ms": float(row.run or 0) * 1000,
+            "documents_per_second": float(row.documents or 0) / window,
+        }
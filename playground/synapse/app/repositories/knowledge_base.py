@@ -1,43 +1,315 @@
 import uuid
 
-from typing import List, Tuple, Optional
+from typing import Any, Dict, List, Tuple, Optional
 
-from sqlalchemy import select
+from pgvector.sqlalchemy import BIT, HALFVEC, Vector
+from sqlalchemy import bindparam, cast, column, func, select, literal, literal_column, text, true, update, String
+from sqlalchemy.dialects.postgresql import ARRAY, REGCONFIG
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..models import KnowledgeBaseModel
+from ..metrics import instrument, observe, row_counts
+from ..models import KnowledgeBaseModel, KnowledgeGroupModel
+from ..schemas import SearchContent, SearchPlan
+from ..settings import settings
+
+def compact(plan: Optional[SearchPlan] = None) -> bool:
+    return plan is not None and plan.mode == "ann" and plan.index != "vector"
+
+def index_distance(embedding: Any, qemb: Any, plan: Optional[SearchPlan] = None) -> Any:
+    index = plan.index if compact(plan) else "vector"
+    if index == "halfvec":
+        return cast(embedding, HALFVEC(1536)).cosine_distance(cast(qemb, HALFVEC(1536)))
+    if index == "binary":
+        return cast(func.binary_quantize(embedding), BIT(1536)).hamming_distance(
+            cast(func.binary_quantize(cast(qemb, Vector(1536))), BIT(1536))
+        )
+    if index == "matryoshka":
+        dimensions = settings.VECTOR_INDEX_DIMENSIONS
+        return cast(
+            func.subvector(embedding, literal_column("1"), literal_column(str(dimensions))), Vector(dimensions)
+        ).cosine_distance(
+            cast(func.subvector(cast(qemb, Vector(1536)), literal_column("1"), literal_column(str(dimensions))), Vector(dimensions))
+        )
+    return embedding.cosine_distance(qemb)
+
+def candidate_limit(k: int, plan: Optional[SearchPlan] = None) -> int:
+    if compact(plan):
+        return k * settings.VECTOR_RERANK_FACTOR
+    return k
+
+def content_columns(content: SearchContent = "full") -> List[Any]:
+    if content == "none":
+        return []
+    if content == "snippet":
+        return [func.left(KnowledgeBaseModel.content, settings.SEARCH_SNIPPET_CHARS).label("content")]
+    return [KnowledgeBaseModel.content]
 
 class KnowledgeBaseRepository:
 
     def __init__(self, session: AsyncSession):
         self.session = session
 
+    async def dimensions(self) -> int:
+        stmt = text(
+            "select atttypmod from pg_attribute "
+            "where attrelid = 'knowledge_bases'::regclass and attname = 'embedding'"
+        )
+        result = await self.session.execute(stmt)
+        return result.scalar_one()
+
+    async def sample(self, knowledge_group_id: uuid.UUID, limit: int) -> List[List[float]]:
+        stmt = select(KnowledgeBaseModel.embedding).where(
+            KnowledgeBaseModel.knowledge_group_id == knowledge_group_id
+        ).order_by(KnowledgeBaseModel.id).limit(limit)
+        result = await self.session.execute(stmt)
+        return [embedding.tolist() for embedding in result.scalars().all()]
+
+    async def prewarm_indexes(self, knowledge_group_id: uuid.UUID) -> List[str]:
+        stmt = text(
+            "select x.indexrelid::regclass::text from pg_index x "
+            "join pg_class c on c.oid = x.indexrelid join pg_am a on a.oid = c.relam "
+            "where x.indrelid = (select tableoid from knowledge_bases where knowledge_group_id = :group limit 1) "
+            "and (a.amname = 'hnsw' or pg_get_indexdef(x.indexrelid) like '%(knowledge_group_id, id)')"
+        )
+        result = await self.session.execute(stmt, {"group": knowledge_group_id})
+        return list(result.scalars().all())
+
+    async def prewarm(self, relation: str) -> int:
+        result = await self.session.execute(text("select pg_prewarm(cast(:relation as regclass))"), {"relation": relation})
+        return result.scalar_one()
+
+    @instrument("repository")
+    async def generation(self, knowledge_group_id: uuid.UUID) -> int:
+        stmt = select(KnowledgeGroupModel.generation).where(KnowledgeGroupModel.id == knowledge_group_id)
+        result = await self.session.execute(stmt)
+        return result.scalar_one_or_none() or 0
+
+    @instrument("repository")
+    async def bump_generation(self, knowledge_group_id: uuid.UUID):
+        stmt = update(KnowledgeGroupModel).where(
+            KnowledgeGroupModel.id == knowledge_group_id
+        ).values(generation=KnowledgeGroupModel.generation + 1)
+        await self.session.execute(stmt)
+
+    @instrument("repository")
+    async def count(self, knowledge_group_id: uuid.UUID, limit: int) -> int:
+        rows = select(KnowledgeBaseModel.id).where(KnowledgeBaseModel.knowledge_group_id == knowledge_group_id).limit(limit)
+        result = await self.session.execute(select(func.count()).select_from(rows.subquery()))
+        return result.scalar_one()
+
+    @instrument("repository")
+    async def plan(self, plan: SearchPlan):
+        if plan.mode == "exact":
+            stmt = select(
+                func.set_config("plan_cache_mode", "force_custom_plan", True),
+                func.set_config("enable_indexscan", "off", True)
+            )
+        else:
+            stmt = select(
+                func.set_config("plan_cache_mode", "force_custom_plan", True),
+                func.set_config("hnsw.ef_search", str(plan.ef_search), True),
+                func.set_config("hnsw.iterative_scan", plan.iterative_scan, True),
+                func.set_config("hnsw.max_scan_tuples", str(plan.max_scan_tuples), True)
+            )
+        await self.session.execute(stmt)
+
+    @instrument("repository", rows=True)
     async def search(
         self, 
         knowledge_group_id: uuid.UUID,
         qemb: List[float], 
         k: int = 5, 
-        threshold: Optional[float] = None
-    ) -> List[Tuple[KnowledgeBaseModel, float, float]]:
-        
+        threshold: Optional[float] = None,
+        collapse: bool = False,
+        plan: Optional[SearchPlan] = None,
+        content: SearchContent = "full",
+        vectors: bool = False
+    ) -> List[Dict[str, Any]]:
+
+        if plan is not None:
+            await self.plan(plan)
+
+        distance = KnowledgeBaseModel.embedding.cosine_distance(qemb).label("distance")
         stmt = select(
             KnowledgeBaseModel.id,
+            KnowledgeBaseModel.document_id,
+            KnowledgeBaseModel.chunk_index,
+            KnowledgeBaseModel.start_offset,
+            KnowledgeBaseModel.end_offset,
             KnowledgeBaseModel.name,
-            KnowledgeBaseModel.content,
-            KnowledgeBaseModel.embedding.cosine_distance(qemb).label("distance")
-        )
+            *content_columns(content),
+            *([func.vector_send(KnowledgeBaseModel.embedding).label("embedding")] if vectors else []),
+            distance
+        ).where(KnowledgeBaseModel.knowledge_group_id == knowledge_group_id)
 
-        stmt = stmt.where(KnowledgeBaseModel.knowledge_group_id == knowledge_group_id)
+        order = index_distance(KnowledgeBaseModel.embedding, qemb, plan) if compact(plan) else distance
+        limit = candidate_limit(k, plan)
 
+        if collapse:
+            candidates = stmt.order_by(order).limit(limit * settings.CHUNK_COLLAPSE_CANDIDATES).subquery()
+            candidates = select(candidates).distinct(candidates.c.document_id).order_by(candidates.c.document_id, candidates.c.distance).subquery()
+        else:
+            candidates = stmt.order_by(order).limit(limit).subquery()
+
+        stmt = select(candidates, (1 - candidates.c.distance).label("similarity"))
         if threshold is not None:
-            distance = 1 - threshold
-            stmt = stmt.where(KnowledgeBaseModel.embedding.cosine_distance(qemb) <= distance)
+            stmt = stmt.where(candidates.c.distance <= 1 - threshold)
+        stmt = stmt.order_by(candidates.c.distance).limit(k)
+
+        result = await self.session.execute(stmt)
+        return [dict(row) for row in result.mappings()]
+
+    @instrument("repository", rows=True)
+    async def batch_search(
+        self,
+        knowledge_group_id: uuid.UUID,
+        qembs: List[List[float]],
+        k: int = 5,
+        threshold: Optional[float] = None,
+        plan: Optional[SearchPlan] = None
+    ) -> List[Tuple[int, KnowledgeBaseModel, float, float]]:
 
-        stmt = stmt.order_by(KnowledgeBaseModel.embedding.cosine_distance(qemb)).limit(k)
+        if plan is not None:
+            await self.plan(plan)
+
+        vectors = "{" + ",".join('"[' + ",".join(map(str, qemb)) + ']"' for qemb in qembs) + "}"
+        queries = func.unnest(
+            cast(bindparam("qembs", vectors, type_=String), ARRAY(Vector(1536)))
+        ).table_valued(column("embedding", Vector(1536)), with_ordinality="query_index").render_derived(name="queries")
+
+        distance = KnowledgeBaseModel.embedding.cosine_distance(queries.c.embedding)
+        results = select(
+            KnowledgeBaseModel.id,
+            KnowledgeBaseModel.document_id,
+            KnowledgeBaseModel.chunk_index,
+            KnowledgeBaseModel.start_offset,
+            KnowledgeBaseModel.end_offset,
+            KnowledgeBaseModel.name,
+            KnowledgeBaseModel.content,
+            distance.label("distance")
+        ).where(KnowledgeBaseModel.knowledge_group_id == knowledge_group_id)
+        if threshold is not None:
+            results = results.where(distance <= 1 - threshold)
+        results = results.order_by(
+            index_distance(KnowledgeBaseModel.embedding, queries.c.embedding, plan)
+        ).limit(candidate_limit(k, plan)).correlate(queries).subquery()
+        results = select(results).order_by(results.c.distance).limit(k).lateral("results")
+
+        stmt = select(
+            queries.c.query_index,
+            results
+        ).select_from(queries).join(results, true()).order_by(queries.c.query_index, results.c.distance)
 
         result = await self.session.execute(stmt)
-        rows = result.mappings().all()
         return [
-            (KnowledgeBaseModel(**{k: v for k, v in row.items() if k != "distance"}), row["distance"], 1 - row["distance"])
-            for row in rows
-        ]
\ No newline at end of file
+            (
+                row["query_index"] - 1,
+                KnowledgeBaseModel(**{k: v for k, v in row.items() if k not in ("distance", "query_index")}),
+                row["distance"],
+                1 - row["distance"]
+            )
+            for row in result.mappings().all()
+        ]
+
+    @instrument("repository", rows=True)
+    async def hybrid_search(
+        self,
+        knowledge_group_id: uuid.UUID,
+        qemb: List[float],
+        query: str,
+        k: int = 5,
+        threshold: Optional[float] = None,
+        vector_weight: float = 1.0,
+        lexical_weight: float = 1.0,
+        plan: Optional[SearchPlan] = None,
+        content: SearchContent = "full"
+    ) -> List[Dict[str, Any]]:
+
+        if plan is not None:
+            await self.plan(plan)
+
+        candidates = max(k, settings.SEARCH_HYBRID_CANDIDATES)
+        tsquery = func.websearch_to_tsquery(literal("simple").cast(REGCONFIG), query)
+
+        distance = KnowledgeBaseModel.embedding.cosine_distance(qemb).label("distance")
+        nearest = select(
+            KnowledgeBaseModel.id,
+            distance
+        ).where(KnowledgeBaseModel.knowledge_group_id == knowledge_group_id).order_by(
+            index_distance(KnowledgeBaseModel.embedding, qemb, plan) if compact(plan) else distance
+        ).limit(candidate_limit(candidates, plan)).subquery()
+        vector = select(
+            nearest.c.id,
+            func.row_number().over(order_by=nearest.c.distance).label("rank")
+        )
+        if threshold is not None:
+            vector = vector.where(nearest.c.distance <= 1 - threshold)
+        vector = vector.order_by(nearest.c.distance).limit(candidates).cte("vector")
+
+        lexical = select(
+            KnowledgeBaseModel.id,
+            func.ts_rank_cd(KnowledgeBaseModel.content_tsv, tsquery).label("score")
+        ).where(
+            KnowledgeBaseModel.knowledge_group_id == knowledge_group_id,
+            KnowledgeBaseModel.content_tsv.op("@@")(tsquery)
+        ).order_by(func.ts_rank_cd(KnowledgeBaseModel.content_tsv, tsquery).desc()).limit(candidates).subquery()
+        lexical = select(
+            lexical.c.id,
+            lexical.c.score,
+            func.row_number().over(order_by=lexical.c.score.desc()).label("rank")
+        ).cte("lexical")
+
+        rrf = (
+            func.coalesce(vector_weight / (settings.SEARCH_RRF_K + vector.c.rank), 0.0) +
+            func.coalesce(lexical_weight / (settings.SEARCH_RRF_K + lexical.c.rank), 0.0)
+        )
+        fused = select(
+            func.coalesce(vector.c.id, lexical.c.id).label("id"),
+            vector.c.rank.label("vector_rank"),
+            lexical.c.rank.label("lexical_rank"),
+            lexical.c.score.label("lexical_score"),
+            rrf.label("score")
+        ).select_from(
+            vector.join(lexical, vector.c.id == lexical.c.id, full=True)
+        ).order_by(rrf.desc()).limit(k).subquery()
+
+        rows = select(
+            KnowledgeBaseModel.id,
+            KnowledgeBaseModel.document_id,
+            KnowledgeBaseModel.chunk_index,
+            KnowledgeBaseModel.start_offset,
+            KnowledgeBaseModel.end_offset,
+            KnowledgeBaseModel.name,
+            *content_columns(content),
+            KnowledgeBaseModel.embedding.cosine_distance(qemb).label("distance"),
+            fused.c.vector_rank,
+            fused.c.lexical_rank,
+            fused.c.lexical_score,
+            fused.c.score
+        ).join(
+            fused, fused.c.id == KnowledgeBaseModel.id
+        ).where(
+            KnowledgeBaseModel.knowledge_group_id == knowledge_group_id
+        ).limit(k).subquery()
+        stmt = select(rows, (1 - rows.c.distance).label("similarity")).order_by(rows.c.score.desc())
+
+        result = await self.session.execute(stmt)
+        return [dict(row) for row in result.mappings()]
+
+    async def add(self, models: List[KnowledgeBaseModel]):
+        observe(row_counts, len(models), "KnowledgeBaseRepository.add")
+        self.session.add_all(models)
+
+    @instrument("repository")
+    async def copy(self, rows: List[Tuple[uuid.UUID, uuid.UUID, uuid.UUID, int, int, int, str, str, List[float]]]):
+        observe(row_counts, len(rows), "KnowledgeBaseRepository.copy")
+        connection = await self.session.connection()
+        raw_connection = await connection.get_raw_connection()
+        async with raw_connection.driver_connection.cursor() as cursor:
+            async with cursor.copy(
+                "COPY knowledge_bases (id, knowledge_group_id, document_id, chunk_index, start_offset, end_offset, name, content, embedding) "
+                "FROM STDIN WITH (FORMAT BINARY)"
+            ) as copy:
+                copy.set_types(["uuid", "uuid", "uuid", "int4", "int4", "int4", "varchar", "text", "vector"])
+                for row in rows:
+                    await copy.write_row(row)
\ No newline at end of file
@@ -0,0 +1,48 @@
+import uuid
+
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..metrics import instrument
+from ..models import KnowledgeGroupModel
+
+class KnowledgeGroupRepository:
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    @instrument("repository")
+    async def embedding_model(self, knowledge_group_id: uuid.UUID, lock: bool = False) -> Optional[Tuple[str, str]]:
+        stmt = select(
+            KnowledgeGroupModel.embedding_provider,
+            KnowledgeGroupModel.embedding_model
+        ).where(KnowledgeGroupModel.id == knowledge_group_id)
+        if lock:
+            stmt = stmt.with_for_update(read=True)
+        result = await self.session.execute(stmt)
+        row = result.one_or_none()
+        return tuple(row) if row is not None else None
+
+    @instrument("repository")
+    async def lock(self, knowledge_group_id: uuid.UUID) -> bool:
+        stmt = select(KnowledgeGroupModel.id).where(KnowledgeGroupModel.id == knowledge_group_id).with_for_update()
+        result = await self.session.execute(stmt)
+        return result.scalar_one_or_none() is not None
+
+    @instrument("repository")
+    async def switch_model(self, knowledge_group_id: uuid.UUID, provider: str, model: str):
+        stmt = update(KnowledgeGroupModel).where(
+            KnowledgeGroupModel.id == knowledge_group_id
+        ).values(
+            embedding_provider=provider,
+            embedding_model=model,
+            generation=KnowledgeGroupModel.generation + 1
+        )
+        await self.session.execute(stmt)
+
+    async def hottest(self, limit: int) -> List[uuid.UUID]:
+        stmt = select(KnowledgeGroupModel.id).order_by(KnowledgeGroupModel.generation.desc()).limit(limit)
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
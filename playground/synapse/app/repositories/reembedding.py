@@ -0,0 +1,133 @@
+import uuid
+
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import delete, exists, func, insert, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..metrics import instrument, observe, row_counts
+from ..models import KnowledgeBaseEmbeddingModel, KnowledgeBaseModel, ReembeddingJobModel
+
+ACTIVE = ("pending", "running")
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+class ReembeddingRepository:
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def enqueue(self, knowledge_group_id: uuid.UUID, provider: str, model: str) -> uuid.UUID:
+        total = await self.session.execute(
+            select(func.count()).where(KnowledgeBaseModel.knowledge_group_id == knowledge_group_id)
+        )
+        job_id = uuid.uuid4()
+        await self.session.execute(insert(ReembeddingJobModel).values(
+            id=job_id,
+            knowledge_group_id=knowledge_group_id,
+            embedding_provider=provider,
+            embedding_model=model,
+            total=total.scalar_one(),
+            created_at=utcnow(),
+            updated_at=utcnow()
+        ))
+        return job_id
+
+    async def active(self, knowledge_group_id: Optional[uuid.UUID] = None, statuses: Tuple[str, ...] = ACTIVE) -> int:
+        stmt = select(func.count()).where(ReembeddingJobModel.status.in_(statuses))
+        if knowledge_group_id is not None:
+            stmt = stmt.where(ReembeddingJobModel.knowledge_group_id == knowledge_group_id)
+        result = await self.session.execute(stmt)
+        return result.scalar_one()
+
+    @instrument("repository")
+    async def claim(self, worker: str, lease: float) -> Optional[ReembeddingJobModel]:
+        now = utcnow()
+        candidate = select(ReembeddingJobModel.id).where(
+            ReembeddingJobModel.status.in_(ACTIVE),
+            or_(ReembeddingJobModel.locked_until.is_(None), ReembeddingJobModel.locked_until < now)
+        ).order_by(ReembeddingJobModel.created_at).limit(1).with_for_update(skip_locked=True).scalar_subquery()
+        stmt = update(ReembeddingJobModel).where(ReembeddingJobModel.id == candidate).values(
+            status="running",
+            locked_by=worker,
+            locked_until=now + timedelta(seconds=lease),
+            attempts=ReembeddingJobModel.attempts + 1,
+            updated_at=now
+        ).returning(ReembeddingJobModel)
+        result = await self.session.execute(stmt)
+        return result.scalar_one_or_none()
+
+    @instrument("repository")
+    async def checkpoint(self, job_id: uuid.UUID, worker: str, cursor: uuid.UUID, processed: int, lease: float) -> bool:
+        now = utcnow()
+        stmt = update(ReembeddingJobModel).where(
+            ReembeddingJobModel.id == job_id,
+            ReembeddingJobModel.locked_by == worker
+        ).values(
+            cursor=cursor,
+            processed=processed,
+            locked_until=now + timedelta(seconds=lease),
+            updated_at=now
+        ).returning(ReembeddingJobModel.id)
+        result = await self.session.execute(stmt)
+        return result.scalar_one_or_none() is not None
+
+    @instrument("repository")
+    async def heartbeat(self, job_id: uuid.UUID, worker: str, lease: float) -> bool:
+        stmt = update(ReembeddingJobModel).where(
+            ReembeddingJobModel.id == job_id,
+            ReembeddingJobModel.locked_by == worker
+        ).values(locked_until=utcnow() + timedelta(seconds=lease)).returning(ReembeddingJobModel.id)
+        result = await self.session.execute(stmt)
+        return result.scalar_one_or_none() is not None
+
+    async def finish(self, job_id: uuid.UUID, status: str, error: Optional[str] = None, retry_at: Optional[datetime] = None):
+        stmt = update(ReembeddingJobModel).where(ReembeddingJobModel.id == job_id).values(
+            status=status,
+            error=error,
+            locked_by=None,
+            locked_until=retry_at,
+            updated_at=utcnow()
+        )
+        await self.session.execute(stmt)
+
+    @instrument("repository", rows=True)
+    async def rows(self, knowledge_group_id: uuid.UUID, after: Optional[uuid.UUID], limit: int) -> List[Tuple[uuid.UUID, str]]:
+        stmt = select(KnowledgeBaseModel.id, KnowledgeBaseModel.content).where(
+            KnowledgeBaseModel.knowledge_group_id == knowledge_group_id
+        )
+        if after is not None:
+            stmt = stmt.where(KnowledgeBaseModel.id > after)
+        result = await self.session.execute(stmt.order_by(KnowledgeBaseModel.id).limit(limit))
+        return [tuple(row) for row in result.all()]
+
+    @instrument("repository", rows=True)
+    async def missing(self, job_id: uuid.UUID, knowledge_group_id: uuid.UUID, limit: int) -> List[Tuple[uuid.UUID, str]]:
+        staged = exists().where(
+            KnowledgeBaseEmbeddingModel.job_id == job_id,
+            KnowledgeBaseEmbeddingModel.knowledge_base_id == KnowledgeBaseModel.id
+        )
+        stmt = select(KnowledgeBaseModel.id, KnowledgeBaseModel.content).where(
+            KnowledgeBaseModel.knowledge_group_id == knowledge_group_id,
+            ~staged
+        ).order_by(KnowledgeBaseModel.id).limit(limit)
+        result = await self.session.execute(stmt)
+        return [tuple(row) for row in result.all()]
+
+    @instrument("repository")
+    async def stage(self, job_id: uuid.UUID, rows: List[Tuple[uuid.UUID, List[float]]]):
+        observe(row_counts, len(rows), "ReembeddingRepository.stage")
+        stmt = pg_insert(KnowledgeBaseEmbeddingModel).values([
+            {"job_id": job_id, "knowledge_base_id": knowledge_base_id, "embedding": embedding}
+            for knowledge_base_id, embedding in rows
+        ])
+        await self.session.execute(stmt.on_conflict_do_update(
+            index_elements=["job_id", "knowledge_base_id"],
+            set_={"embedding": stmt.excluded.embedding}
+        ))
+
+    async def discard(self, job_id: uuid.UUID):
+        await self.session.execute(delete(KnowledgeBaseEmbeddingModel).where(KnowledgeBaseEmbeddingModel.job_id == job_id))
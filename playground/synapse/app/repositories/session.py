@@ -0,0 +1,75 @@
+import uuid
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..metrics import instrument, observe, row_counts
+from ..models import MessageModel, SessionModel
+
+class SessionRepository:
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def create(self, model: SessionModel):
+        self.session.add(model)
+
+    @instrument("repository")
+    async def touch(self, session_id: uuid.UUID, count: int) -> Optional[Tuple[Optional[datetime], datetime]]:
+        previous = select(SessionModel.updated_at).where(SessionModel.id == session_id).with_for_update().cte("previous")
+        first = func.greatest(func.clock_timestamp(), previous.c.updated_at + timedelta(microseconds=1))
+        stmt = update(SessionModel).add_cte(previous).where(SessionModel.id == session_id).values(
+            updated_at=first + timedelta(microseconds=max(count - 1, 0))
+        ).returning(previous.c.updated_at, SessionModel.updated_at)
+        result = await self.session.execute(stmt)
+        row = result.one_or_none()
+        return None if row is None else (row[0], row[1])
+
+    async def updated_at(self, session_id: uuid.UUID) -> Optional[datetime]:
+        result = await self.session.execute(select(SessionModel.updated_at).where(SessionModel.id == session_id))
+        return result.scalar_one_or_none()
+
+    async def exists(self, session_id: uuid.UUID) -> bool:
+        result = await self.session.execute(select(SessionModel.id).where(SessionModel.id == session_id))
+        return result.scalar_one_or_none() is not None
+
+    @instrument("repository")
+    async def append(self, rows: List[Dict[str, Any]]):
+        observe(row_counts, len(rows), "SessionRepository.append")
+        await self.session.execute(insert(MessageModel).values(rows))
+
+    @instrument("repository", rows=True)
+    async def page(
+        self,
+        session_id: uuid.UUID,
+        limit: int,
+        after: Optional[Tuple[datetime, uuid.UUID]] = None
+    ) -> List[MessageModel]:
+        stmt = select(MessageModel).where(MessageModel.session_id == session_id)
+        if after is not None:
+            stmt = stmt.where(tuple_(MessageModel.created_at, MessageModel.id) > tuple_(*after))
+        stmt = stmt.order_by(MessageModel.created_at, MessageModel.id).limit(limit)
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+
+    @instrument("repository", rows=True)
+    async def tail(self, session_id: uuid.UUID, max_tokens: int, limit: int) -> List[MessageModel]:
+        total = func.sum(MessageModel.tokens).over(
+            order_by=(MessageModel.created_at.desc(), MessageModel.id.desc())
+        )
+        recent = select(
+            MessageModel.id,
+            (total - MessageModel.tokens).label("before")
+        ).where(
+            MessageModel.session_id == session_id
+        ).order_by(MessageModel.created_at.desc(), MessageModel.id.desc()).limit(limit).subquery()
+        stmt = select(MessageModel).join(
+            recent, recent.c.id == MessageModel.id
+        ).where(
+            recent.c.before <= max_tokens
+        ).order_by(MessageModel.created_at.desc(), MessageModel.id.desc())
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
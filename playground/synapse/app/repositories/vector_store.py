@@ -0,0 +1,411 @@
+import os
+import json
+import mmap
+import uuid
+import fcntl
+import asyncio
+
+import numpy as np
+
+from copy import copy as shallow_copy
+from pathlib import Path
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Protocol, Tuple, Union
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, SessionTransaction
+
+from ..metrics import instrument
+from ..models import KnowledgeBaseModel
+from ..schemas import SearchContent, SearchPlan
+from ..settings import settings
+from .knowledge_base import KnowledgeBaseRepository
+
+CopyRow = Tuple[uuid.UUID, uuid.UUID, uuid.UUID, int, int, int, str, str, List[float]]
+
+class VectorStore(Protocol):
+
+    async def generation(self, knowledge_group_id: uuid.UUID) -> int: ...
+
+    async def bump_generation(self, knowledge_group_id: uuid.UUID): ...
+
+    async def count(self, knowledge_group_id: uuid.UUID, limit: int) -> int: ...
+
+    async def add(self, models: List[KnowledgeBaseModel]): ...
+
+    async def copy(self, rows: List[CopyRow]): ...
+
+    async def search(
+        self,
+        knowledge_group_id: uuid.UUID,
+        qemb: List[float],
+        k: int = 5,
+        threshold: Optional[float] = None,
+        collapse: bool = False,
+        plan: Optional[SearchPlan] = None,
+        content: SearchContent = "full",
+        vectors: bool = False
+    ) -> List[Dict[str, Any]]: ...
+
+    async def batch_search(
+        self,
+        knowledge_group_id: uuid.UUID,
+        qembs: List[List[float]],
+        k: int = 5,
+        threshold: Optional[float] = None,
+        plan: Optional[SearchPlan] = None
+    ) -> List[Tuple[int, KnowledgeBaseModel, float, float]]: ...
+
+    async def hybrid_search(
+        self,
+        knowledge_group_id: uuid.UUID,
+        qemb: List[float],
+        query: str,
+        k: int = 5,
+        threshold: Optional[float] = None,
+        vector_weight: float = 1.0,
+        lexical_weight: float = 1.0,
+        plan: Optional[SearchPlan] = None,
+        content: SearchContent = "full"
+    ) -> List[Dict[str, Any]]: ...
+
+@dataclass
+class Segment:
+    vectors: np.ndarray
+    offsets: np.ndarray
+    metadata: mmap.mmap
+
+    def values(self, index: int) -> Dict[str, Any]:
+        start = int(self.offsets[index])
+        end = int(self.offsets[index + 1])
+        values = json.loads(self.metadata[start:end])
+        for key in ("id", "document_id", "knowledge_group_id"):
+            values[key] = uuid.UUID(values[key])
+        return values
+
+class NumpyVectorStore:
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        dtype: str = "float32",
+        block_size: int = 65536,
+        score_rows: int = 4096,
+        max_segments: int = 16,
+        dimensions: int = 1536,
+        session: Optional[AsyncSession] = None
+    ):
+        self.path = Path(path)
+        self.dtype = np.dtype(dtype)
+        self.block_size = block_size
+        self.score_rows = score_rows
+        self.max_segments = max_segments
+        self.dimensions = dimensions
+        self.session = session
+        self.groups: Dict[uuid.UUID, Tuple[int, Dict[str, Segment]]] = {}
+
+    def bind(self, session: AsyncSession) -> "NumpyVectorStore":
+        bound = shallow_copy(self)
+        bound.session = session
+        return bound
+
+    def directory(self, knowledge_group_id: uuid.UUID) -> Path:
+        return self.path / str(knowledge_group_id)
+
+    def names(self, directory: Path) -> List[str]:
+        if not directory.exists():
+            return []
+        return sorted(path.name.removesuffix(".vectors.npy") for path in directory.glob("*.vectors.npy"))
+
+    def segments(self, knowledge_group_id: uuid.UUID) -> List[Segment]:
+        directory = self.directory(knowledge_group_id)
+        while True:
+            version = directory.stat().st_mtime_ns if directory.exists() else 0
+            cached = self.groups.get(knowledge_group_id)
+            if cached is not None and cached[0] == version:
+                return list(cached[1].values())
+            opened = cached[1] if cached is not None else {}
+            try:
+                segments = {name: opened.get(name) or self._open(directory, name) for name in self.names(directory)}
+            except FileNotFoundError:
+                continue
+            self.groups[knowledge_group_id] = (version, segments)
+            return list(segments.values())
+
+    def _open(self, directory: Path, name: str) -> Segment:
+        with open(directory / f"{name}.jsonl", "rb") as file:
+            metadata = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(file.fileno()).st_size else b""
+        return Segment(
+            vectors=np.load(directory / f"{name}.vectors.npy", mmap_mode="r"),
+            offsets=np.load(directory / f"{name}.offsets.npy"),
+            metadata=metadata
+        )
+
+    @contextmanager
+    def locked(self, directory: Path) -> Iterator[None]:
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / ".lock", "a") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    def _stage(self, directory: Path, vectors: np.ndarray, rows: List[bytes]) -> str:
+        pending = directory / "pending"
+        pending.mkdir(parents=True, exist_ok=True)
+        name = uuid.uuid4().hex
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        with open(pending / f"{name}.jsonl", "wb") as file:
+            for i, row in enumerate(rows):
+                file.write(row)
+                offsets[i + 1] = offsets[i] + len(row)
+            file.flush()
+            os.fsync(file.fileno())
+        np.save(pending / f"{name}.offsets.npy", offsets)
+        with open(pending / f"{name}.vectors.npy", "wb") as file:
+            np.save(file, vectors.astype(self.dtype))
+            file.flush()
+            os.fsync(file.fileno())
+        return name
+
+    def _discard(self, directory: Path, name: str):
+        for suffix in (".vectors.npy", ".offsets.npy", ".jsonl"):
+            (directory / "pending" / f"{name}{suffix}").unlink(missing_ok=True)
+
+    def _publish(self, directory: Path, name: str) -> List[str]:
+        names = self.names(directory)
+        number = f"{int(names[-1]) + 1 if names else 1:08d}"
+        for suffix in (".jsonl", ".offsets.npy", ".vectors.npy"):
+            os.replace(directory / "pending" / f"{name}{suffix}", directory / f"{number}{suffix}")
+        return names + [number]
+
+    def _commit(self, staged: List[Tuple[uuid.UUID, str]]):
+        for knowledge_group_id, name in staged:
+            directory = self.directory(knowledge_group_id)
+            with self.locked(directory):
+                names = self._publish(directory, name)
+            if len(names) > self.max_segments:
+                try:
+                    asyncio.get_running_loop().run_in_executor(None, self._compact, knowledge_group_id)
+                except RuntimeError:
+                    self._compact(knowledge_group_id)
+
+    def _compact(self, knowledge_group_id: uuid.UUID):
+        directory = self.directory(knowledge_group_id)
+        names = self.names(directory)
+        if len(names) <= self.max_segments:
+            return
+        try:
+            segments = [self._open(directory, name) for name in names]
+        except FileNotFoundError:
+            return
+        vectors = np.concatenate([np.asarray(segment.vectors) for segment in segments])
+        rows = [
+            segment.metadata[int(segment.offsets[i]):int(segment.offsets[i + 1])]
+            for segment in segments
+            for i in range(len(segment.offsets) - 1)
+        ]
+        merged = self._stage(directory, vectors, rows)
+        with self.locked(directory):
+            if not all((directory / f"{name}.vectors.npy").exists() for name in names):
+                self._discard(directory, merged)
+                return
+            self._publish(directory, merged)
+            for name in names:
+                for suffix in (".vectors.npy", ".offsets.npy", ".jsonl"):
+                    (directory / f"{name}{suffix}").unlink(missing_ok=True)
+
+    def _pending(self, session: AsyncSession) -> List[Tuple[uuid.UUID, str]]:
+        info = session.sync_session.info
+        if "numpy_vector_store" not in info:
+            info["numpy_vector_store"] = []
+            event.listen(session.sync_session, "after_commit", self._after_commit)
+            event.listen(session.sync_session, "after_transaction_end", self._after_transaction_end)
+        return info["numpy_vector_store"]
+
+    def _after_commit(self, session: Session):
+        staged, session.info["numpy_vector_store"] = session.info["numpy_vector_store"], []
+        self._commit(staged)
+
+    def _after_transaction_end(self, session: Session, transaction: SessionTransaction):
+        if transaction.parent is None:
+            staged, session.info["numpy_vector_store"] = session.info["numpy_vector_store"], []
+            for knowledge_group_id, name in staged:
+                self._discard(self.directory(knowledge_group_id), name)
+
+    def normalize(self, vectors: Any) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def _scores(self, vectors: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        if vectors.dtype == np.float32:
+            return np.asarray(vectors) @ queries.T
+        return np.concatenate([
+            np.asarray(vectors[start:start + self.score_rows], dtype=np.float32) @ queries.T
+            for start in range(0, len(vectors), self.score_rows)
+        ])
+
+    def _top(self, segments: List[Segment], queries: np.ndarray, limit: int) -> List[List[Tuple[float, int, int]]]:
+        candidates: List[List[Tuple[float, int, int]]] = [[] for _ in range(len(queries))]
+        for number, segment in enumerate(segments):
+            for start in range(0, len(segment.vectors), self.block_size):
+                block = segment.vectors[start:start + self.block_size]
+                similarities = self._scores(block, queries)
+                size = min(limit, len(block))
+                top = np.argpartition(-similarities, size - 1, axis=0)[:size]
+                for q in range(len(queries)):
+                    candidates[q].extend(
+                        (float(similarities[i, q]), number, start + int(i)) for i in top[:, q]
+                    )
+        return [sorted(items, reverse=True)[:limit] for items in candidates]
+
+    def _rows(
+        self,
+        segments: List[Segment],
+        candidates: List[Tuple[float, int, int]],
+        k: int,
+        threshold: Optional[float],
+        collapse: bool,
+        vectors: bool = False
+    ) -> List[Tuple[Dict[str, Any], float, float]]:
+        results, documents, seen = [], set(), set()
+        for similarity, number, index in candidates:
+            if threshold is not None and similarity < threshold:
+                break
+            values = segments[number].values(index)
+            if values["id"] in seen:
+                continue
+            seen.add(values["id"])
+            if collapse:
+                if values["document_id"] in documents:
+                    continue
+                documents.add(values["document_id"])
+            if vectors:
+                values["embedding"] = np.asarray(segments[number].vectors[index], dtype=np.float32)
+            results.append((values, 1 - similarity, similarity))
+            if len(results) == k:
+                break
+        return results
+
+    async def _top_async(self, segments: List[Segment], queries: np.ndarray, limit: int) -> List[List[Tuple[float, int, int]]]:
+        if sum(len(segment.vectors) for segment in segments) > self.block_size:
+            return await asyncio.to_thread(self._top, segments, queries, limit)
+        return self._top(segments, queries, limit)
+
+    def size(self, knowledge_group_id: uuid.UUID) -> int:
+        return sum(len(segment.vectors) for segment in self.segments(knowledge_group_id))
+
+    async def generation(self, knowledge_group_id: uuid.UUID) -> int:
+        if self.session is None:
+            return self.size(knowledge_group_id)
+        return await KnowledgeBaseRepository(self.session).generation(knowledge_group_id) + self.size(knowledge_group_id)
+
+    async def bump_generation(self, knowledge_group_id: uuid.UUID):
+        if self.session is not None:
+            await KnowledgeBaseRepository(self.session).bump_generation(knowledge_group_id)
+
+    async def count(self, knowledge_group_id: uuid.UUID, limit: int) -> int:
+        return min(self.size(knowledge_group_id), limit)
+
+    async def add(self, models: List[KnowledgeBaseModel]):
+        await self.copy([
+            (
+                model.id,
+                model.knowledge_group_id,
+                model.document_id,
+                model.chunk_index,
+                model.start_offset,
+                model.end_offset,
+                model.name,
+                model.content,
+                model.embedding
+            )
+            for model in models
+        ])
+
+    @instrument("repository")
+    async def copy(self, rows: List[CopyRow]):
+        groups: Dict[uuid.UUID, List[CopyRow]] = {}
+        for row in rows:
+            groups.setdefault(row[1], []).append(row)
+        for knowledge_group_id, group in groups.items():
+            vectors = self.normalize([row[8] for row in group])
+            if vectors.shape[1] != self.dimensions:
+                raise ValueError(f"Expected {self.dimensions} dimensions, got {vectors.shape[1]}")
+            metadata = [
+                json.dumps({
+                    "id": str(id),
+                    "document_id": str(document_id),
+                    "knowledge_group_id": str(knowledge_group_id),
+                    "chunk_index": chunk_index,
+                    "start_offset": start_offset,
+                    "end_offset": end_offset,
+                    "name": name,
+                    "content": content,
+                }).encode("utf-8")
+                for id, _, document_id, chunk_index, start_offset, end_offset, name, content, _ in group
+            ]
+            name = await asyncio.to_thread(self._stage, self.directory(knowledge_group_id), vectors, metadata)
+            if self.session is None:
+                self._commit([(knowledge_group_id, name)])
+            else:
+                self._pending(self.session).append((knowledge_group_id, name))
+
+    @instrument("repository", rows=True)
+    async def search(
+        self,
+        knowledge_group_id: uuid.UUID,
+        qemb: List[float],
+        k: int = 5,
+        threshold: Optional[float] = None,
+        collapse: bool = False,
+        plan: Optional[SearchPlan] = None,
+        content: SearchContent = "full",
+        vectors: bool = False
+    ) -> List[Dict[str, Any]]:
+        segments = list(self.segments(knowledge_group_id))
+        limit = k * settings.CHUNK_COLLAPSE_CANDIDATES if collapse else k
+        [candidates] = await self._top_async(segments, self.normalize([qemb]), limit)
+        results = []
+        for values, distance, similarity in self._rows(segments, candidates, k, threshold, collapse, vectors):
+            del values["knowledge_group_id"]
+            if content == "none":
+                del values["content"]
+            elif content == "snippet":
+                values["content"] = values["content"][:settings.SEARCH_SNIPPET_CHARS]
+            results.append({**values, "distance": distance, "similarity": similarity})
+        return results
+
+    @instrument("repository", rows=True)
+    async def batch_search(
+        self,
+        knowledge_group_id: uuid.UUID,
+        qembs: List[List[float]],
+        k: int = 5,
+        threshold: Optional[float] = None,
+        plan: Optional[SearchPlan] = None
+    ) -> List[Tuple[int, KnowledgeBaseModel, float, float]]:
+        segments = list(self.segments(knowledge_group_id))
+        candidates = await self._top_async(segments, self.normalize(qembs), k)
+        return [
+            (query_index, KnowledgeBaseModel(**values), distance, similarity)
+            for query_index, items in enumerate(candidates)
+            for values, distance, similarity in self._rows(segments, items, k, threshold, False)
+        ]
+
+    async def hybrid_search(self, *args, **kwargs) -> List[Dict[str, Any]]:
+        raise ValueError("Hybrid search is not supported by the numpy vector store")
+
+numpy_store = NumpyVectorStore(
+    path=settings.VECTOR_STORE_PATH,
+    dtype=settings.VECTOR_STORE_DTYPE
+)
+
+def get_vector_store(session: AsyncSession) -> VectorStore:
+    if settings.VECTOR_STORE == "numpy":
+        return numpy_store.bind(session)
+    return KnowledgeBaseRepository(session)
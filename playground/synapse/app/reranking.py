@@ -0,0 +1,101 @@
+import asyncio
+
+import numpy as np
+
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Protocol, Sequence
+from concurrent.futures import ThreadPoolExecutor
+
+from .embedding import load_onnx, onnx_feed
+from .metrics import span
+from .settings import settings
+
+class CrossEncoderScorer(Protocol):
+
+    async def score(self, query: str, texts: List[str]) -> List[float]: ...
+
+class OnnxCrossEncoder:
+
+    def __init__(self, path: str, max_length: int = 512, max_workers: int = 2):
+        self.path = Path(path)
+        self.max_length = max_length
+        self.max_workers = max_workers
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.session = None
+        self.tokenizer = None
+        self.inputs: List[str] = []
+
+    def infer(self, query: str, texts: List[str]) -> List[float]:
+        if self.session is None:
+            self.session, self.tokenizer, self.inputs = load_onnx(self.path, self.max_length)
+        feed = onnx_feed(self.tokenizer.encode_batch([(query, text) for text in texts]))
+        [logits, *_] = self.session.run(None, {name: feed[name] for name in self.inputs})
+        return logits.reshape(len(texts), -1)[:, -1].astype(np.float32).tolist()
+
+    async def score(self, query: str, texts: List[str]) -> List[float]:
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="rerank")
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.infer, query, texts)
+
+scorers: Dict[str, CrossEncoderScorer] = {}
+
+if settings.RERANK_MODEL_PATH:
+    scorers["onnx"] = OnnxCrossEncoder(settings.RERANK_MODEL_PATH, settings.RERANK_MAX_LENGTH, settings.RERANK_THREADS)
+
+def register_scorer(name: str, scorer: CrossEncoderScorer):
+    scorers[name] = scorer
+
+def get_scorer(name: Optional[str] = None) -> CrossEncoderScorer:
+    name = name or settings.RERANK_SCORER
+    if name not in scorers:
+        raise ValueError(f"Cross-encoder scorer '{name}' is not configured")
+    return scorers[name]
+
+def normalize(vectors: Any) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+def matrix(embeddings: Sequence[Any]) -> np.ndarray:
+    if isinstance(embeddings[0], (bytes, memoryview)):
+        return normalize(np.frombuffer(b"".join(embeddings), dtype=">f4").reshape(len(embeddings), -1)[:, 1:])
+    return normalize(np.stack(embeddings))
+
+def mmr(query: np.ndarray, vectors: np.ndarray, k: int, mmr_lambda: float, relevance: Optional[np.ndarray] = None) -> List[int]:
+    if relevance is None:
+        relevance = vectors @ query
+    k = min(k, len(vectors))
+    selected = [int(np.argmax(relevance))]
+    redundancy = vectors @ vectors[selected[0]]
+    scores = mmr_lambda * relevance
+    scores[selected[0]] = -np.inf
+    while len(selected) < k:
+        candidates = scores - (1 - mmr_lambda) * redundancy
+        i = int(np.argmax(candidates))
+        selected.append(i)
+        scores[i] = -np.inf
+        np.maximum(redundancy, vectors @ vectors[i], out=redundancy)
+    return selected
+
+async def rerank(
+    query: str,
+    qemb: List[float],
+    results: List[Dict[str, Any]],
+    k: int,
+    method: str,
+    mmr_lambda: float
+) -> List[Dict[str, Any]]:
+    if not results:
+        return results
+    vectors = matrix([result.pop("embedding") for result in results])
+    relevance = None
+    if method == "cross_encoder":
+        with span("rerank", "cross_encoder"):
+            scores = np.asarray(await get_scorer().score(query, [result["content"] for result in results]), dtype=np.float32)
+        for result, score in zip(results, scores):
+            result["score"] = float(score)
+        spread = scores.max() - scores.min()
+        relevance = (scores - scores.min()) / spread if spread else np.ones_like(scores)
+    with span("rerank", "mmr"):
+        order = mmr(normalize(qemb), vectors, k, mmr_lambda, relevance)
+    return [results[i] for i in order]
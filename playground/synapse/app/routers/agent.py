@@ -1,7 +1,12 @@
+import json
+import uuid
+
+from typing import AsyncIterator
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 
-from ..schemas import Identity, AgentCreate
-from ..services.agent import AgentService
+from ..schemas import Identity, AgentCreate, AgentRun, AgentTree, AgentTreeNode, LLMConfig
+from ..services.agent import AgentRunService, AgentService
 
 router = APIRouter(prefix="/agents", tags=["agents"])
 
@@ -15,4 +20,50 @@ async def create(schema: AgentCreate, service: AgentService = Depends()) -> Iden
         id = await service.create(schema)
         return Identity(id=id)
     except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.put("/{agent_id}", response_model=Identity)
+async def update(agent_id: uuid.UUID, schema: AgentCreate, service: AgentService = Depends()) -> Identity:
+    try:
+        id = await service.update(agent_id, schema)
+        return Identity(id=id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/{agent_id}/graph", response_model=AgentTree)
+async def graph(agent_id: uuid.UUID, service: AgentService = Depends()) -> AgentTree:
+    try:
+        graph = await service.graph(agent_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return AgentTree(
+        root_id=graph.root_id,
+        agents=[
+            AgentTreeNode(
+                id=node.id,
+                name=node.name,
+                description=node.description,
+                instructions=node.instructions,
+                model=LLMConfig(name=node.model, settings=dict(node.model_settings)),
+                sub_agents=list(node.sub_agents)
+            )
+            for node in graph
+        ]
+    )
+
+@router.post("/{agent_id}/run")
+async def run(agent_id: uuid.UUID, schema: AgentRun, service: AgentRunService = Depends()) -> StreamingResponse:
+    try:
+        graph, history = await service.prepare(agent_id, schema)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def events() -> AsyncIterator[str]:
+        async for event, data in service.run(graph, history, schema):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Response, status
+
+from ..schemas import Readiness
+from ..warmup import warmup
+
+router = APIRouter(tags=["health"])
+
+@router.get("/ready", response_model=Readiness)
+async def ready(response: Response) -> Readiness:
+    if not warmup.ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return Readiness(**warmup.stats())
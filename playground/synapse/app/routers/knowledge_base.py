@@ -1,27 +1,78 @@
 import uuid
 
 from typing import List, Optional
-from fastapi import Query, APIRouter, Depends, HTTPException, status
+from fastapi import Query, APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
 
-from ..schemas import KnowledgeBase, KnowledgeBaseSearch
-from ..services.knowledge_base import KnowledgeBaseService
+from ..schemas import (
+    Identity,
+    IngestionJob,
+    KnowledgeBase,
+    KnowledgeBaseSearch,
+    KnowledgeBaseBatchSearch,
+    KnowledgeBaseBatchSearchResult,
+    DedupStats,
+    SearchContent,
+    SearchMode,
+    SearchPlan,
+    SearchProfile,
+    SearchRerank
+)
+from ..metrics import span
+from ..services.knowledge_base import KnowledgeBaseService, read_ndjson
 
 router = APIRouter(prefix="/knowledge-groups/{knowledge_group_id}/knowledge-bases", tags=["knowledge-bases"])
 
+def plan_header(plan: SearchPlan) -> str:
+    return ";".join(f"{key}={value}" for key, value in plan.model_dump(exclude_none=True).items())
+
+def dedup_header(stats: DedupStats) -> str:
+    return ";".join(f"{key}={value}" for key, value in stats.model_dump(exclude={"matches"}).items())
+
 @router.post(
     "/", 
     status_code=status.HTTP_201_CREATED,
     response_model=List[uuid.UUID]
 )
-async def create(knowledge_group_id: uuid.UUID, documents: List[KnowledgeBase], service: KnowledgeBaseService = Depends()) -> List[uuid.UUID]:
+async def create(
+    knowledge_group_id: uuid.UUID,
+    documents: List[KnowledgeBase],
+    response: Response,
+    service: KnowledgeBaseService = Depends()
+) -> List[uuid.UUID]:
     try:
-        ids = await service.create(knowledge_group_id, documents)
+        ids, stats = await service.create(knowledge_group_id, documents)
+        if stats is not None:
+            response.headers["X-Dedup"] = dedup_header(stats)
+            response.headers["X-Dedup-Matches"] = ",".join(f"{i}={id}" for i, id in stats.matches.items())
         return ids
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/-/jobs", status_code=status.HTTP_202_ACCEPTED, response_model=Identity)
+async def enqueue(knowledge_group_id: uuid.UUID, documents: List[KnowledgeBase], service: KnowledgeBaseService = Depends()) -> Identity:
+    try:
+        id = await service.enqueue(knowledge_group_id, documents)
+        return Identity(id=id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/-/jobs/{job_id}", response_model=IngestionJob)
+async def job(knowledge_group_id: uuid.UUID, job_id: uuid.UUID, service: KnowledgeBaseService = Depends()) -> IngestionJob:
+    job = await service.job(knowledge_group_id, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+    return job
+
+@router.post("/-/ingest", status_code=status.HTTP_201_CREATED)
+async def ingest(knowledge_group_id: uuid.UUID, request: Request, service: KnowledgeBaseService = Depends()) -> StreamingResponse:
+    async def progress():
+        async for item in service.ingest(knowledge_group_id, read_ndjson(request.stream())):
+            yield item.model_dump_json() + "\n"
+    return StreamingResponse(progress(), status_code=status.HTTP_201_CREATED, media_type="application/x-ndjson")
     
 
-@router.get("/-/search", response_model=List[KnowledgeBaseSearch])
+@router.get("/-/search", response_model=List[KnowledgeBaseSearch], response_class=ORJSONResponse)
 async def search(
     knowledge_group_id: uuid.UUID,
     q: str = Query(..., description="Query text"),
@@ -32,9 +83,39 @@ async def search(
         le=1.0,
         description="Relevance Threshold (minimum similarity 0..1). Ex.: 0.40",
     ),
+    collapse: bool = Query(False, description="Collapse chunk hits to their best chunk per parent document"),
+    profile: Optional[SearchProfile] = Query(None, description="Recall/latency profile: fast or accurate"),
+    mode: SearchMode = Query("vector", description="Search mode: vector or hybrid (lexical + vector with reciprocal rank fusion)"),
+    vector_weight: Optional[float] = Query(None, ge=0.0, description="Hybrid mode weight of the vector ranking"),
+    lexical_weight: Optional[float] = Query(None, ge=0.0, description="Hybrid mode weight of the lexical ranking"),
+    content: SearchContent = Query("full", description="Content projection: full, snippet (truncated) or none"),
+    rerank: Optional[SearchRerank] = Query(
+        None,
+        description="Re-rank over-fetched candidates: mmr (maximal marginal relevance) or cross_encoder (scored, then MMR)"
+    ),
+    mmr_lambda: Optional[float] = Query(None, ge=0.0, le=1.0, description="MMR trade-off: 1.0 relevance only, 0.0 diversity only"),
+    service: KnowledgeBaseService = Depends(),
+) -> ORJSONResponse:
+    try:
+        results, plan = await service.search(
+            knowledge_group_id, q, k, threshold, collapse, profile, mode, vector_weight, lexical_weight, content,
+            rerank, mmr_lambda
+        )
+        with span("router", "serialize"):
+            return ORJSONResponse(results, headers={"X-Search-Plan": plan_header(plan)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/-/search/batch", response_model=List[KnowledgeBaseBatchSearchResult])
+async def batch_search(
+    knowledge_group_id: uuid.UUID,
+    schema: KnowledgeBaseBatchSearch,
+    response: Response,
     service: KnowledgeBaseService = Depends(),
-) -> List[KnowledgeBaseSearch]:
+) -> List[KnowledgeBaseBatchSearchResult]:
     try:
-        return await service.search(knowledge_group_id, q, k, threshold)
+        results, plan = await service.batch_search(knowledge_group_id, schema)
+        response.headers["X-Search-Plan"] = plan_header(plan)
+        return results
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
@@ -0,0 +1,53 @@
+import uuid
+
+from typing import List, Optional
+from fastapi import Query, APIRouter, Depends, HTTPException, status
+
+from ..schemas import Identity, Message, MessagePage
+from ..services.session import SessionService
+from ..settings import settings
+
+router = APIRouter(prefix="/sessions", tags=["sessions"])
+
+@router.post(
+    "/",
+    status_code=status.HTTP_201_CREATED,
+    response_model=Identity
+)
+async def create(service: SessionService = Depends()) -> Identity:
+    id = await service.create()
+    return Identity(id=id)
+
+@router.post(
+    "/{session_id}/messages",
+    status_code=status.HTTP_201_CREATED,
+    response_model=List[Message]
+)
+async def append(session_id: uuid.UUID, messages: List[Message], service: SessionService = Depends()) -> List[Message]:
+    try:
+        return await service.append(session_id, messages)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/{session_id}/messages", response_model=MessagePage)
+async def page(
+    session_id: uuid.UUID,
+    cursor: Optional[str] = Query(None, description="Opaque cursor returned as next_cursor by the previous page"),
+    limit: int = Query(settings.SESSION_PAGE_SIZE, ge=1, le=500, description="Maximum number of messages"),
+    service: SessionService = Depends(),
+) -> MessagePage:
+    try:
+        return await service.page(session_id, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/{session_id}/messages/-/tail", response_model=List[Message])
+async def tail(
+    session_id: uuid.UUID,
+    max_tokens: int = Query(settings.SESSION_TAIL_TOKENS, ge=1, description="Token budget of the most recent messages"),
+    service: SessionService = Depends(),
+) -> List[Message]:
+    try:
+        return await service.tail(session_id, max_tokens)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
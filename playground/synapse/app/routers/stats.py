@@ -0,0 +1,50 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from ..schemas import EmbeddingSchedulerStats, EmbeddingCacheStats, SearchCacheStats, AnswerCacheStats, PoolStats, AgentRunnerStats, IngestionStats
+from ..database import pool_stats
+from ..agent_runner import runner
+from ..embedding import Embedder, get_embedder
+from ..services.agent import answer_cache
+from ..services.knowledge_base import KnowledgeBaseService, search_cache
+
+router = APIRouter(prefix="/stats", tags=["stats"])
+
+def embedder(provider: Optional[str]) -> Embedder:
+    try:
+        return get_embedder(provider)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.get("/embeddings", response_model=EmbeddingSchedulerStats)
+async def embeddings(provider: Optional[str] = None) -> EmbeddingSchedulerStats:
+    return EmbeddingSchedulerStats(**embedder(provider).scheduler.stats())
+
+
+@router.get("/embedding-cache", response_model=EmbeddingCacheStats)
+async def embedding_cache_stats(provider: Optional[str] = None) -> EmbeddingCacheStats:
+    return EmbeddingCacheStats(**embedder(provider).cache.stats())
+
+@router.get("/search-cache", response_model=SearchCacheStats)
+async def search_cache_stats() -> SearchCacheStats:
+    return SearchCacheStats(**search_cache.stats())
+
+@router.get("/answer-cache", response_model=AnswerCacheStats)
+async def answer_cache_stats() -> AnswerCacheStats:
+    return AnswerCacheStats(**answer_cache.stats())
+
+@router.get("/pool", response_model=List[PoolStats])
+async def pool() -> List[PoolStats]:
+    return [PoolStats(**item) for item in pool_stats()]
+
+@router.get("/agents", response_model=AgentRunnerStats)
+async def agents() -> AgentRunnerStats:
+    return AgentRunnerStats(**runner.stats())
+
+@router.get("/ingestion", response_model=IngestionStats)
+async def ingestion(
+    window: float = Query(3600.0, gt=0, description="Seconds of finished jobs to aggregate"),
+    service: KnowledgeBaseService = Depends()
+) -> IngestionStats:
+    return IngestionStats(**await service.ingestion_stats(window))
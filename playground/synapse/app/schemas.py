@@ -1,7 +1,8 @@
 import uuid
 
-from typing import Any, List, Dict, Optional
-from pydantic import BaseModel
+from datetime import datetime
+from typing import Any, List, Dict, Literal, Optional
+from pydantic import BaseModel, Field
 
 class Identity(BaseModel):
     id: uuid.UUID
@@ -20,10 +21,40 @@ class Agent(BaseModel):
 class AgentCreate(Agent):
     sub_agents: Optional[List[uuid.UUID]] = None
 
+class AgentRun(BaseModel):
+    input: str = Field(..., min_length=1)
+    session_id: Optional[uuid.UUID] = None
+    knowledge_group_id: Optional[uuid.UUID] = None
+    k: int = Field(5, ge=1, le=50)
+    stream_sub_agents: bool = False
+    cache: bool = True
+
+class AgentTreeNode(Agent):
+    sub_agents: List[uuid.UUID] = []
+
+class AgentTree(BaseModel):
+    root_id: uuid.UUID
+    agents: List[AgentTreeNode]
+
+MessageRole = Literal["system", "user", "assistant", "tool"]
+
+class Message(BaseModel):
+    id: Optional[uuid.UUID] = None
+    role: MessageRole = "user"
+    content: str
+    labels: Optional[Dict[str, Any]] = None
+    tokens: Optional[int] = None
+    created_at: Optional[datetime] = None
+
+class MessagePage(BaseModel):
+    items: List[Message]
+    next_cursor: Optional[str] = None
+
 class KnowledgeGroup(BaseModel):
     id: Optional[uuid.UUID] = None
     name: str
     description: str
+    embedding_provider: Optional[str] = None
 
 class KnowledgeBase(BaseModel):
     id: Optional[uuid.UUID] = None
@@ -31,5 +62,160 @@ class KnowledgeBase(BaseModel):
     content: str
 
 class KnowledgeBaseSearch(KnowledgeBase):
+    content: Optional[str] = None
+    document_id: Optional[uuid.UUID] = None
+    chunk_index: Optional[int] = None
+    start_offset: Optional[int] = None
+    end_offset: Optional[int] = None
     distance: float
-    similarity: float
\ No newline at end of file
+    similarity: float
+    vector_rank: Optional[int] = None
+    lexical_rank: Optional[int] = None
+    lexical_score: Optional[float] = None
+    score: Optional[float] = None
+
+SearchProfile = Literal["fast", "accurate"]
+SearchMode = Literal["vector", "hybrid"]
+SearchContent = Literal["full", "snippet", "none"]
+SearchRerank = Literal["mmr", "cross_encoder"]
+
+class KnowledgeBaseBatchSearch(BaseModel):
+    queries: List[str] = Field(..., min_length=1, max_length=64)
+    k: int = Field(5, ge=1, le=50)
+    threshold: Optional[float] = Field(None, ge=0.0, le=1.0)
+    dedupe: bool = False
+    profile: Optional[SearchProfile] = None
+
+class KnowledgeBaseBatchSearchResult(BaseModel):
+    query: str
+    results: List[KnowledgeBaseSearch]
+
+class SearchPlan(BaseModel):
+    profile: SearchProfile
+    mode: Literal["exact", "ann"]
+    group_size: int
+    index: Optional[str] = None
+    ef_search: Optional[int] = None
+    iterative_scan: Optional[str] = None
+    max_scan_tuples: Optional[int] = None
+
+class DedupStats(BaseModel):
+    documents: int
+    duplicates: int
+    candidates: int
+    threshold: float
+    matches: Dict[int, uuid.UUID] = {}
+
+IngestionJobStatus = Literal["pending", "running", "completed", "failed"]
+
+class IngestionJob(BaseModel):
+    id: uuid.UUID
+    knowledge_group_id: uuid.UUID
+    status: IngestionJobStatus
+    documents: int
+    duplicates: int
+    document_ids: Optional[List[uuid.UUID]] = None
+    attempts: int
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class IngestionStats(BaseModel):
+    pending: int
+    running: int
+    completed: int
+    failed: int
+    retried: int
+    avg_queue_ms: float
+    avg_run_ms: float
+    documents_per_second: float
+
+class IngestProgress(BaseModel):
+    status: str
+    documents: int
+    chunks: int
+    batches: int
+    tokens: int
+    duplicates: int = 0
+    elapsed_seconds: float
+    read_per_second: float
+    embed_per_second: float
+    write_per_second: float
+    error: Optional[str] = None
+
+class EmbeddingSchedulerStats(BaseModel):
+    model: str
+    batches: int
+    requests: int
+    texts: int
+    errors: int
+    pending: int
+    in_flight: int
+    avg_batch_size: float
+    max_batch_size: int
+    avg_wait_ms: float
+    max_wait_ms: float
+    avg_call_ms: float
+
+class EmbeddingCacheStats(BaseModel):
+    model: str
+    size: int
+    max_size: int
+    evictions: int
+    memory_hits: int
+    persistent_hits: int
+    persistent_purged: int
+    misses: int
+    persistent: bool
+
+class SearchCacheStats(BaseModel):
+    size: int
+    max_size: int
+    hits: int
+    misses: int
+    evictions: int
+    hit_ratio: float
+    saved_seconds: float
+
+class AnswerCacheStats(BaseModel):
+    size: int
+    max_size: int
+    partitions: int
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+    hit_ratio: float
+    saved_seconds: float
+
+class Readiness(BaseModel):
+    status: str
+    phase: Optional[str] = None
+    elapsed_ms: float
+    groups: int
+    rounds: int
+    searches: int
+    p99_ms: Optional[float] = None
+    prewarmed_blocks: int
+    restarts: int = 0
+    errors: List[str] = []
+
+class PoolStats(BaseModel):
+    name: str
+    size: int
+    checked_in: int
+    checked_out: int
+    overflow: int
+    checkouts: int
+    avg_wait_ms: float
+    max_wait_ms: float
+
+class AgentRunnerStats(BaseModel):
+    runs: int
+    calls: int
+    errors: int
+    timeouts: int
+    avg_ttft_ms: float
+    max_ttft_ms: float
+    avg_latency_ms: float
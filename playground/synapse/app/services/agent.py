@@ -1,17 +1,43 @@
+import time
 import uuid
 
+from types import MappingProxyType
+from typing import AsyncIterator, Dict, Hashable, List, Optional, Tuple
+
 from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..schemas import AgentCreate
+from ..schemas import AgentCreate, AgentRun, Message
 from ..decorators import transactional
-from ..models import LLMConfig, AgentModel, NestedAgentModel
+from ..models import LLMConfig, AgentModel
+from ..cache import LRUCache, SemanticCache
+from ..settings import settings
 from ..database import get_session
+from ..agent_graph import AgentGraph, AgentNode, compile_graph, fingerprint
+from ..agent_runner import AgentEvent, runner
+from ..embedding import get_embedder
+from ..repositories.agent import AgentRepository
+from .knowledge_base import KnowledgeBaseService
+from .session import SessionService
+
+agent_graphs = LRUCache(max_size=settings.AGENT_GRAPH_CACHE_SIZE, ttl=settings.AGENT_GRAPH_CACHE_TTL)
+answer_cache = SemanticCache(
+    max_size=settings.ANSWER_CACHE_SIZE,
+    ttl=settings.ANSWER_CACHE_TTL,
+    threshold=settings.ANSWER_CACHE_THRESHOLD
+)
+
+AnswerKey = Tuple[Hashable, Hashable, List[float]]
+
+def invalidate_graphs(agent_id: uuid.UUID):
+    agent_graphs.discard(lambda _, graph: agent_id in graph)
+    answer_cache.invalidate(agent_id)
 
 class AgentService:
 
     def __init__(self, session: AsyncSession = Depends(get_session)):
         self.session = session
+        self.repository = AgentRepository(session)
 
     @transactional
     async def create(self, schema: AgentCreate) -> uuid.UUID:
@@ -26,15 +52,155 @@ class AgentService:
             )
         )
 
-        self.session.add(model)
+        await self.repository.create(model)
 
         if schema.sub_agents:
-            for sub_agent_id in schema.sub_agents:
-                self.session.add(
-                    NestedAgentModel(
-                        agent_id=model.id,
-                        sub_agent_id=sub_agent_id
-                    )
-                )
-
-        return model.id
\ No newline at end of file
+            await self.session.flush()
+            await self.repository.add_edges(model.id, schema.sub_agents)
+
+        return model.id
+
+    async def update(self, agent_id: uuid.UUID, schema: AgentCreate) -> uuid.UUID:
+        await self._update(agent_id, schema)
+        invalidate_graphs(agent_id)
+        return agent_id
+
+    @transactional
+    async def _update(self, agent_id: uuid.UUID, schema: AgentCreate):
+
+        model = await self.repository.get(agent_id, lock=True)
+        if model is None:
+            raise ValueError(f"Agent {agent_id} not found")
+
+        model.name = schema.name
+        model.description = schema.description
+        model.instructions = schema.instructions
+        model.model = LLMConfig(
+            name=schema.model.name,
+            settings=schema.model.settings
+        )
+        model.generation += 1
+
+        await self.repository.delete_edges(agent_id)
+        await self.repository.add_edges(agent_id, schema.sub_agents or [])
+        await self.session.flush()
+        await self._compile(agent_id)
+
+    async def graph(self, root_id: uuid.UUID) -> AgentGraph:
+        graph = agent_graphs.get(root_id)
+        if graph is not None:
+            generations = await self._generations(graph)
+            stale = [agent_id for agent_id, generation in graph.generations.items() if generations.get(agent_id) != generation]
+            for agent_id in stale:
+                invalidate_graphs(agent_id)
+            if stale:
+                graph = None
+        if graph is None:
+            graph = await self._load(root_id)
+            agent_graphs.set(root_id, graph)
+        return graph
+
+    @transactional
+    async def _generations(self, graph: AgentGraph) -> Dict[uuid.UUID, int]:
+        return await self.repository.generations(list(graph.nodes))
+
+    @transactional
+    async def _load(self, root_id: uuid.UUID) -> AgentGraph:
+        return await self._compile(root_id)
+
+    async def _compile(self, root_id: uuid.UUID) -> AgentGraph:
+        rows = await self.repository.tree(root_id)
+        return compile_graph(root_id, [
+            AgentNode(
+                id=model.id,
+                name=model.name,
+                description=model.description,
+                instructions=model.instructions,
+                model=model.model.name,
+                model_settings=MappingProxyType(dict(model.model.settings or {})),
+                sub_agents=tuple(sub_agent_ids),
+                generation=model.generation
+            )
+            for model, sub_agent_ids in rows
+        ])
+
+class AgentRunService:
+
+    def __init__(
+        self,
+        agents: AgentService = Depends(),
+        knowledge_bases: KnowledgeBaseService = Depends(),
+        sessions: SessionService = Depends()
+    ):
+        self.agents = agents
+        self.knowledge_bases = knowledge_bases
+        self.sessions = sessions
+
+    async def prepare(self, agent_id: uuid.UUID, schema: AgentRun) -> Tuple[AgentGraph, List[Dict[str, str]]]:
+        graph = await self.agents.graph(agent_id)
+        history = []
+        if schema.session_id is not None:
+            history = [
+                {"role": message.role, "content": message.content}
+                for message in await self.sessions.tail(schema.session_id, settings.AGENT_HISTORY_TOKENS)
+                if message.role in ("system", "user", "assistant")
+            ]
+        return graph, history
+
+    async def answer_key(self, graph: AgentGraph, history: List[Dict[str, str]], schema: AgentRun) -> Optional[AnswerKey]:
+        if not settings.ANSWER_CACHE_ENABLED or not schema.cache or history:
+            return None
+        if schema.knowledge_group_id is None:
+            generation, [qemb] = 0, await get_embedder().embed([schema.input])
+        else:
+            generation, qemb = await self.knowledge_bases.embed_query(schema.knowledge_group_id, schema.input)
+        return (graph.root_id, schema.knowledge_group_id, schema.k), (fingerprint(graph), generation), qemb
+
+    async def run(self, graph: AgentGraph, history: List[Dict[str, str]], schema: AgentRun) -> AsyncIterator[AgentEvent]:
+        started = time.perf_counter()
+        answer_key = await self.answer_key(graph, history, schema)
+        cached = answer_cache.get(*answer_key) if answer_key is not None else None
+        if cached is not None:
+            async for event in self.replay(graph, schema, *cached, started):
+                yield event
+            return
+        context = self.retrieve(schema.knowledge_group_id, schema.input, schema.k) if schema.knowledge_group_id else None
+        root_id = str(graph.root_id)
+        parts, complete, retrieved = [], True, context is None
+        async for event, data in runner.run(graph, schema.input, history, context, schema.stream_sub_agents):
+            if event == "token" and data["agent_id"] == root_id:
+                parts.append(data["content"])
+            if event in ("agent", "context") and data["status"] != "ok":
+                complete = False
+            if event == "context" and data["status"] == "ok":
+                retrieved = True
+            if event == "done" and answer_key is not None and complete and retrieved:
+                answer_cache.set(*answer_key, "".join(parts), time.perf_counter() - started, frozenset(graph.nodes))
+            yield event, data
+            if event == "done":
+                await self.save(schema, root_id, "".join(parts))
+
+    async def replay(self, graph: AgentGraph, schema: AgentRun, answer: str, similarity: float, started: float) -> AsyncIterator[AgentEvent]:
+        root_id = str(graph.root_id)
+        yield "start", {"agent_id": root_id, "agents": len(graph.nodes)}
+        yield "token", {"agent_id": root_id, "content": answer}
+        yield "done", {
+            "agent_id": root_id,
+            "latency_ms": (time.perf_counter() - started) * 1000,
+            "cached": True,
+            "similarity": similarity,
+        }
+        await self.save(schema, root_id, answer)
+
+    async def save(self, schema: AgentRun, root_id: str, answer: str):
+        if schema.session_id is not None:
+            await self.sessions.append(schema.session_id, [
+                Message(role="user", content=schema.input),
+                Message(role="assistant", content=answer, labels={"agent_id": root_id})
+            ])
+
+    async def retrieve(self, knowledge_group_id: uuid.UUID, query: str, k: int) -> Optional[str]:
+        results, _ = await self.knowledge_bases.search(knowledge_group_id, query, k)
+        if not results:
+            return None
+        return "\n\n".join(f"[{result['name']}] {result['content']}" for result in results)
@@ -1,61 +1,602 @@
+import time
 import uuid
+import asyncio
 
-from openai import OpenAI
 from fastapi import Depends
-from typing import List, Optional
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..schemas import KnowledgeBase, KnowledgeBaseSearch
+from ..schemas import (
+    KnowledgeBase,
+    KnowledgeBaseSearch,
+    KnowledgeBaseBatchSearch,
+    KnowledgeBaseBatchSearchResult,
+    DedupStats,
+    IngestionJob,
+    IngestProgress,
+    SearchContent,
+    SearchMode,
+    SearchPlan,
+    SearchProfile,
+    SearchRerank
+)
 from ..decorators import transactional
-from ..models import KnowledgeBaseModel
+from ..metrics import batch_sizes, instrument, observe, span
+from ..models import IngestionJobModel, KnowledgeBaseModel
+from ..cache import LRUCache, ResultCache, normalize_text
 from ..settings import settings
-from ..database import get_session
-from ..repositories.knowledge_base import KnowledgeBaseRepository
+from ..database import get_read_session, get_session
+from ..chunking import Chunk, chunk_text
+from ..dedup import Signature, SignatureIndex, minhash
+from ..embedding import Embedder, get_embedder
+from ..reranking import rerank as rerank_results
+from ..repositories.document_signature import DocumentSignatureRepository
+from ..repositories.ingestion_job import IngestionJobRepository
+from ..repositories.knowledge_group import KnowledgeGroupRepository
+from ..repositories.vector_store import get_vector_store
 
-client = OpenAI()
+SEARCH_PROFILES = {
+    "fast": {
+        "ef_search": settings.SEARCH_FAST_EF_SEARCH,
+        "iterative_scan": "relaxed_order",
+        "max_scan_tuples": settings.SEARCH_FAST_MAX_SCAN_TUPLES,
+        "exact_max_rows": settings.SEARCH_FAST_EXACT_MAX_ROWS,
+    },
+    "accurate": {
+        "ef_search": settings.SEARCH_ACCURATE_EF_SEARCH,
+        "iterative_scan": "strict_order",
+        "max_scan_tuples": settings.SEARCH_ACCURATE_MAX_SCAN_TUPLES,
+        "exact_max_rows": settings.SEARCH_ACCURATE_EXACT_MAX_ROWS,
+    },
+}
+
+group_sizes = LRUCache(max_size=10000, ttl=settings.SEARCH_GROUP_SIZE_TTL)
+
+group_embedders = LRUCache(max_size=10000)
+
+search_cache = ResultCache(max_size=settings.SEARCH_CACHE_SIZE, ttl=settings.SEARCH_CACHE_TTL)
+
+class EmbeddingModelChanged(ValueError):
+    pass
+
+async def read_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[KnowledgeBase]:
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield KnowledgeBase.model_validate_json(line)
+    if buffer.strip():
+        yield KnowledgeBase.model_validate_json(buffer)
+
+class TokenBatcher:
+
+    def __init__(self, max_tokens: int = settings.INGEST_BATCH_TOKENS, max_items: int = settings.EMBED_BATCH_SIZE):
+        self.max_tokens = max_tokens
+        self.max_items = max_items
+        self.items: List[Any] = []
+        self.tokens = 0
+
+    def add(self, item: Any, tokens: int) -> Optional[List[Any]]:
+        full = None
+        if self.items and (self.tokens + tokens > self.max_tokens or len(self.items) >= self.max_items):
+            full = self.flush()
+        self.items.append(item)
+        self.tokens += tokens
+        return full
+
+    def flush(self) -> List[Any]:
+        items = self.items
+        self.items = []
+        self.tokens = 0
+        return items
+
+PendingChunk = Tuple[uuid.UUID, KnowledgeBase, Chunk]
+
+PendingDocument = Tuple[uuid.UUID, KnowledgeBase, List[Chunk]]
+
+def document_chunks(document: KnowledgeBase) -> Tuple[uuid.UUID, Iterator[Chunk]]:
+    if not document.content.strip():
+        raise ValueError(f"Document '{document.name}' has no content")
+    return uuid.uuid4(), chunk_text(document.content)
+
+class IngestStats:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.documents = 0
+        self.chunks = 0
+        self.batches = 0
+        self.tokens = 0
+        self.duplicates = 0
+        self.read_seconds = 0.0
+        self.embed_seconds = 0.0
+        self.write_seconds = 0.0
+
+    def progress(self, status: str, error: Optional[str] = None) -> IngestProgress:
+        return IngestProgress(
+            status=status,
+            documents=self.documents,
+            chunks=self.chunks,
+            batches=self.batches,
+            tokens=self.tokens,
+            duplicates=self.duplicates,
+            elapsed_seconds=time.perf_counter() - self.started,
+            read_per_second=self.chunks / self.read_seconds if self.read_seconds else 0.0,
+            embed_per_second=self.chunks / self.embed_seconds if self.embed_seconds else 0.0,
+            write_per_second=self.chunks / self.write_seconds if self.write_seconds else 0.0,
+            error=error
+        )
+
+class PreparedDocuments:
+
+    def __init__(self, ids: List[uuid.UUID], embedder: Embedder):
+        self.ids = ids
+        self.embedder = embedder
+        self.stats: Optional[DedupStats] = None
+        self.signatures: List[Dict[str, Any]] = []
+        self.chunks: List[PendingChunk] = []
+        self.models: List[KnowledgeBaseModel] = []
 
 class KnowledgeBaseService:
 
-    def __init__(self, session: AsyncSession = Depends(get_session)):
+    def __init__(
+        self,
+        session: AsyncSession = Depends(get_session),
+        read_session: AsyncSession = Depends(get_read_session)
+    ):
         self.session = session
-        self.embed_model = settings.EMBED_MODEL
-        self.repository = KnowledgeBaseRepository(session)
+        self.read_session = read_session
+        self.repository = get_vector_store(session)
+        self.read_repository = get_vector_store(read_session)
+        self.signatures = DocumentSignatureRepository(session)
+        self.read_signatures = DocumentSignatureRepository(read_session)
+        self.groups = KnowledgeGroupRepository(session)
+        self.read_groups = KnowledgeGroupRepository(read_session)
+        self.jobs = IngestionJobRepository(session)
+
+    async def embedder(
+        self,
+        knowledge_group_id: uuid.UUID,
+        generation: int,
+        groups: KnowledgeGroupRepository
+    ) -> Embedder:
+        key = (knowledge_group_id, generation)
+        model = group_embedders.get(key)
+        if model is None:
+            model = await groups.embedding_model(knowledge_group_id)
+            if model is not None:
+                group_embedders.set(key, model)
+        return get_embedder(*model) if model is not None else get_embedder()
+
+    @transactional(session="read_session")
+    async def query_embedder(self, knowledge_group_id: uuid.UUID) -> Tuple[int, Embedder]:
+        generation = await self.read_repository.generation(knowledge_group_id)
+        return generation, await self.embedder(knowledge_group_id, generation, self.read_groups)
+
+    async def embed_query(self, knowledge_group_id: uuid.UUID, query: str) -> Tuple[int, List[float]]:
+        generation, embedder = await self.query_embedder(knowledge_group_id)
+        [qemb] = await self.embed(embedder, [query])
+        return generation, qemb
 
-    def embed(self, texts: List[str]) -> List[List[float]]:
-        response = client.embeddings.create(model=self.embed_model, input=texts)
-        return [data.embedding for data in response.data]
+    async def check_embedder(self, knowledge_group_id: uuid.UUID, embedder: Embedder):
+        model = await self.groups.embedding_model(knowledge_group_id, lock=True)
+        if model is not None and get_embedder(*model) is not embedder:
+            raise EmbeddingModelChanged("The knowledge group was migrated to another embedding model, retry the request")
+
+    @instrument("embed")
+    async def embed(self, embedder: Embedder, texts: List[str]) -> List[List[float]]:
+        observe(batch_sizes, len(texts), "embed")
+        return await embedder.embed(texts)
+
+    async def deduplicate(
+        self,
+        knowledge_group_id: uuid.UUID,
+        documents: List[KnowledgeBase],
+        ids: List[uuid.UUID],
+        repository: DocumentSignatureRepository,
+        index: Optional[SignatureIndex] = None
+    ) -> Tuple[DedupStats, List[Dict[str, Any]]]:
+        with span("dedup", "signatures"):
+            signatures = [minhash.signature(knowledge_group_id, document.content) for document in documents]
+        bands = sorted({band for signature in signatures for band in signature.bands})
+        index = index if index is not None else SignatureIndex()
+        existing = await repository.candidates(knowledge_group_id, bands)
+        for document_id, values in existing.items():
+            if document_id not in index.values:
+                index.add(document_id, Signature(values, minhash.bands(knowledge_group_id, values)))
+        matches, rows = {}, []
+        for i, (document_id, signature) in enumerate(zip(ids, signatures)):
+            if match := index.match(signature, settings.DEDUP_THRESHOLD):
+                matches[i] = match[0]
+                continue
+            index.add(document_id, signature)
+            rows.append({
+                "knowledge_group_id": knowledge_group_id,
+                "document_id": document_id,
+                "signature": signature.values.tobytes(),
+                "bands": signature.bands,
+            })
+        observe(batch_sizes, len(matches), "dedup_skipped")
+        return DedupStats(
+            documents=len(documents),
+            duplicates=len(matches),
+            candidates=len(existing),
+            threshold=settings.DEDUP_THRESHOLD,
+            matches=matches
+        ), rows
+
+    async def create(
+        self,
+        knowledge_group_id: uuid.UUID,
+        documents: List[KnowledgeBase]
+    ) -> Tuple[List[uuid.UUID], Optional[DedupStats]]:
+        prepared = await self.prepare(knowledge_group_id, documents)
+        await self.embed_documents(knowledge_group_id, prepared)
+        await self.write(knowledge_group_id, prepared)
+        return prepared.ids, prepared.stats
 
     @transactional
-    async def create(self, knowledge_group_id: uuid.UUID, documents: List[KnowledgeBase]) -> List[uuid.UUID]:
-        embeddings = self.embed([document.content for document in documents])
-        ids = []
-        for document, embedding in zip(documents, embeddings):
-            model = KnowledgeBaseModel(
-                name=document.name,
-                content=document.content,
-                embedding=embedding,
-                knowledge_group_id=knowledge_group_id
+    async def prepare(self, knowledge_group_id: uuid.UUID, documents: List[KnowledgeBase]) -> PreparedDocuments:
+        pending = [document_chunks(document) for document in documents]
+        generation = await self.repository.generation(knowledge_group_id)
+        prepared = PreparedDocuments(
+            [document_id for document_id, _ in pending],
+            await self.embedder(knowledge_group_id, generation, self.groups)
+        )
+        if settings.DEDUP_ENABLED:
+            prepared.stats, prepared.signatures = await self.deduplicate(
+                knowledge_group_id, documents, prepared.ids, self.signatures
+            )
+        matches = prepared.stats.matches if prepared.stats else {}
+        for i, (document, (document_id, chunks)) in enumerate(zip(documents, pending)):
+            if i in matches:
+                prepared.ids[i] = matches[i]
+            else:
+                prepared.chunks.extend((document_id, document, chunk) for chunk in chunks)
+        return prepared
+
+    async def embed_documents(self, knowledge_group_id: uuid.UUID, prepared: PreparedDocuments):
+        batcher = TokenBatcher()
+        batches = [batch for item in prepared.chunks if (batch := batcher.add(item, item[2].tokens))]
+        if batch := batcher.flush():
+            batches.append(batch)
+        for batch in batches:
+            embeddings = await self.embed(prepared.embedder, [chunk.content for _, _, chunk in batch])
+            prepared.models.extend(
+                KnowledgeBaseModel(
+                    document_id=document_id,
+                    chunk_index=chunk.index,
+                    start_offset=chunk.start,
+                    end_offset=chunk.end,
+                    name=document.name,
+                    content=chunk.content,
+                    embedding=embedding,
+                    knowledge_group_id=knowledge_group_id
+                )
+                for (document_id, document, chunk), embedding in zip(batch, embeddings)
             )
-            self.session.add(model)
-            ids.append(model.id)
-        return ids
-    
+
+    @transactional
+    async def write(self, knowledge_group_id: uuid.UUID, prepared: PreparedDocuments):
+        await self._write(knowledge_group_id, prepared)
+
+    async def _write(self, knowledge_group_id: uuid.UUID, prepared: PreparedDocuments):
+        if prepared.signatures:
+            await self.signatures.add(prepared.signatures)
+        if prepared.models:
+            await self.check_embedder(knowledge_group_id, prepared.embedder)
+            await self.repository.add(prepared.models)
+            await self.repository.bump_generation(knowledge_group_id)
+            group_sizes.pop(knowledge_group_id)
+
+    @transactional
+    async def enqueue(self, knowledge_group_id: uuid.UUID, documents: List[KnowledgeBase]) -> uuid.UUID:
+        for document in documents:
+            if not document.content.strip():
+                raise ValueError(f"Document '{document.name}' has no content")
+        return await self.jobs.enqueue(knowledge_group_id, [document.model_dump(mode="json") for document in documents])
+
+    async def run_job(self, job: IngestionJobModel, worker: str) -> Tuple[List[uuid.UUID], Optional[DedupStats]]:
+        documents = [KnowledgeBase.model_validate(item) for item in job.payload]
+        prepared = await self.prepare(job.knowledge_group_id, documents)
+        await self.embed_documents(job.knowledge_group_id, prepared)
+        await self.finish_job(job, worker, prepared)
+        return prepared.ids, prepared.stats
+
+    @transactional
+    async def finish_job(self, job: IngestionJobModel, worker: str, prepared: PreparedDocuments):
+        await self._write(job.knowledge_group_id, prepared)
+        if not await self.jobs.complete(job.id, worker, prepared.ids, prepared.stats.duplicates if prepared.stats else 0):
+            raise RuntimeError(f"Ingestion job {job.id} was claimed by another worker")
+
+    async def job(self, knowledge_group_id: uuid.UUID, job_id: uuid.UUID) -> Optional[IngestionJob]:
+        model = await self.jobs.get(knowledge_group_id, job_id)
+        return IngestionJob.model_validate(model, from_attributes=True) if model is not None else None
+
+    async def ingestion_stats(self, window: float) -> Dict[str, Any]:
+        return await self.jobs.stats(window)
+
+    async def plan(self, knowledge_group_id: uuid.UUID, profile: SearchProfile) -> SearchPlan:
+        options = SEARCH_PROFILES[profile]
+        group_size = group_sizes.get(knowledge_group_id)
+        if group_size is None:
+            limit = max(item["exact_max_rows"] for item in SEARCH_PROFILES.values()) + 1
+            group_size = await self.read_repository.count(knowledge_group_id, limit)
+            group_sizes.set(knowledge_group_id, group_size)
+        if group_size <= options["exact_max_rows"]:
+            return SearchPlan(profile=profile, mode="exact", group_size=group_size)
+        return SearchPlan(
+            profile=profile,
+            mode="ann",
+            group_size=group_size,
+            index=settings.VECTOR_INDEX_MODE,
+            ef_search=options["ef_search"],
+            iterative_scan=options["iterative_scan"],
+            max_scan_tuples=options["max_scan_tuples"]
+        )
+
+    @transactional(session="read_session")
     async def search(
         self, 
         knowledge_group_id: uuid.UUID,
         query: str, 
         k: int = 5, 
-        threshold: Optional[float] = None
-    ) -> List[KnowledgeBaseSearch]:
-        [qemb] = self.embed([query])
-        results = await self.repository.search(knowledge_group_id, qemb, k, threshold)
-        return [
-            KnowledgeBaseSearch(
-                id=model.id,
-                name=model.name,
-                content=model.content,
-                distance=distance,
-                similarity=similarity
+        threshold: Optional[float] = None,
+        collapse: bool = False,
+        profile: Optional[SearchProfile] = None,
+        mode: SearchMode = "vector",
+        vector_weight: Optional[float] = None,
+        lexical_weight: Optional[float] = None,
+        content: SearchContent = "full",
+        rerank: Optional[SearchRerank] = None,
+        mmr_lambda: Optional[float] = None
+    ) -> Tuple[List[Dict[str, Any]], SearchPlan]:
+        generation = await self.read_repository.generation(knowledge_group_id)
+        key = (
+            knowledge_group_id,
+            generation,
+            normalize_text(query),
+            k,
+            threshold,
+            collapse,
+            profile or settings.SEARCH_DEFAULT_PROFILE,
+            mode,
+            vector_weight,
+            lexical_weight,
+            content,
+            rerank,
+            mmr_lambda
+        )
+        cached = search_cache.get(key)
+        if cached is not None:
+            return cached
+        started = time.perf_counter()
+        embedder = await self.embedder(knowledge_group_id, generation, self.read_groups)
+        result = await self._search(
+            knowledge_group_id, embedder, query, k, threshold, collapse, profile, mode, vector_weight, lexical_weight,
+            content, rerank, mmr_lambda
+        )
+        search_cache.set(key, result, time.perf_counter() - started)
+        return result
+
+    async def _search(
+        self,
+        knowledge_group_id: uuid.UUID,
+        embedder: Embedder,
+        query: str,
+        k: int,
+        threshold: Optional[float],
+        collapse: bool,
+        profile: Optional[SearchProfile],
+        mode: SearchMode,
+        vector_weight: Optional[float],
+        lexical_weight: Optional[float],
+        content: SearchContent,
+        rerank: Optional[SearchRerank] = None,
+        mmr_lambda: Optional[float] = None
+    ) -> Tuple[List[Dict[str, Any]], SearchPlan]:
+        if mode == "hybrid" and collapse:
+            raise ValueError("Collapse is not supported in hybrid mode")
+        if mode == "hybrid" and rerank is not None:
+            raise ValueError("Re-ranking is not supported in hybrid mode")
+        [qemb] = await self.embed(embedder, [query])
+        plan = await self.plan(knowledge_group_id, profile or settings.SEARCH_DEFAULT_PROFILE)
+        if mode == "hybrid":
+            results = await self.read_repository.hybrid_search(
+                knowledge_group_id,
+                qemb,
+                query,
+                k,
+                threshold,
+                settings.SEARCH_HYBRID_VECTOR_WEIGHT if vector_weight is None else vector_weight,
+                settings.SEARCH_HYBRID_LEXICAL_WEIGHT if lexical_weight is None else lexical_weight,
+                plan,
+                content
             )
-            for model, distance, similarity in results
-        ]
\ No newline at end of file
+        elif rerank is not None:
+            results = await self.read_repository.search(
+                knowledge_group_id,
+                qemb,
+                max(k, settings.SEARCH_RERANK_CANDIDATES),
+                threshold,
+                collapse,
+                plan,
+                "full" if rerank == "cross_encoder" else content,
+                vectors=True
+            )
+            results = await rerank_results(
+                query, qemb, results, k, rerank, settings.SEARCH_MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+            )
+            if rerank == "cross_encoder" and content != "full":
+                for result in results:
+                    if content == "none":
+                        del result["content"]
+                    else:
+                        result["content"] = result["content"][:settings.SEARCH_SNIPPET_CHARS]
+        else:
+            results = await self.read_repository.search(knowledge_group_id, qemb, k, threshold, collapse, plan, content)
+        return results, plan
+
+    @transactional(session="read_session")
+    async def probe(self, knowledge_group_id: uuid.UUID, qemb: List[float], k: int = 5) -> List[Dict[str, Any]]:
+        plan = await self.plan(knowledge_group_id, settings.SEARCH_DEFAULT_PROFILE)
+        return await self.read_repository.search(knowledge_group_id, qemb, k, plan=plan)
+
+    @transactional(session="read_session")
+    async def batch_search(
+        self,
+        knowledge_group_id: uuid.UUID,
+        schema: KnowledgeBaseBatchSearch
+    ) -> Tuple[List[KnowledgeBaseBatchSearchResult], SearchPlan]:
+        generation = await self.read_repository.generation(knowledge_group_id)
+        embedder = await self.embedder(knowledge_group_id, generation, self.read_groups)
+        qembs = await self.embed(embedder, schema.queries)
+        plan = await self.plan(knowledge_group_id, schema.profile or settings.SEARCH_DEFAULT_PROFILE)
+        rows = await self.read_repository.batch_search(knowledge_group_id, qembs, schema.k, schema.threshold, plan)
+        if schema.dedupe:
+            best = {}
+            for query_index, model, distance, _ in rows:
+                if model.id not in best or distance < best[model.id][1]:
+                    best[model.id] = (query_index, distance)
+            rows = [row for row in rows if best[row[1].id][0] == row[0]]
+        results = [KnowledgeBaseBatchSearchResult(query=query, results=[]) for query in schema.queries]
+        for query_index, model, distance, similarity in rows:
+            results[query_index].results.append(
+                KnowledgeBaseSearch(
+                    id=model.id,
+                    name=model.name,
+                    content=model.content,
+                    document_id=model.document_id,
+                    chunk_index=model.chunk_index,
+                    start_offset=model.start_offset,
+                    end_offset=model.end_offset,
+                    distance=distance,
+                    similarity=similarity
+                )
+            )
+        return results, plan
+
+    async def ingest(
+        self,
+        knowledge_group_id: uuid.UUID,
+        documents: AsyncIterator[KnowledgeBase]
+    ) -> AsyncIterator[IngestProgress]:
+        stats = IngestStats()
+        signatures: Dict[uuid.UUID, Dict[str, Any]] = {}
+        queue: asyncio.Queue = asyncio.Queue(maxsize=settings.INGEST_PIPELINE_DEPTH)
+        producer: Optional[asyncio.Task] = None
+
+        async def timed_embed(batch: List[PendingChunk]) -> List[List[float]]:
+            started = time.perf_counter()
+            embeddings = await self.embed(embedder, [chunk.content for _, _, chunk in batch])
+            stats.embed_seconds += time.perf_counter() - started
+            return embeddings
+
+        async def produce():
+            try:
+                async for batch in self._batches(knowledge_group_id, documents, stats, signatures):
+                    await queue.put((batch, asyncio.create_task(timed_embed(batch))))
+            finally:
+                await queue.put(None)
+
+        try:
+            async with self.session.begin():
+                generation = await self.repository.generation(knowledge_group_id)
+                embedder = await self.embedder(knowledge_group_id, generation, self.groups)
+            producer = asyncio.create_task(produce())
+            while (item := await queue.get()) is not None:
+                batch, embedding = item
+                embeddings = await embedding
+                started = time.perf_counter()
+                async with self.session.begin():
+                    await self.check_embedder(knowledge_group_id, embedder)
+                    await self.repository.bump_generation(knowledge_group_id)
+                    if rows := [signatures.pop(document_id) for document_id, _, chunk in batch if document_id in signatures]:
+                        await self.signatures.add(rows)
+                    await self.repository.copy([
+                        (
+                            uuid.uuid4(),
+                            knowledge_group_id,
+                            document_id,
+                            chunk.index,
+                            chunk.start,
+                            chunk.end,
+                            document.name,
+                            chunk.content,
+                            vector
+                        )
+                        for (document_id, document, chunk), vector in zip(batch, embeddings)
+                    ])
+                stats.write_seconds += time.perf_counter() - started
+                stats.documents += sum(1 for _, _, chunk in batch if chunk.index == 0)
+                stats.chunks += len(batch)
+                stats.batches += 1
+                group_sizes.pop(knowledge_group_id)
+                yield stats.progress("running")
+            await producer
+            yield stats.progress("completed")
+        except Exception as e:
+            yield stats.progress("failed", str(e) or type(e).__name__)
+        finally:
+            if producer is not None:
+                producer.cancel()
+            while not queue.empty():
+                item = queue.get_nowait()
+                if item is not None:
+                    item[1].cancel()
+
+    async def _windows(self, documents: AsyncIterator[KnowledgeBase], stats: IngestStats) -> AsyncIterator[List[PendingDocument]]:
+        window: List[PendingDocument] = []
+        tokens = 0
+        iterator = documents.__aiter__()
+        while True:
+            started = time.perf_counter()
+            try:
+                document = await iterator.__anext__()
+            except StopAsyncIteration:
+                break
+            finally:
+                stats.read_seconds += time.perf_counter() - started
+            document_id, chunks = document_chunks(document)
+            window.append((document_id, document, list(chunks)))
+            tokens += sum(chunk.tokens for chunk in window[-1][2])
+            if tokens >= settings.INGEST_BATCH_TOKENS or len(window) >= settings.EMBED_BATCH_SIZE:
+                yield window
+                window, tokens = [], 0
+        if window:
+            yield window
+
+    async def _batches(
+        self,
+        knowledge_group_id: uuid.UUID,
+        documents: AsyncIterator[KnowledgeBase],
+        stats: IngestStats,
+        signatures: Dict[uuid.UUID, Dict[str, Any]]
+    ) -> AsyncIterator[List[PendingChunk]]:
+        batcher = TokenBatcher()
+        index = SignatureIndex()
+        async for window in self._windows(documents, stats):
+            matches = {}
+            if settings.DEDUP_ENABLED:
+                async with self.read_session.begin():
+                    dedup, rows = await self.deduplicate(
+                        knowledge_group_id,
+                        [document for _, document, _ in window],
+                        [document_id for document_id, _, _ in window],
+                        self.read_signatures,
+                        index
+                    )
+                signatures.update((row["document_id"], row) for row in rows)
+                stats.duplicates += dedup.duplicates
+                matches = dedup.matches
+            for i, (document_id, document, chunks) in enumerate(window):
+                if i in matches:
+                    continue
+                for chunk in chunks:
+                    stats.tokens += chunk.tokens
+                    if batch := batcher.add((document_id, document, chunk), chunk.tokens):
+                        yield batch
+        if batch := batcher.flush():
+            yield batch
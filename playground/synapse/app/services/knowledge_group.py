@@ -7,6 +7,7 @@ from ..schemas import KnowledgeGroup
 from ..decorators import transactional
 from ..models import KnowledgeGroupModel
 from ..database import get_session
+from ..embedding import get_embedder
 
 class KnowledgeGroupService:
 
@@ -16,9 +17,13 @@ class KnowledgeGroupService:
     @transactional
     async def create(self, schema: KnowledgeGroup) -> uuid.UUID:
                 
+        embedder = get_embedder(schema.embedding_provider)
+
         model = KnowledgeGroupModel(
             name=schema.name,
-            description=schema.description
+            description=schema.description,
+            embedding_provider=embedder.provider.name,
+            embedding_model=embedder.provider.model
         )
 
         self.session.add(model)
@@ -0,0 +1,148 @@
+import uuid
+import base64
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..schemas import Message, MessagePage
+from ..decorators import transactional
+from ..models import MessageModel, SessionModel
+from ..cache import LRUCache
+from ..settings import settings
+from ..database import get_session
+from ..tokenizer import count_tokens
+from ..repositories.session import SessionRepository
+
+@dataclass
+class SessionTail:
+    messages: List[Message]
+    tokens: int
+    budget: int
+    complete: bool
+    updated_at: Optional[datetime]
+
+    def window(self, max_tokens: int) -> List[Message]:
+        messages, tokens = [], 0
+        for message in reversed(self.messages):
+            if tokens + message.tokens > max_tokens:
+                break
+            messages.append(message)
+            tokens += message.tokens
+        return messages[::-1]
+
+    def extend(self, messages: List[Message]):
+        self.messages.extend(messages)
+        self.tokens += sum(message.tokens for message in messages)
+        while self.messages and (self.tokens > self.budget or len(self.messages) > settings.SESSION_TAIL_MAX_MESSAGES):
+            self.tokens -= self.messages.pop(0).tokens
+            self.complete = False
+
+session_tails = LRUCache(max_size=settings.SESSION_TAIL_CACHE_SIZE, ttl=settings.SESSION_TAIL_CACHE_TTL)
+
+def encode_cursor(message: Message) -> str:
+    return base64.urlsafe_b64encode(f"{message.created_at.isoformat()}|{message.id}".encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    try:
+        created_at, id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), uuid.UUID(id)
+    except ValueError:
+        raise ValueError("Invalid cursor")
+
+def to_message(model: MessageModel) -> Message:
+    return Message(
+        id=model.id,
+        role=model.role,
+        content=model.content,
+        labels=model.labels,
+        tokens=model.tokens,
+        created_at=model.created_at
+    )
+
+class SessionService:
+
+    def __init__(self, session: AsyncSession = Depends(get_session)):
+        self.session = session
+        self.repository = SessionRepository(session)
+
+    @transactional
+    async def create(self) -> uuid.UUID:
+        now = datetime.now(timezone.utc)
+        model = SessionModel(created_at=now, updated_at=now)
+        await self.repository.create(model)
+        return model.id
+
+    async def append(self, session_id: uuid.UUID, messages: List[Message]) -> List[Message]:
+        previous, updated_at, messages = await self._append(session_id, messages)
+        tail = session_tails.get(session_id)
+        if tail is not None and tail.updated_at == previous:
+            tail.extend(messages)
+            tail.updated_at = updated_at
+        elif tail is not None:
+            session_tails.pop(session_id)
+        return messages
+
+    @transactional
+    async def _append(self, session_id: uuid.UUID, messages: List[Message]) -> Tuple[Optional[datetime], datetime, List[Message]]:
+        touched = await self.repository.touch(session_id, len(messages))
+        if touched is None:
+            raise ValueError(f"Session {session_id} not found")
+        previous, updated_at = touched
+        now = updated_at - timedelta(microseconds=max(len(messages) - 1, 0))
+        messages = [
+            Message(
+                id=uuid.uuid4(),
+                role=message.role,
+                content=message.content,
+                labels=message.labels,
+                tokens=count_tokens(message.content),
+                created_at=now + timedelta(microseconds=i)
+            )
+            for i, message in enumerate(messages)
+        ]
+        await self.repository.append([
+            {"session_id": session_id, **message.model_dump()}
+            for message in messages
+        ])
+        return previous, updated_at, messages
+
+    @transactional
+    async def page(self, session_id: uuid.UUID, cursor: Optional[str] = None, limit: int = settings.SESSION_PAGE_SIZE) -> MessagePage:
+        after = decode_cursor(cursor) if cursor else None
+        models = await self.repository.page(session_id, limit + 1, after)
+        if not models and after is None and not await self.repository.exists(session_id):
+            raise ValueError(f"Session {session_id} not found")
+        items = [to_message(model) for model in models[:limit]]
+        return MessagePage(items=items, next_cursor=encode_cursor(items[-1]) if len(models) > limit else None)
+
+    async def tail(self, session_id: uuid.UUID, max_tokens: int = settings.SESSION_TAIL_TOKENS) -> List[Message]:
+        tail = session_tails.get(session_id)
+        if tail is not None and tail.updated_at != await self._updated_at(session_id):
+            tail = None
+        if tail is None or (max_tokens > tail.budget and not tail.complete):
+            tail = await self._tail(session_id, max(max_tokens, settings.SESSION_TAIL_TOKENS))
+            session_tails.set(session_id, tail)
+        return tail.window(max_tokens)
+
+    @transactional
+    async def _updated_at(self, session_id: uuid.UUID) -> Optional[datetime]:
+        return await self.repository.updated_at(session_id)
+
+    @transactional
+    async def _tail(self, session_id: uuid.UUID, max_tokens: int) -> SessionTail:
+        limit = settings.SESSION_TAIL_MAX_MESSAGES
+        updated_at = await self.repository.updated_at(session_id)
+        models = await self.repository.tail(session_id, max_tokens, limit + 1)
+        if not models and not await self.repository.exists(session_id):
+            raise ValueError(f"Session {session_id} not found")
+        messages, tokens = [], 0
+        for model in models:
+            if tokens + model.tokens > max_tokens or len(messages) == limit:
+                break
+            messages.append(to_message(model))
+            tokens += model.tokens
+        return SessionTail(messages=messages[::-1], tokens=tokens, budget=max_tokens, complete=len(messages) == len(models), updated_at=updated_at)
@@ -1,12 +1,116 @@
+from typing import List, Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
 
     APP_NAME: str = "Synapse"
     DATABASE_URL: str
+    DATABASE_REPLICA_URLS: List[str] = []
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_PREPARE_THRESHOLD: Optional[int] = 5
+    DB_PGBOUNCER: bool = False # disables server-side prepared statements for transaction pooling
     OPENAI_API_KEY: str
-    ECHO_SQL: bool = True
+    ECHO_SQL: bool = False
+    METRICS_ENABLED: bool = True
+    TRACING_ENABLED: bool = False
+    TRACING_ENDPOINT: str = "http://localhost:4317"
     EMBED_MODEL: str = "text-embedding-3-small" # 1536 dims
+    EMBED_BATCH_SIZE: int = 256
+    EMBED_BATCH_WAIT_MS: float = 5.0
+    EMBED_MAX_CONCURRENCY: int = 4
+    EMBED_MAX_PENDING: int = 1024
+    EMBED_CACHE_SIZE: int = 10000
+    EMBED_CACHE_TTL: float = 3600.0
+    EMBED_CACHE_PERSISTENT: bool = False
+    EMBED_CACHE_PERSISTENT_TTL: Optional[float] = 2592000.0 # 30 days, None keeps rows forever
+    EMBED_CACHE_PURGE_INTERVAL: float = 3600.0
+    EMBED_CACHE_PURGE_BATCH: int = 10000
+    EMBED_PROVIDER: str = "openai" # openai | local, default for new knowledge groups
+    EMBED_DIMENSIONS: int = 1536 # knowledge_bases.embedding column
+    LOCAL_EMBED_MODEL_PATH: Optional[str] = None # directory with model.onnx and tokenizer.json
+    LOCAL_EMBED_DIMENSIONS: int = 384
+    LOCAL_EMBED_MAX_LENGTH: int = 256
+    LOCAL_EMBED_THREADS: int = 4
+    LOCAL_EMBED_BATCH_SIZE: int = 32
+    LOCAL_EMBED_BATCH_WAIT_MS: float = 1.0
+    REEMBED_BATCH_SIZE: int = 256
+    REEMBED_TEXTS_PER_SECOND: float = 200.0
+    REEMBED_LEASE_SECONDS: float = 300.0
+    REEMBED_POLL_SECONDS: float = 5.0
+    REEMBED_MAX_ATTEMPTS: int = 5
+    REEMBED_LOCK_TIMEOUT: str = "2s"
+    REEMBED_FLIP_RETRIES: int = 10
+    INGEST_BATCH_TOKENS: int = 100000
+    INGEST_PIPELINE_DEPTH: int = 4
+    INGEST_JOB_MAX_ATTEMPTS: int = 3
+    INGEST_JOB_LEASE_SECONDS: float = 120.0
+    INGEST_WORKER_PROCESSES: int = 2
+    INGEST_WORKER_CONCURRENCY: int = 2
+    INGEST_WORKER_POLL_SECONDS: float = 1.0
+    DEDUP_ENABLED: bool = True
+    DEDUP_THRESHOLD: float = 0.85 # estimated Jaccard similarity of word shingles
+    DEDUP_SHINGLE_SIZE: int = 5
+    DEDUP_NUM_PERM: int = 128
+    DEDUP_BANDS: int = 16
+    CHUNK_MAX_TOKENS: int = 512
+    CHUNK_OVERLAP_TOKENS: int = 64
+    CHUNK_COLLAPSE_CANDIDATES: int = 4
+    SEARCH_DEFAULT_PROFILE: str = "fast"
+    SEARCH_FAST_EF_SEARCH: int = 40
+    SEARCH_FAST_MAX_SCAN_TUPLES: int = 20000
+    SEARCH_FAST_EXACT_MAX_ROWS: int = 2000
+    SEARCH_ACCURATE_EF_SEARCH: int = 200
+    SEARCH_ACCURATE_MAX_SCAN_TUPLES: int = 100000
+    SEARCH_ACCURATE_EXACT_MAX_ROWS: int = 20000
+    SEARCH_SNIPPET_CHARS: int = 240
+    SEARCH_GROUP_SIZE_TTL: float = 300.0
+    SEARCH_HYBRID_CANDIDATES: int = 50
+    SEARCH_HYBRID_VECTOR_WEIGHT: float = 1.0
+    SEARCH_HYBRID_LEXICAL_WEIGHT: float = 1.0
+    SEARCH_RRF_K: int = 60
+    SEARCH_RERANK_CANDIDATES: int = 200
+    SEARCH_MMR_LAMBDA: float = 0.5 # 1.0 = relevance only, 0.0 = diversity only
+    RERANK_SCORER: str = "onnx"
+    RERANK_MODEL_PATH: Optional[str] = None # cross-encoder directory with model.onnx and tokenizer.json
+    RERANK_MAX_LENGTH: int = 512
+    RERANK_THREADS: int = 2
+    VECTOR_INDEX_MODE: str = "vector" # vector | halfvec | binary | matryoshka
+    VECTOR_INDEX_DIMENSIONS: int = 512
+    VECTOR_RERANK_FACTOR: int = 4
+    VECTOR_STORE: str = "pgvector" # pgvector | numpy
+    VECTOR_STORE_PATH: str = "data/vectors"
+    VECTOR_STORE_DTYPE: str = "float32" # float32 | float16
+    SEARCH_CACHE_SIZE: int = 2048
+    SEARCH_CACHE_TTL: float = 0.0
+    AGENT_MAX_CONCURRENCY: int = 8
+    AGENT_CALL_TIMEOUT: float = 60.0
+    AGENT_HISTORY_TOKENS: int = 2000
+    AGENT_GRAPH_CACHE_SIZE: int = 1024
+    AGENT_GRAPH_CACHE_TTL: float = 300.0
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_SIZE: int = 10000
+    ANSWER_CACHE_TTL: float = 3600.0
+    ANSWER_CACHE_THRESHOLD: float = 0.95 # cosine similarity between query embeddings
+    WARMUP_ENABLED: bool = True
+    WARMUP_CONNECTIONS: Optional[int] = None # defaults to DB_POOL_SIZE per engine
+    WARMUP_GROUPS: int = 10 # knowledge groups with the highest generation
+    WARMUP_GROUP_IDS: List[str] = [] # overrides WARMUP_GROUPS
+    WARMUP_PREWARM: bool = True # requires the pg_prewarm extension
+    WARMUP_QUERIES: int = 20 # synthetic searches per group and round
+    WARMUP_P99_MS: float = 50.0
+    WARMUP_TIMEOUT_SECONDS: float = 120.0 # ready anyway once exceeded, unless the database is unreachable
+    WARMUP_RETRY_SECONDS: float = 5.0 # pause before warming up again after the database was unreachable
+    WARMUP_WATCH_SECONDS: float = 10.0 # re-warm when pg_postmaster_start_time() changes, 0 disables
+    SESSION_PAGE_SIZE: int = 50
+    SESSION_TAIL_TOKENS: int = 4000
+    SESSION_TAIL_MAX_MESSAGES: int = 200
+    SESSION_TAIL_CACHE_SIZE: int = 10000
+    SESSION_TAIL_CACHE_TTL: float = 300.0
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -0,0 +1,15 @@
+import tiktoken
+
+from functools import lru_cache
+
+from .settings import settings
+
+@lru_cache
+def get_encoding(model: str = settings.EMBED_MODEL) -> tiktoken.Encoding:
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+def count_tokens(text: str, model: str = settings.EMBED_MODEL) -> int:
+    return len(get_encoding(model).encode_ordinary(text))
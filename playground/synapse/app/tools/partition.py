@@ -0,0 +1,225 @@
+import re
+import json
+import time
+import uuid
+import asyncio
+import argparse
+
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from ..database import engine
+from ..repositories.reembedding import ACTIVE
+
+DEFAULT = "knowledge_bases_shared"
+COLUMNS = "id, knowledge_group_id, document_id, chunk_index, start_offset, end_offset, name, content, embedding"
+
+def partition_name(knowledge_group_id: uuid.UUID) -> str:
+    return f"knowledge_bases_{knowledge_group_id.hex}"
+
+def log(event: str, **fields):
+    print(json.dumps({"event": event, **fields}, default=str))
+
+async def tree(connection: AsyncConnection, relation: str = "knowledge_bases") -> List[Tuple[str, Optional[str], bool]]:
+    result = await connection.execute(text(
+        "select relid::regclass::text, parentrelid::regclass::text, isleaf "
+        "from pg_partition_tree(cast(:relation as regclass)) order by level"
+    ), {"relation": relation})
+    return [tuple(row) for row in result.all()]
+
+async def indexes(connection: AsyncConnection, partition: str, m: Optional[int], ef_construction: Optional[int]) -> List[str]:
+    result = await connection.execute(text(
+        "select pg_get_indexdef(x.indexrelid) from pg_index x "
+        "where x.indrelid = 'knowledge_bases'::regclass "
+        "and not exists (select 1 from pg_constraint c where c.conindid = x.indexrelid) "
+        "order by x.indexrelid"
+    ))
+    statements = []
+    for i, definition in enumerate(result.scalars().all()):
+        statement = re.sub(r"^CREATE INDEX \S+ ON ONLY \S+", f"CREATE INDEX {partition}_{i}_idx ON {partition}", definition)
+        if m is not None and " USING hnsw " in statement:
+            statement = re.sub(r" WITH \(.*\)$", f" WITH (m = {m}, ef_construction = {ef_construction or 64})", statement)
+        statements.append(statement)
+    return statements
+
+async def copy(connection: AsyncConnection, knowledge_group_id: uuid.UUID, partition: str, batch_size: int) -> int:
+    after, copied = None, 0
+    while True:
+        result = await connection.execute(text(
+            f"insert into {partition} ({COLUMNS}) "
+            f"select {COLUMNS} from {DEFAULT} where knowledge_group_id = :group "
+            f"and (cast(:after as uuid) is null or id > cast(:after as uuid)) order by id limit :limit "
+            "returning id"
+        ), {"group": knowledge_group_id, "after": after, "limit": batch_size})
+        ids = result.scalars().all()
+        await connection.commit()
+        if not ids:
+            return copied
+        after, copied = max(ids), copied + len(ids)
+        log("copied", knowledge_group_id=knowledge_group_id, rows=copied)
+
+async def excludable(connection: AsyncConnection, knowledge_group_id: uuid.UUID) -> List[str]:
+    result = await connection.execute(text(
+        "select relid from ("
+        "select t.relid::regclass::text as relid, t.parentrelid, pg_get_expr(c.relpartbound, c.oid) as bound "
+        "from pg_partition_tree(cast(:default as regclass)) t join pg_class c on c.oid = t.relid where t.isleaf"
+        ") leaves where case when bound ~ 'modulus' then not satisfies_hash_partition("
+        "parentrelid, (regexp_match(bound, 'modulus (\\d+)'))[1]::int, (regexp_match(bound, 'remainder (\\d+)'))[1]::int, "
+        "cast(:group as uuid)) else false end"
+    ), {"default": DEFAULT, "group": knowledge_group_id})
+    return list(result.scalars().all())
+
+async def exclude(connection: AsyncConnection, knowledge_group_id: uuid.UUID, lock_timeout: str) -> List[str]:
+    constraint = f"{partition_name(knowledge_group_id)}_excluded"
+    leaves = await excludable(connection, knowledge_group_id)
+    await connection.commit()
+    for leaf in leaves:
+        await connection.execute(text(f"set local lock_timeout = '{lock_timeout}'"))
+        await connection.execute(text(
+            f"alter table {leaf} drop constraint if exists {constraint}, "
+            f"add constraint {constraint} check (knowledge_group_id <> '{knowledge_group_id}') not valid"
+        ))
+        await connection.commit()
+        await connection.execute(text(f"alter table {leaf} validate constraint {constraint}"))
+        await connection.commit()
+    log("excluded", knowledge_group_id=knowledge_group_id, leaves=leaves)
+    return leaves
+
+async def include(connection: AsyncConnection, knowledge_group_id: uuid.UUID, leaves: List[str], lock_timeout: str):
+    constraint = f"{partition_name(knowledge_group_id)}_excluded"
+    for leaf in leaves:
+        try:
+            await connection.execute(text(f"set local lock_timeout = '{lock_timeout}'"))
+            await connection.execute(text(f"alter table {leaf} drop constraint if exists {constraint}"))
+            await connection.commit()
+        except DBAPIError as e:
+            await connection.rollback()
+            log("constraint_kept", knowledge_group_id=knowledge_group_id, leaf=leaf, constraint=constraint, error=str(e))
+
+async def reembedding(connection: AsyncConnection, knowledge_group_id: uuid.UUID, since: float) -> int:
+    result = await connection.execute(text(
+        "select count(*) from reembedding_jobs where knowledge_group_id = :group "
+        "and (status = any(:statuses) or updated_at >= to_timestamp(:since))"
+    ), {"group": knowledge_group_id, "statuses": list(ACTIVE), "since": since})
+    return result.scalar_one()
+
+async def attach(
+    connection: AsyncConnection,
+    knowledge_group_id: uuid.UUID,
+    partition: str,
+    since: float,
+    lock_timeout: str
+) -> Dict[str, int]:
+    await connection.execute(text(f"set local lock_timeout = '{lock_timeout}'"))
+    await connection.execute(text(f"lock table {DEFAULT} in access exclusive mode"))
+    if await reembedding(connection, knowledge_group_id, since):
+        raise ValueError(f"Knowledge group {knowledge_group_id} was re-embedded during the move, run it again")
+    delta = await connection.execute(text(
+        f"insert into {partition} ({COLUMNS}) "
+        f"select {COLUMNS} from {DEFAULT} k where k.knowledge_group_id = :group "
+        f"and not exists (select 1 from {partition} p where p.id = k.id)"
+    ), {"group": knowledge_group_id})
+    deleted = await connection.execute(text(
+        f"delete from {DEFAULT} where knowledge_group_id = :group"
+    ), {"group": knowledge_group_id})
+    await connection.execute(text(
+        f"alter table knowledge_bases attach partition {partition} for values in ('{knowledge_group_id}')"
+    ))
+    return {"delta": delta.rowcount, "deleted": deleted.rowcount}
+
+async def move(
+    knowledge_group_id: uuid.UUID,
+    batch_size: int,
+    m: Optional[int],
+    ef_construction: Optional[int],
+    lock_timeout: str,
+    retries: int
+):
+    partition = partition_name(knowledge_group_id)
+    started = time.time()
+    async with engine.connect() as connection:
+        if any(name == partition for name, _, _ in await tree(connection)):
+            raise ValueError(f"Knowledge group {knowledge_group_id} already has partition {partition}")
+        if await reembedding(connection, knowledge_group_id, started):
+            raise ValueError(f"Knowledge group {knowledge_group_id} has an active re-embedding job")
+        await connection.execute(text(f"drop table if exists {partition}"))
+        await connection.execute(text(
+            f"create table {partition} (like knowledge_bases including defaults including generated including constraints)"
+        ))
+        await connection.commit()
+        log("created", knowledge_group_id=knowledge_group_id, partition=partition)
+
+        copied = await copy(connection, knowledge_group_id, partition, batch_size)
+        for statement in await indexes(connection, partition, m, ef_construction):
+            building = time.perf_counter()
+            await connection.execute(text(statement))
+            await connection.commit()
+            log("indexed", knowledge_group_id=knowledge_group_id, index=statement, seconds=round(time.perf_counter() - building, 3))
+        await connection.execute(text(f"alter table {partition} add primary key (id, knowledge_group_id)"))
+        await connection.execute(text(
+            f"alter table {partition} add constraint {partition}_group_check check (knowledge_group_id = '{knowledge_group_id}'), "
+            f"add foreign key (knowledge_group_id) references knowledge_groups (id)"
+        ))
+        await connection.commit()
+
+        leaves = await exclude(connection, knowledge_group_id, lock_timeout)
+        try:
+            for attempt in range(1, retries + 1):
+                try:
+                    swapping = time.perf_counter()
+                    rows = await attach(connection, knowledge_group_id, partition, started, lock_timeout)
+                    await connection.commit()
+                    break
+                except DBAPIError as e:
+                    await connection.rollback()
+                    if not ("lock timeout" in str(e) or "deadlock detected" in str(e)) or attempt == retries:
+                        raise
+                    log("lock_timeout", knowledge_group_id=knowledge_group_id, attempt=attempt)
+                    await asyncio.sleep(min(2 ** attempt, 30))
+        finally:
+            await include(connection, knowledge_group_id, leaves, lock_timeout)
+        await connection.execute(text(f"analyze {partition}"))
+        await connection.commit()
+    log(
+        "attached",
+        knowledge_group_id=knowledge_group_id,
+        partition=partition,
+        copied=copied,
+        locked_seconds=round(time.perf_counter() - swapping, 3),
+        seconds=round(time.time() - started, 3),
+        **rows
+    )
+
+async def report():
+    async with engine.connect() as connection:
+        result = await connection.execute(text(
+            "select t.relid::regclass::text, t.parentrelid::regclass::text, pg_get_expr(c.relpartbound, c.oid), "
+            "c.reltuples::bigint, pg_total_relation_size(t.relid) "
+            "from pg_partition_tree('knowledge_bases') t join pg_class c on c.oid = t.relid "
+            "where t.isleaf order by pg_total_relation_size(t.relid) desc"
+        ))
+        for name, parent, bound, rows, size in result.all():
+            log("partition", partition=name, parent=parent, bound=bound, rows=rows, size_bytes=size)
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage knowledge_bases partitions")
+    commands = parser.add_subparsers(dest="command", required=True)
+    move_parser = commands.add_parser("move", help="Move a knowledge group out of the shared partition into its own")
+    move_parser.add_argument("group_id", type=uuid.UUID)
+    move_parser.add_argument("--batch-size", type=int, default=5000)
+    move_parser.add_argument("--m", type=int, default=None, help="HNSW m for the new partition, defaults to the parent index")
+    move_parser.add_argument("--ef-construction", type=int, default=None)
+    move_parser.add_argument("--lock-timeout", default="2s")
+    move_parser.add_argument("--retries", type=int, default=10)
+    commands.add_parser("report", help="Print row counts and sizes per leaf partition")
+    args = parser.parse_args()
+    if args.command == "move":
+        asyncio.run(move(args.group_id, args.batch_size, args.m, args.ef_construction, args.lock_timeout, args.retries))
+    else:
+        asyncio.run(report())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+
+from typing import Any, Dict, List
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from ..models import KnowledgeBaseModel
+from ..schemas import KnowledgeBaseSearch
+from ..settings import settings
+
+def rows(k: int, content_chars: int) -> List[Dict[str, Any]]:
+    words = ["vector", "index", "search", "latency", "recall", "chunk", "query", "embedding"]
+    results = []
+    for i in range(k):
+        distance = random.random()
+        content = " ".join(random.choice(words) for _ in range(content_chars // 6))[:content_chars]
+        results.append({
+            "id": uuid.uuid4(),
+            "document_id": uuid.uuid4(),
+            "chunk_index": i,
+            "start_offset": i * content_chars,
+            "end_offset": (i + 1) * content_chars,
+            "name": f"document-{i}",
+            "content": content,
+            "distance": distance,
+            "similarity": 1 - distance,
+        })
+    return results
+
+async def legacy(field: Any, mappings: List[Dict[str, Any]]) -> bytes:
+    models = [
+        (KnowledgeBaseModel(**{k: v for k, v in row.items() if k not in ("distance", "similarity")}), row["distance"], 1 - row["distance"])
+        for row in mappings
+    ]
+    results = [
+        KnowledgeBaseSearch(
+            id=model.id,
+            name=model.name,
+            content=model.content,
+            document_id=model.document_id,
+            chunk_index=model.chunk_index,
+            start_offset=model.start_offset,
+            end_offset=model.end_offset,
+            distance=distance,
+            similarity=similarity
+        )
+        for model, distance, similarity in models
+    ]
+    content = await serialize_response(field=field, response_content=results)
+    return JSONResponse(content).body
+
+async def fast(mappings: List[Dict[str, Any]], content: str) -> bytes:
+    if content == "none":
+        results = [{k: v for k, v in row.items() if k != "content"} for row in mappings]
+    elif content == "snippet":
+        results = [{**row, "content": row["content"][:settings.SEARCH_SNIPPET_CHARS]} for row in mappings]
+    else:
+        results = [dict(row) for row in mappings]
+    return ORJSONResponse(results).body
+
+async def measure(fn, requests: int) -> Dict[str, float]:
+    size = 0
+    started = time.process_time()
+    for _ in range(requests):
+        size = len(await fn())
+    elapsed = time.process_time() - started
+    return {"cpu_us_per_request": elapsed / requests * 1_000_000, "bytes": size}
+
+async def run(k: int, requests: int, content_chars: int):
+    field = create_model_field(name="Response_search", type_=List[KnowledgeBaseSearch], mode="serialization")
+    mappings = rows(k, content_chars)
+    baseline = await measure(lambda: legacy(field, mappings), requests)
+    print(json.dumps({"path": "legacy", "k": k, **baseline}))
+    for content in ("full", "snippet", "none"):
+        result = await measure(lambda: fast(mappings, content), requests)
+        saved = baseline["cpu_us_per_request"] - result["cpu_us_per_request"]
+        print(json.dumps({"path": f"fast/{content}", "k": k, **result, "cpu_us_saved": saved}))
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-request CPU of the model-based and projected search response paths")
+    parser.add_argument("--k", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--content-chars", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(run(args.k, args.requests, args.content_chars))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+from sqlalchemy import text
+
+from ..database import engine, AsyncSessionLocal
+from ..repositories.knowledge_base import KnowledgeBaseRepository
+from ..schemas import SearchPlan
+from ..settings import settings
+from .partition import tree
+
+INDEXES = {
+    "vector": ("knowledge_bases_embedding_hnsw_cos_idx", "(embedding vector_cosine_ops)"),
+    "halfvec": ("knowledge_bases_embedding_halfvec_idx", "((embedding::halfvec(1536)) halfvec_cosine_ops)"),
+    "binary": ("knowledge_bases_embedding_binary_idx", "((binary_quantize(embedding)::bit(1536)) bit_hamming_ops)"),
+    "matryoshka": (
+        "knowledge_bases_embedding_matryoshka_idx",
+        "((subvector(embedding, 1, {dimensions})::vector({dimensions})) vector_cosine_ops)"
+    ),
+}
+
+async def create(mode: str, m: int, ef_construction: int):
+    name, expression = INDEXES[mode]
+    using = f"using hnsw {expression.format(dimensions=settings.VECTOR_INDEX_DIMENSIONS)} with (m = {m}, ef_construction = {ef_construction})"
+    async with engine.connect() as connection:
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        names = {}
+        for relation, parent, leaf in await tree(connection):
+            index = names[relation] = name if parent is None else f"{relation}_{mode}_idx"
+            if leaf:
+                await connection.execute(text(f"create index concurrently if not exists {index} on {relation} {using}"))
+            else:
+                await connection.execute(text(f"create index if not exists {index} on only {relation} {using}"))
+            if parent is not None:
+                await connection.execute(text(f"alter index {names[parent]} attach partition {index}"))
+
+async def drop(mode: str):
+    name, _ = INDEXES[mode]
+    async with engine.connect() as connection:
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        concurrently = "concurrently " if len(await tree(connection)) == 1 else ""
+        await connection.execute(text(f"drop index {concurrently}if exists {name}"))
+
+async def report(samples: int, k: int, ef_search: int):
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(text(
+            "select indexname, (select sum(pg_relation_size(relid))::bigint from pg_partition_tree(indexname::regclass)) "
+            "from pg_indexes where tablename = 'knowledge_bases'"
+        ))
+        sizes = dict(result.all())
+        result = await session.execute(text(
+            "select knowledge_group_id, embedding from knowledge_bases order by random() limit :samples"
+        ), {"samples": samples})
+        queries = result.all()
+        await session.rollback()
+
+    async def run(plan: SearchPlan, group_id, qemb):
+        async with AsyncSessionLocal() as session, session.begin():
+            started = time.perf_counter()
+            rows = await KnowledgeBaseRepository(session).search(group_id, qemb, k, plan=plan)
+            return {row["id"] for row in rows}, time.perf_counter() - started
+
+    exact = SearchPlan(profile="accurate", mode="exact", group_size=0)
+    truth = [await run(exact, group_id, qemb) for group_id, qemb in queries]
+    reports = [{
+        "mode": "exact",
+        "index": None,
+        "size_bytes": 0,
+        "recall": 1.0,
+        "p50_ms": statistics.median(latency for _, latency in truth) * 1000 if truth else 0.0,
+    }]
+    for mode, (name, _) in INDEXES.items():
+        if name not in sizes:
+            continue
+        plan = SearchPlan(
+            profile="accurate",
+            mode="ann",
+            group_size=0,
+            index=mode,
+            ef_search=ef_search,
+            iterative_scan="relaxed_order",
+            max_scan_tuples=settings.SEARCH_ACCURATE_MAX_SCAN_TUPLES
+        )
+        recalls, latencies = [], []
+        for (group_id, qemb), (expected, _) in zip(queries, truth):
+            found, latency = await run(plan, group_id, qemb)
+            recalls.append(len(found & expected) / len(expected) if expected else 1.0)
+            latencies.append(latency)
+        reports.append({
+            "mode": mode,
+            "index": name,
+            "size_bytes": sizes[name],
+            "recall": statistics.mean(recalls) if recalls else 0.0,
+            "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        })
+    for item in reports:
+        print(json.dumps(item))
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage compact HNSW indexes on knowledge_bases.embedding")
+    commands = parser.add_subparsers(dest="command", required=True)
+    create_parser = commands.add_parser("create", help="Build the index for a mode concurrently on every partition")
+    create_parser.add_argument("mode", choices=INDEXES)
+    create_parser.add_argument("--m", type=int, default=16)
+    create_parser.add_argument("--ef-construction", type=int, default=64)
+    drop_parser = commands.add_parser("drop", help="Drop the index for a mode concurrently")
+    drop_parser.add_argument("mode", choices=INDEXES)
+    report_parser = commands.add_parser("report", help="Print recall and size for every built index")
+    report_parser.add_argument("--samples", type=int, default=50)
+    report_parser.add_argument("--k", type=int, default=10)
+    report_parser.add_argument("--ef-search", type=int, default=settings.SEARCH_ACCURATE_EF_SEARCH)
+    args = parser.parse_args()
+    if args.command == "create":
+        asyncio.run(create(args.mode, args.m, args.ef_construction))
+    elif args.command == "drop":
+        asyncio.run(drop(args.mode))
+    else:
+        asyncio.run(report(args.samples, args.k, args.ef_search))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import json
+import time
+import uuid
+import asyncio
+
+import numpy as np
+
+from contextlib import AsyncExitStack
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .database import AsyncSessionLocal, ReadSessionLocals, engine, replica_engines
+from .embedding import Embedder, get_embedder
+from .metrics import span
+from .repositories.knowledge_base import KnowledgeBaseRepository
+from .repositories.knowledge_group import KnowledgeGroupRepository
+from .services.knowledge_base import KnowledgeBaseService
+from .settings import settings
+
+class Warmup:
+
+    def __init__(self):
+        self.status = "starting"
+        self.phase: Optional[str] = None
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.groups: List[uuid.UUID] = []
+        self.rounds = 0
+        self.searches = 0
+        self.p99_ms: Optional[float] = None
+        self.prewarmed_blocks = 0
+        self.restarts = 0
+        self.postmasters: List[datetime] = []
+        self.errors: List[str] = []
+
+    @property
+    def ready(self) -> bool:
+        return self.status in ("ready", "timeout")
+
+    def skip(self):
+        self.status = "ready"
+        self.finished = time.perf_counter()
+
+    async def run(self):
+        while True:
+            await self.warm()
+            if self.status == "failed":
+                await asyncio.sleep(settings.WARMUP_RETRY_SECONDS)
+                continue
+            if not settings.WARMUP_WATCH_SECONDS:
+                return
+            await self.watch()
+            self.restarts += 1
+
+    async def watch(self):
+        while True:
+            await asyncio.sleep(settings.WARMUP_WATCH_SECONDS)
+            try:
+                if await self.postmaster_times() != self.postmasters:
+                    return
+            except Exception as e:
+                self.error("watch", e)
+                return
+
+    async def postmaster_times(self) -> List[datetime]:
+        times = []
+        for target in [engine, *replica_engines]:
+            async with target.connect() as connection:
+                result = await connection.execute(text("select pg_postmaster_start_time()"))
+                times.append(result.scalar_one())
+        return times
+
+    async def warm(self):
+        self.status = "warming"
+        self.started = time.perf_counter()
+        self.finished = None
+        try:
+            async with asyncio.timeout(settings.WARMUP_TIMEOUT_SECONDS):
+                for phase, step, required in (
+                    ("pool", self.pool, True),
+                    ("groups", self.hot_groups, True),
+                    ("prewarm", self.prewarm, False),
+                    ("embedders", self.embedders, False),
+                    ("search", self.search, True),
+                ):
+                    self.phase = phase
+                    with span("warmup", phase):
+                        while True:
+                            try:
+                                await step()
+                                break
+                            except Exception as e:
+                                self.error(phase, e)
+                                if not required:
+                                    break
+                                await asyncio.sleep(1.0)
+            self.status = "ready"
+        except TimeoutError:
+            self.status = "failed" if self.phase in ("pool", "groups") else "timeout"
+        self.phase = None
+        self.finished = time.perf_counter()
+        print(json.dumps({"event": "warmup", **self.stats()}))
+
+    def error(self, phase: str, e: Exception):
+        self.errors = [*self.errors[-9:], f"{phase}: {type(e).__name__}: {e}"]
+
+    async def pool(self):
+        size = min(settings.WARMUP_CONNECTIONS or settings.DB_POOL_SIZE, settings.DB_POOL_SIZE)
+
+        async def fill(target: AsyncEngine):
+            async with AsyncExitStack() as stack:
+                connections = await asyncio.gather(*(stack.enter_async_context(target.connect()) for _ in range(size)))
+                await asyncio.gather(*(connection.execute(text("select 1")) for connection in connections))
+
+        await asyncio.gather(*(fill(target) for target in [engine, *replica_engines]))
+        self.postmasters = await self.postmaster_times()
+
+    async def hot_groups(self):
+        if settings.WARMUP_GROUP_IDS:
+            self.groups = [uuid.UUID(group) for group in settings.WARMUP_GROUP_IDS]
+            return
+        async with AsyncSessionLocal() as session:
+            self.groups = await KnowledgeGroupRepository(session).hottest(settings.WARMUP_GROUPS)
+
+    async def prewarm(self):
+        if not settings.WARMUP_PREWARM or settings.VECTOR_STORE != "pgvector":
+            return
+        for target in [engine, *replica_engines]:
+            async with target.connect() as connection:
+                repository = KnowledgeBaseRepository(connection)
+                indexes = dict.fromkeys(
+                    index for group in self.groups for index in await repository.prewarm_indexes(group)
+                )
+                for index in indexes:
+                    self.prewarmed_blocks += await repository.prewarm(index)
+
+    async def embedders(self):
+        async with AsyncSessionLocal() as session:
+            service = KnowledgeBaseService(session, session)
+            targets: Dict[int, Embedder] = {id(get_embedder()): get_embedder()}
+            for group in self.groups:
+                _, embedder = await service.query_embedder(group)
+                targets[id(embedder)] = embedder
+        await asyncio.gather(*(embedder.embed(["warmup"], cached=False) for embedder in targets.values()))
+
+    async def search(self):
+        if settings.VECTOR_STORE != "pgvector":
+            return
+        queries = []
+        async with next(ReadSessionLocals)() as session:
+            repository = KnowledgeBaseRepository(session)
+            for group in self.groups:
+                queries.extend((group, qemb) for qemb in await repository.sample(group, settings.WARMUP_QUERIES))
+        if not queries:
+            return
+        while True:
+            latencies, failed = [], 0
+            for group, qemb in queries:
+                async with AsyncSessionLocal() as session, next(ReadSessionLocals)() as read_session:
+                    started = time.perf_counter()
+                    try:
+                        await KnowledgeBaseService(session, read_session).probe(group, qemb)
+                    except Exception as e:
+                        failed += 1
+                        self.error("search", e)
+                        continue
+                    latencies.append(time.perf_counter() - started)
+            self.rounds += 1
+            self.searches += len(latencies)
+            if latencies:
+                self.p99_ms = float(np.percentile(latencies, 99) * 1000)
+            if not failed and self.p99_ms <= settings.WARMUP_P99_MS:
+                return
+            if failed:
+                await asyncio.sleep(1.0)
+
+    def stats(self) -> dict:
+        return {
+            "status": self.status,
+            "phase": self.phase,
+            "elapsed_ms": ((self.finished or time.perf_counter()) - self.started) * 1000,
+            "groups": len(self.groups),
+            "rounds": self.rounds,
+            "searches": self.searches,
+            "p99_ms": self.p99_ms,
+            "prewarmed_blocks": self.prewarmed_blocks,
+            "restarts": self.restarts,
+            "errors": self.errors,
+        }
+
+warmup = Warmup()
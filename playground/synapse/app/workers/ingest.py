@@ -0,0 +1,113 @@
+import os
+import json
+import signal
+import socket
+import asyncio
+import argparse
+import multiprocessing
+
+from typing import List, Optional
+
+from ..database import AsyncSessionLocal
+from ..embedding import embedders
+from ..metrics import span
+from ..models import IngestionJobModel
+from ..repositories.ingestion_job import IngestionJobRepository
+from ..services.knowledge_base import EmbeddingModelChanged, KnowledgeBaseService
+from ..settings import settings
+
+class IngestionWorker:
+
+    def __init__(
+        self,
+        concurrency: int = settings.INGEST_WORKER_CONCURRENCY,
+        lease: float = settings.INGEST_JOB_LEASE_SECONDS,
+        max_attempts: int = settings.INGEST_JOB_MAX_ATTEMPTS
+    ):
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.concurrency = concurrency
+        self.lease = lease
+        self.max_attempts = max_attempts
+
+    async def heartbeat(self, job: IngestionJobModel, worker: str):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            async with AsyncSessionLocal() as session, session.begin():
+                if not await IngestionJobRepository(session).heartbeat(job.id, worker, self.lease):
+                    return
+
+    async def run_once(self, worker: str) -> bool:
+        async with AsyncSessionLocal() as session, session.begin():
+            job = await IngestionJobRepository(session).claim(worker, self.lease, self.max_attempts)
+        if job is None:
+            return False
+        log(job, "started", worker=worker, attempts=job.attempts)
+        heartbeat = asyncio.create_task(self.heartbeat(job, worker))
+        try:
+            with span("worker", "ingest_job"):
+                async with AsyncSessionLocal() as session:
+                    ids, stats = await KnowledgeBaseService(session, session).run_job(job, worker)
+            log(job, "completed", worker=worker, documents=len(ids), duplicates=stats.duplicates if stats else 0)
+        except Exception as e:
+            invalid = isinstance(e, ValueError) and not isinstance(e, EmbeddingModelChanged)
+            retry_in = None if invalid or job.attempts >= self.max_attempts else float(min(2 ** job.attempts, self.lease))
+            async with AsyncSessionLocal() as session, session.begin():
+                await IngestionJobRepository(session).fail(job.id, worker, f"{type(e).__name__}: {e}", retry_in)
+            log(job, "failed" if retry_in is None else "retrying", worker=worker, error=str(e))
+        finally:
+            heartbeat.cancel()
+        return True
+
+    async def loop(self, slot: int, poll: float):
+        worker = f"{self.name}:{slot}"
+        while True:
+            if not await self.run_once(worker):
+                await asyncio.sleep(poll)
+
+    async def run(self, poll: float = settings.INGEST_WORKER_POLL_SECONDS):
+        try:
+            await asyncio.gather(*(self.loop(slot, poll) for slot in range(self.concurrency)))
+        finally:
+            for embedder in list(embedders.values()):
+                await embedder.stop()
+
+def log(job: IngestionJobModel, event: str, **fields):
+    print(json.dumps({"job_id": str(job.id), "knowledge_group_id": str(job.knowledge_group_id), "event": event, **fields}))
+
+def configure():
+    if settings.OPENAI_API_KEY and not os.getenv("OPENAI_API_KEY"):
+        os.environ["OPENAI_API_KEY"] = settings.OPENAI_API_KEY
+
+def run_process(concurrency: int, poll: float):
+    configure()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        asyncio.run(IngestionWorker(concurrency).run(poll))
+    except KeyboardInterrupt:
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Process queued knowledge base ingestion jobs")
+    parser.add_argument("--processes", type=int, default=settings.INGEST_WORKER_PROCESSES)
+    parser.add_argument("--concurrency", type=int, default=settings.INGEST_WORKER_CONCURRENCY)
+    parser.add_argument("--poll", type=float, default=settings.INGEST_WORKER_POLL_SECONDS)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    processes: List[multiprocessing.Process] = []
+
+    def stop(signum: int, frame: Optional[object]):
+        for process in processes:
+            process.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(args.processes):
+        process = context.Process(target=run_process, args=(args.concurrency, args.poll))
+        process.start()
+        processes.append(process)
+    for process in processes:
+        process.join()
+
+if __name__ == "__main__":
+    main()
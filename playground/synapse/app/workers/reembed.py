@@ -0,0 +1,322 @@
+import os
+import json
+import time
+import uuid
+import socket
+import asyncio
+import argparse
+
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from ..database import AsyncSessionLocal, engine
+from ..embedding import Embedder, embedders, get_embedder
+from ..metrics import batch_sizes, observe, span
+from ..models import ReembeddingJobModel
+from ..repositories.knowledge_group import KnowledgeGroupRepository
+from ..repositories.reembedding import ReembeddingRepository, utcnow
+from ..settings import settings
+from ..tools.partition import COLUMNS, DEFAULT, exclude, include, indexes, partition_name, tree
+from .ingest import configure
+
+class RateLimiter:
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.available = rate
+        self.updated = time.monotonic()
+
+    async def acquire(self, amount: int):
+        while True:
+            now = time.monotonic()
+            self.available = min(self.rate, self.available + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.available >= min(amount, self.rate):
+                self.available -= amount
+                return
+            await asyncio.sleep((min(amount, self.rate) - self.available) / self.rate)
+
+class LeaseLost(Exception):
+    pass
+
+class ReembeddingWorker:
+
+    def __init__(
+        self,
+        batch_size: int = settings.REEMBED_BATCH_SIZE,
+        texts_per_second: float = settings.REEMBED_TEXTS_PER_SECOND,
+        lease: float = settings.REEMBED_LEASE_SECONDS,
+        max_attempts: int = settings.REEMBED_MAX_ATTEMPTS,
+        lock_timeout: str = settings.REEMBED_LOCK_TIMEOUT,
+        flip_retries: int = settings.REEMBED_FLIP_RETRIES
+    ):
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.batch_size = batch_size
+        self.limiter = RateLimiter(texts_per_second)
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.lock_timeout = lock_timeout
+        self.flip_retries = flip_retries
+
+    async def embed(self, embedder: Embedder, rows: List[Tuple[uuid.UUID, str]]) -> List[Tuple[uuid.UUID, List[float]]]:
+        await self.limiter.acquire(len(rows))
+        observe(batch_sizes, len(rows), "reembed")
+        with span("reembed", "embed"):
+            embeddings = await embedder.embed([content for _, content in rows], cached=False)
+        return [(knowledge_base_id, embedding) for (knowledge_base_id, _), embedding in zip(rows, embeddings)]
+
+    async def heartbeat(self, job: ReembeddingJobModel):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            async with AsyncSessionLocal() as session, session.begin():
+                if not await ReembeddingRepository(session).heartbeat(job.id, self.name, self.lease):
+                    return
+
+    async def run_once(self) -> bool:
+        async with AsyncSessionLocal() as session, session.begin():
+            job = await ReembeddingRepository(session).claim(self.name, self.lease)
+        if job is None:
+            return False
+        heartbeat = asyncio.create_task(self.heartbeat(job))
+        try:
+            await self.process(job)
+        except LeaseLost as e:
+            log(job, "lease_lost", error=str(e))
+        except Exception as e:
+            failed = job.attempts >= self.max_attempts
+            async with AsyncSessionLocal() as session, session.begin():
+                await ReembeddingRepository(session).finish(
+                    job.id,
+                    "failed" if failed else "running",
+                    f"{type(e).__name__}: {e}",
+                    None if failed else utcnow() + timedelta(seconds=min(2 ** job.attempts, self.lease))
+                )
+                if failed:
+                    await ReembeddingRepository(session).discard(job.id)
+                    await session.execute(text(f"drop table if exists {staging_table(job)}"))
+            log(job, "failed" if failed else "retrying", error=str(e))
+        finally:
+            heartbeat.cancel()
+        return True
+
+    async def process(self, job: ReembeddingJobModel):
+        embedder = get_embedder(job.embedding_provider, job.embedding_model)
+        cursor, processed = job.cursor, job.processed
+        log(job, "resumed" if cursor else "started", processed=processed)
+        await self.copy(job, embedder, cursor, processed)
+        table = await self.build(job, embedder)
+        async with engine.connect() as connection:
+            leaves = await exclude(connection, job.knowledge_group_id, self.lock_timeout)
+        try:
+            await self.flip(job, embedder, table)
+        finally:
+            async with engine.connect() as connection:
+                await include(connection, job.knowledge_group_id, leaves, self.lock_timeout)
+        log(job, "completed")
+
+    async def copy(self, job: ReembeddingJobModel, embedder: Embedder, cursor: Optional[uuid.UUID], processed: int):
+        while True:
+            async with AsyncSessionLocal() as session:
+                rows = await ReembeddingRepository(session).rows(job.knowledge_group_id, cursor, self.batch_size)
+            if not rows:
+                break
+            staged = await self.embed(embedder, rows)
+            async with AsyncSessionLocal() as session, session.begin():
+                repository = ReembeddingRepository(session)
+                await repository.stage(job.id, staged)
+                cursor, processed = rows[-1][0], processed + len(rows)
+                if not await repository.checkpoint(job.id, self.name, cursor, processed, self.lease):
+                    raise LeaseLost(f"Job {job.id} was claimed by another worker")
+            log(job, "checkpoint", processed=processed, total=job.total)
+
+    async def sync(self, session: AsyncSession, job: ReembeddingJobModel, embedder: Embedder, table: str) -> Dict[str, int]:
+        repository = ReembeddingRepository(session)
+        while rows := await repository.missing(job.id, job.knowledge_group_id, self.batch_size):
+            await repository.stage(job.id, await self.embed(embedder, rows))
+        inserted = await fill(await session.connection(), job, table)
+        deleted = await session.execute(text(
+            f"delete from {table} s where not exists "
+            "(select 1 from knowledge_bases k where k.knowledge_group_id = :group and k.id = s.id)"
+        ), {"group": job.knowledge_group_id})
+        return {"inserted": len(inserted), "deleted": deleted.rowcount}
+
+    async def build(self, job: ReembeddingJobModel, embedder: Embedder) -> str:
+        table = staging_table(job)
+        async with engine.connect() as connection:
+            with span("reembed", "build"):
+                await connection.execute(text(f"drop table if exists {table}"))
+                await connection.execute(text(
+                    f"create table {table} (like knowledge_bases including defaults including generated including constraints)"
+                ))
+                await connection.execute(text(f"alter table {table} add primary key (id, knowledge_group_id)"))
+                await connection.commit()
+                after, copied = None, 0
+                while ids := await fill(connection, job, table, after, self.batch_size):
+                    await connection.commit()
+                    after, copied = max(ids), copied + len(ids)
+                log(job, "filled", table=table, rows=copied)
+                for statement in await indexes(connection, table, None, None):
+                    started = time.perf_counter()
+                    await connection.execute(text(statement))
+                    await connection.commit()
+                    log(job, "indexed", index=statement, seconds=round(time.perf_counter() - started, 3))
+                await connection.execute(text(
+                    f"alter table {table} add constraint {table}_group_check check (knowledge_group_id = '{job.knowledge_group_id}'), "
+                    f"add foreign key (knowledge_group_id) references knowledge_groups (id)"
+                ))
+                await connection.commit()
+        async with AsyncSessionLocal() as session, session.begin():
+            rows = await self.sync(session, job, embedder, table)
+        log(job, "built", table=table, **rows)
+        return table
+
+    async def flip(self, job: ReembeddingJobModel, embedder: Embedder, table: str):
+        partition = partition_name(job.knowledge_group_id)
+        async with AsyncSessionLocal() as session:
+            for attempt in range(1, self.flip_retries + 1):
+                try:
+                    with span("reembed", "flip"):
+                        started = time.perf_counter()
+                        await session.execute(text(f"set local lock_timeout = '{self.lock_timeout}'"))
+                        if not await KnowledgeGroupRepository(session).lock(job.knowledge_group_id):
+                            raise ValueError(f"Knowledge group {job.knowledge_group_id} not found")
+                        rows = await self.sync(session, job, embedder, table)
+                        if any(name == partition for name, _, _ in await tree(await session.connection())):
+                            await session.execute(text(f"alter table knowledge_bases detach partition {partition}"))
+                            await session.execute(text(f"drop table {partition}"))
+                        else:
+                            await session.execute(text(
+                                f"delete from {DEFAULT} where knowledge_group_id = :group"
+                            ), {"group": job.knowledge_group_id})
+                        await session.execute(text(f"alter table {table} rename to {partition}"))
+                        await session.execute(text(
+                            f"alter table knowledge_bases attach partition {partition} for values in ('{job.knowledge_group_id}')"
+                        ))
+                        repository = ReembeddingRepository(session)
+                        await repository.discard(job.id)
+                        await KnowledgeGroupRepository(session).switch_model(
+                            job.knowledge_group_id, embedder.provider.name, embedder.provider.model
+                        )
+                        await repository.finish(job.id, "completed")
+                        await session.commit()
+                    break
+                except DBAPIError as e:
+                    await session.rollback()
+                    if not ("lock timeout" in str(e) or "deadlock detected" in str(e)) or attempt == self.flip_retries:
+                        raise
+                    log(job, "lock_timeout", attempt=attempt)
+                    await asyncio.sleep(min(2 ** attempt, 30))
+            await session.execute(text(f"analyze {partition}"))
+            await session.commit()
+        log(job, "flipped", partition=partition, locked_seconds=round(time.perf_counter() - started, 3), **rows)
+
+    async def run(self, poll: float = settings.REEMBED_POLL_SECONDS, once: bool = False):
+        check_vector_store()
+        try:
+            while True:
+                if not await self.run_once():
+                    if once:
+                        return
+                    await asyncio.sleep(poll)
+        finally:
+            for embedder in list(embedders.values()):
+                await embedder.stop()
+
+def check_vector_store():
+    if settings.VECTOR_STORE != "pgvector":
+        raise ValueError(f"Re-embedding requires the pgvector store, VECTOR_STORE is '{settings.VECTOR_STORE}'")
+
+def staging_table(job: ReembeddingJobModel) -> str:
+    return f"reembed_{job.id.hex}"
+
+async def fill(
+    connection: AsyncConnection,
+    job: ReembeddingJobModel,
+    table: str,
+    after: Optional[uuid.UUID] = None,
+    limit: Optional[int] = None
+) -> List[uuid.UUID]:
+    columns = ", ".join("e.embedding" if column == "embedding" else f"k.{column}" for column in COLUMNS.split(", "))
+    result = await connection.execute(text(
+        f"insert into {table} ({COLUMNS}) "
+        f"select {columns} from knowledge_bases k "
+        "join knowledge_base_embeddings e on e.job_id = :job and e.knowledge_base_id = k.id "
+        "where k.knowledge_group_id = :group and (cast(:after as uuid) is null or k.id > cast(:after as uuid)) "
+        f"and not exists (select 1 from {table} s where s.id = k.id) "
+        "order by k.id limit :limit returning id"
+    ), {"job": job.id, "group": job.knowledge_group_id, "after": after, "limit": limit})
+    return list(result.scalars().all())
+
+def log(job: ReembeddingJobModel, event: str, **fields):
+    print(json.dumps({"job_id": str(job.id), "knowledge_group_id": str(job.knowledge_group_id), "event": event, **fields}))
+
+async def enqueue(knowledge_group_ids: List[uuid.UUID], provider: Optional[str], model: Optional[str]):
+    check_vector_store()
+    embedder = get_embedder(provider, model)
+    async with AsyncSessionLocal() as session, session.begin():
+        repository = ReembeddingRepository(session)
+        for knowledge_group_id in knowledge_group_ids:
+            if await repository.active(knowledge_group_id):
+                raise ValueError(f"Knowledge group {knowledge_group_id} already has an active re-embedding job")
+            job_id = await repository.enqueue(knowledge_group_id, embedder.provider.name, embedder.provider.model)
+            print(json.dumps({"job_id": str(job_id), "knowledge_group_id": str(knowledge_group_id), "event": "enqueued"}))
+
+async def pending_groups(provider: Optional[str], model: Optional[str]) -> List[uuid.UUID]:
+    embedder = get_embedder(provider, model)
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(text(
+            "select id from knowledge_groups "
+            "where embedding_provider <> :provider or embedding_model <> :model"
+        ), {"provider": embedder.provider.name, "model": embedder.provider.model})
+        return list(result.scalars().all())
+
+async def backfill():
+    async with AsyncSessionLocal() as session, session.begin():
+        for name, embedder in embedders.items():
+            if name != embedder.provider.name:
+                continue
+            result = await session.execute(text(
+                "update knowledge_groups set embedding_model = :model "
+                "where embedding_model is null and embedding_provider = :provider"
+            ), {"provider": name, "model": embedder.provider.model})
+            print(json.dumps({"event": "backfilled", "provider": name, "model": embedder.provider.model, "groups": result.rowcount}))
+        await session.execute(text("alter table knowledge_groups alter column embedding_model set not null"))
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-embed knowledge groups with another embedding model")
+    commands = parser.add_subparsers(dest="command", required=True)
+    enqueue_parser = commands.add_parser("enqueue", help="Create re-embedding jobs")
+    enqueue_parser.add_argument("--group-id", action="append", type=uuid.UUID, default=[])
+    enqueue_parser.add_argument("--all", action="store_true", help="Every group not on the target model")
+    enqueue_parser.add_argument("--provider", default=None)
+    enqueue_parser.add_argument("--model", default=None)
+    commands.add_parser("backfill", help="Record the configured model on groups created before embedding_model existed")
+    run_parser = commands.add_parser("run", help="Process re-embedding jobs")
+    run_parser.add_argument("--once", action="store_true", help="Exit when no job is left")
+    run_parser.add_argument("--batch-size", type=int, default=settings.REEMBED_BATCH_SIZE)
+    run_parser.add_argument("--texts-per-second", type=float, default=settings.REEMBED_TEXTS_PER_SECOND)
+    run_parser.add_argument("--lock-timeout", default=settings.REEMBED_LOCK_TIMEOUT)
+    args = parser.parse_args()
+
+    configure()
+    if args.command == "enqueue":
+        async def create():
+            groups = args.group_id + (await pending_groups(args.provider, args.model) if args.all else [])
+            await enqueue(list(dict.fromkeys(groups)), args.provider, args.model)
+        asyncio.run(create())
+    elif args.command == "backfill":
+        asyncio.run(backfill())
+    else:
+        worker = ReembeddingWorker(
+            batch_size=args.batch_size,
+            texts_per_second=args.texts_per_second,
+            lock_timeout=args.lock_timeout
+        )
+        asyncio.run(worker.run(once=args.once))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import json
+import random
+
+from typing import Dict, Iterator, List, Tuple
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "qua", "ber", "dun", "fel", "gor", "hin", "jas"]
+COMMON = ["the", "a", "of", "and", "to", "in", "is", "for", "with", "on", "that", "by", "as", "from", "at"]
+
+def vocabulary(rng: random.Random, size: int) -> List[str]:
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+def sentence(rng: random.Random, words: List[str]) -> str:
+    tokens = [rng.choice(words) if rng.random() < 0.6 else rng.choice(COMMON) for _ in range(rng.randint(8, 18))]
+    return " ".join(tokens).capitalize() + "."
+
+class Corpus:
+
+    def __init__(self, seed: int = 42, topics: int = 20, topic_words: int = 60, paragraphs: int = 3, sentences: int = 5):
+        self.seed = seed
+        self.paragraphs = paragraphs
+        self.sentences = sentences
+        rng = random.Random(seed)
+        self.topics = [vocabulary(rng, topic_words) for _ in range(topics)]
+
+    def document(self, index: int) -> Dict[str, str]:
+        rng = random.Random(f"{self.seed}:document:{index}")
+        words = self.topics[index % len(self.topics)]
+        content = "\n\n".join(
+            " ".join(sentence(rng, words) for _ in range(self.sentences))
+            for _ in range(self.paragraphs)
+        )
+        return {"name": f"doc-{index:07d}", "content": content}
+
+    def documents(self, count: int, start: int = 0) -> Iterator[Dict[str, str]]:
+        for index in range(start, start + count):
+            yield self.document(index)
+
+    def queries(self, count: int, documents: int) -> List[Tuple[str, str]]:
+        rng = random.Random(f"{self.seed}:queries")
+        queries = []
+        for _ in range(count):
+            document = self.document(rng.randrange(documents))
+            words = document["content"].replace("\n", " ").split()
+            start = rng.randrange(max(1, len(words) - 8))
+            queries.append((" ".join(words[start:start + 8]).strip(".").lower(), document["name"]))
+        return queries
+
+def write_ndjson(path: str, corpus: Corpus, count: int):
+    with open(path, "w", encoding="utf-8") as file:
+        for document in corpus.documents(count):
+            file.write(json.dumps(document) + "\n")
@@ -0,0 +1,86 @@
+import re
+import time
+import base64
+import random
+import asyncio
+import hashlib
+import argparse
+
+import numpy as np
+import uvicorn
+
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Union
+
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+TOKEN = re.compile(r"\w+")
+
+@lru_cache(maxsize=200000)
+def token_vector(token: str, dimensions: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+    return np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+
+def embed(text: str, dimensions: int = 1536) -> np.ndarray:
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for token in TOKEN.findall(text.lower()):
+        vector += token_vector(token, dimensions)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class EmbeddingsRequest(BaseModel):
+    model: str
+    input: Union[str, List[str]]
+    encoding_format: Optional[str] = None
+    dimensions: Optional[int] = None
+
+def create_app(latency_ms: float, jitter_ms: float, per_item_ms: float, dimensions: int) -> FastAPI:
+    app = FastAPI(title="Fake embeddings")
+    app.state.requests = 0
+    app.state.items = 0
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: EmbeddingsRequest) -> Dict[str, Any]:
+        texts = [request.input] if isinstance(request.input, str) else request.input
+        started = time.perf_counter()
+        vectors = [embed(text, request.dimensions or dimensions) for text in texts]
+        delay = (latency_ms + random.uniform(0, jitter_ms) + per_item_ms * len(texts)) / 1000
+        await asyncio.sleep(max(0.0, delay - (time.perf_counter() - started)))
+        app.state.requests += 1
+        app.state.items += len(texts)
+        tokens = sum(len(TOKEN.findall(text)) for text in texts)
+        return {
+            "object": "list",
+            "data": [
+                {
+                    "object": "embedding",
+                    "index": i,
+                    "embedding": base64.b64encode(vector.tobytes()).decode() if request.encoding_format == "base64" else vector.tolist(),
+                }
+                for i, vector in enumerate(vectors)
+            ],
+            "model": request.model,
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.get("/stats")
+    async def stats() -> Dict[str, int]:
+        return {"requests": app.state.requests, "items": app.state.items}
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve deterministic embeddings behind an OpenAI-compatible /v1/embeddings API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--per-item-ms", type=float, default=0.05)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    args = parser.parse_args()
+    app = create_app(args.latency_ms, args.jitter_ms, args.per_item_ms, args.dimensions)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import sys
+import json
+import asyncio
+import argparse
+import subprocess
+
+import httpx
+
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from .corpus import Corpus, write_ndjson
+from .scenarios import build_index, connect, create_group, ef_search_sweep, guard, index_definitions, ingest, restore_index, search
+
+def revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def record(output: Optional[str], scenario: str, params: Dict[str, Any], metrics: Dict[str, Any]):
+    line = json.dumps({
+        "scenario": scenario,
+        "params": params,
+        "metrics": metrics,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": revision(),
+    })
+    print(line)
+    if output:
+        with open(output, "a", encoding="utf-8") as file:
+            file.write(line + "\n")
+
+def integers(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item]
+
+async def run_ingest(args: argparse.Namespace):
+    corpus = Corpus(seed=args.seed)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout) as client:
+        group_id = await create_group(client, f"bench-{args.documents}")
+        metrics = await ingest(client, group_id, corpus, args.documents, args.batch_size, args.concurrency)
+    record(args.output, "ingest", {
+        "documents": args.documents,
+        "batch_size": args.batch_size,
+        "concurrency": args.concurrency,
+        "seed": args.seed,
+        "group_id": group_id,
+    }, metrics)
+
+async def run_search(args: argparse.Namespace):
+    corpus = Corpus(seed=args.seed)
+    queries = corpus.queries(args.queries, args.documents)
+    params = {"profile": args.profile, "mode": args.mode, "content": args.content}
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout) as client:
+        metrics = await search(client, args.group_id, queries, args.k, args.concurrency, params)
+    record(args.output, "search", {
+        "documents": args.documents,
+        "queries": args.queries,
+        "k": args.k,
+        "concurrency": args.concurrency,
+        "seed": args.seed,
+        **params,
+    }, metrics)
+
+async def run_sweep(args: argparse.Namespace):
+    corpus = Corpus(seed=args.seed)
+    connection = await connect(args.database_url)
+    try:
+        await guard(connection)
+        original = await index_definitions(connection)
+    except BaseException:
+        await connection.close()
+        raise
+    try:
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout) as client:
+            for group_size in integers(args.group_sizes):
+                group_id = await create_group(client, f"sweep-{group_size}")
+                metrics = await ingest(client, group_id, corpus, group_size, args.batch_size, args.concurrency)
+                record(args.output, "ingest", {"documents": group_size, "batch_size": args.batch_size, "concurrency": args.concurrency, "seed": args.seed}, metrics)
+                queries = corpus.queries(args.queries, group_size)
+                for m in integers(args.m):
+                    for ef_construction in integers(args.ef_construction):
+                        params = {"group_size": group_size, "m": m, "ef_construction": ef_construction, "k": args.k, "seed": args.seed}
+                        record(args.output, "index", params, await build_index(connection, m, ef_construction))
+                        for metrics in await ef_search_sweep(connection, group_id, queries, args.k, integers(args.ef_search)):
+                            ef_search = metrics.pop("ef_search")
+                            record(args.output, "ann", {**params, "ef_search": ef_search}, metrics)
+                        for profile in ("fast", "accurate"):
+                            metrics = await search(client, group_id, queries, args.k, args.concurrency, {"profile": profile})
+                            record(args.output, "search", {**params, "profile": profile, "concurrency": args.concurrency}, metrics)
+    finally:
+        await restore_index(connection, original)
+        await connection.close()
+
+def load(path: str) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    records = {}
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                item = json.loads(line)
+                params = {key: value for key, value in item["params"].items() if key != "group_id"}
+                records[(item["scenario"], json.dumps(params, sort_keys=True))] = item["metrics"]
+    return records
+
+def regressions(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float) -> List[str]:
+    found = []
+    for metric, before in baseline.items():
+        after = current.get(metric)
+        if not isinstance(before, (int, float)) or not isinstance(after, (int, float)) or not before:
+            continue
+        change = (after - before) / before
+        if metric.endswith("_ms") and change > tolerance:
+            found.append(f"{metric} {before:.3f} -> {after:.3f} (+{change:.1%})")
+        elif (metric.endswith("_per_second") or metric in ("recall", "hit_rate")) and change < -tolerance:
+            found.append(f"{metric} {before:.3f} -> {after:.3f} ({change:.1%})")
+        elif metric == "errors" and after > before:
+            found.append(f"{metric} {before} -> {after}")
+    return found
+
+def compare(args: argparse.Namespace) -> int:
+    baseline, current = load(args.baseline), load(args.current)
+    failed = False
+    for key, metrics in baseline.items():
+        if key not in current:
+            continue
+        for message in regressions(metrics, current[key], args.tolerance):
+            failed = True
+            print(json.dumps({"scenario": key[0], "params": json.loads(key[1]), "regression": message}))
+    return 1 if failed else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Synapse ingest and search benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    corpus_parser = commands.add_parser("corpus", help="Write a deterministic synthetic corpus as NDJSON")
+    corpus_parser.add_argument("path")
+    corpus_parser.add_argument("--documents", type=int, default=10000)
+    corpus_parser.add_argument("--seed", type=int, default=42)
+
+    for name, help in (
+        ("ingest", "Ingest the synthetic corpus through POST knowledge-bases"),
+        ("search", "Run /-/search queries against an ingested group"),
+        ("sweep", "Sweep group sizes, HNSW m/ef_construction and ef_search"),
+    ):
+        command = commands.add_parser(name, help=help)
+        command.add_argument("--base-url", default="http://localhost:8000")
+        command.add_argument("--output", help="Append JSON lines to this file")
+        command.add_argument("--seed", type=int, default=42)
+        command.add_argument("--concurrency", type=int, default=8)
+        command.add_argument("--batch-size", type=int, default=64)
+        command.add_argument("--timeout", type=float, default=120.0)
+        command.add_argument("--k", type=int, default=10)
+        command.add_argument("--queries", type=int, default=200)
+        if name == "ingest":
+            command.add_argument("--documents", type=int, default=1000)
+        if name == "search":
+            command.add_argument("--group-id", required=True)
+            command.add_argument("--documents", type=int, default=1000, help="Documents ingested into the group")
+            command.add_argument("--profile", choices=["fast", "accurate"], default="fast")
+            command.add_argument("--mode", choices=["vector", "hybrid"], default="vector")
+            command.add_argument("--content", choices=["full", "snippet", "none"], default="full")
+        if name == "sweep":
+            command.add_argument("--database-url", required=True, help="Dedicated benchmark database (its name must contain 'bench'); the sweep rebuilds its HNSW index")
+            command.add_argument("--group-sizes", default="1000,10000")
+            command.add_argument("--m", default="8,16,32")
+            command.add_argument("--ef-construction", default="64,128")
+            command.add_argument("--ef-search", default="20,40,100,200")
+
+    compare_parser = commands.add_parser("compare", help="Report regressions between two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--tolerance", type=float, default=0.1)
+
+    args = parser.parse_args()
+    if args.command == "corpus":
+        write_ndjson(args.path, Corpus(seed=args.seed), args.documents)
+    elif args.command == "ingest":
+        asyncio.run(run_ingest(args))
+    elif args.command == "search":
+        asyncio.run(run_search(args))
+    elif args.command == "sweep":
+        asyncio.run(run_sweep(args))
+    else:
+        sys.exit(compare(args))
+
+if __name__ == "__main__":
+    main()
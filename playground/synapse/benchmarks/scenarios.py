@@ -0,0 +1,203 @@
+import time
+import asyncio
+
+import httpx
+import numpy as np
+import psycopg
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from pgvector.psycopg import register_vector_async
+
+from .corpus import Corpus
+from .fake_embeddings import embed
+
+INDEX = "knowledge_bases_embedding_hnsw_cos_idx"
+
+def percentiles(latencies: Sequence[float]) -> Dict[str, float]:
+    if not latencies:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    values = np.asarray(latencies) * 1000
+    return {
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+    }
+
+async def drive(tasks: Sequence[Callable[[], Awaitable[Any]]], concurrency: int) -> Tuple[List[float], int, float]:
+    queue: asyncio.Queue = asyncio.Queue()
+    for task in tasks:
+        queue.put_nowait(task)
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            task = queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                await task()
+                latencies.append(time.perf_counter() - started)
+            except Exception:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+async def create_group(client: httpx.AsyncClient, name: str) -> str:
+    response = await client.post("/knowledge-groups/", json={"name": name, "description": "benchmark"})
+    response.raise_for_status()
+    return response.json()["id"]
+
+async def ingest(
+    client: httpx.AsyncClient,
+    group_id: str,
+    corpus: Corpus,
+    documents: int,
+    batch_size: int,
+    concurrency: int
+) -> Dict[str, Any]:
+    batches = [list(corpus.documents(min(batch_size, documents - start), start)) for start in range(0, documents, batch_size)]
+
+    def post(batch: List[Dict[str, str]]) -> Callable[[], Awaitable[None]]:
+        async def call():
+            response = await client.post(f"/knowledge-groups/{group_id}/knowledge-bases/", json=batch)
+            response.raise_for_status()
+        return call
+
+    latencies, errors, elapsed = await drive([post(batch) for batch in batches], concurrency)
+    return {
+        "documents": documents,
+        "requests": len(batches),
+        "errors": errors,
+        "seconds": elapsed,
+        "documents_per_second": documents / elapsed if elapsed else 0.0,
+        **percentiles(latencies),
+    }
+
+async def search(
+    client: httpx.AsyncClient,
+    group_id: str,
+    queries: List[Tuple[str, str]],
+    k: int,
+    concurrency: int,
+    params: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    hits = 0
+
+    def get(query: str, expected: str) -> Callable[[], Awaitable[None]]:
+        async def call():
+            nonlocal hits
+            response = await client.get(
+                f"/knowledge-groups/{group_id}/knowledge-bases/-/search",
+                params={"q": query, "k": k, **(params or {})}
+            )
+            response.raise_for_status()
+            hits += any(result["name"] == expected for result in response.json())
+        return call
+
+    latencies, errors, elapsed = await drive([get(query, expected) for query, expected in queries], concurrency)
+    return {
+        "queries": len(queries),
+        "errors": errors,
+        "seconds": elapsed,
+        "queries_per_second": len(queries) / elapsed if elapsed else 0.0,
+        "hit_rate": hits / len(queries) if queries else 0.0,
+        **percentiles(latencies),
+    }
+
+async def connect(database_url: str) -> psycopg.AsyncConnection:
+    connection = await psycopg.AsyncConnection.connect(database_url.replace("+psycopg", ""), autocommit=True)
+    await register_vector_async(connection)
+    return connection
+
+async def guard(connection: psycopg.AsyncConnection):
+    cursor = await connection.execute("select current_database()")
+    [database] = await cursor.fetchone()
+    if "bench" not in database:
+        raise SystemExit(
+            f"Refusing to rebuild {INDEX} in database {database!r}: "
+            "point --database-url at a dedicated benchmark database (its name must contain 'bench')"
+        )
+
+async def index_definitions(connection: psycopg.AsyncConnection) -> List[Tuple[str, Optional[str], bool, str]]:
+    cursor = await connection.execute(
+        "select relid::regclass::text, parentrelid::regclass::text, isleaf, pg_get_indexdef(relid) "
+        "from pg_partition_tree(to_regclass(%s)) order by level",
+        (INDEX,)
+    )
+    return await cursor.fetchall()
+
+async def create_index(connection: psycopg.AsyncConnection, definitions: List[Tuple[str, Optional[str], bool, str]]):
+    for index, parent, leaf, definition in definitions:
+        if leaf:
+            definition = definition.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)
+        await connection.execute(definition)
+        if parent is not None:
+            await connection.execute(f"alter index {parent} attach partition {index}")
+
+async def restore_index(connection: psycopg.AsyncConnection, definitions: List[Tuple[str, Optional[str], bool, str]]):
+    await connection.execute(f"drop index if exists {INDEX}")
+    await create_index(connection, definitions)
+
+async def build_index(connection: psycopg.AsyncConnection, m: int, ef_construction: int) -> Dict[str, Any]:
+    await connection.execute(f"drop index if exists {INDEX}")
+    cursor = await connection.execute(
+        "select relid::regclass::text, parentrelid::regclass::text, isleaf from pg_partition_tree('knowledge_bases') order by level"
+    )
+    using = f"USING hnsw (embedding vector_cosine_ops) WITH (m = {m}, ef_construction = {ef_construction})"
+    names: Dict[str, str] = {}
+    definitions = []
+    for relation, parent, leaf in await cursor.fetchall():
+        names[relation] = INDEX if parent is None else f"{relation}_embedding_hnsw_idx"
+        only = "" if leaf else "ONLY "
+        definitions.append((names[relation], names.get(parent), leaf, f"CREATE INDEX {names[relation]} ON {only}{relation} {using}"))
+    started = time.perf_counter()
+    await create_index(connection, definitions)
+    elapsed = time.perf_counter() - started
+    cursor = await connection.execute(f"select sum(pg_relation_size(relid))::bigint from pg_partition_tree('{INDEX}')")
+    [size] = await cursor.fetchone()
+    return {"build_seconds": elapsed, "size_bytes": size}
+
+async def nearest(
+    connection: psycopg.AsyncConnection,
+    group_id: str,
+    qemb: np.ndarray,
+    k: int,
+    ef_search: Optional[int]
+) -> Tuple[List[Any], float]:
+    async with connection.transaction():
+        if ef_search is None:
+            await connection.execute("set local enable_indexscan = off")
+        else:
+            await connection.execute(f"set local hnsw.ef_search = {ef_search}")
+            await connection.execute("set local hnsw.iterative_scan = relaxed_order")
+        started = time.perf_counter()
+        cursor = await connection.execute(
+            "select id from knowledge_bases where knowledge_group_id = %s order by embedding <=> %s limit %s",
+            (group_id, qemb, k)
+        )
+        rows = await cursor.fetchall()
+        return [row[0] for row in rows], time.perf_counter() - started
+
+async def ef_search_sweep(
+    connection: psycopg.AsyncConnection,
+    group_id: str,
+    queries: List[Tuple[str, str]],
+    k: int,
+    ef_searches: Sequence[int]
+) -> List[Dict[str, Any]]:
+    qembs = [embed(query) for query, _ in queries]
+    truth = [set((await nearest(connection, group_id, qemb, k, None))[0]) for qemb in qembs]
+    results = []
+    for ef_search in ef_searches:
+        recalls, latencies = [], []
+        for qemb, expected in zip(qembs, truth):
+            found, latency = await nearest(connection, group_id, qemb, k, ef_search)
+            recalls.append(len(set(found) & expected) / len(expected) if expected else 1.0)
+            latencies.append(latency)
+        results.append({"ef_search": ef_search, "recall": float(np.mean(recalls)), **percentiles(latencies)})
+    return results
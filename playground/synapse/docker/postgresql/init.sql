@@ -1,4 +1,5 @@
 create extension if not exists "vector";
+create extension if not exists "pg_prewarm";
 
 create table agents(
     id uuid not null,
@@ -6,6 +7,7 @@ create table agents(
     description varchar(255),
     instructions text,
     model jsonb not null,
+    generation bigint not null default 0,
     primary key (id)
 );
 
@@ -19,14 +21,16 @@ create table sessions(
 create table messages(
     id uuid not null,
     session_id uuid not null,
+    role varchar(20) not null default 'user',
     content text not null,
+    tokens integer not null default 0,
     labels jsonb,
     created_at timestamp with time zone not null default current_timestamp,
     primary key (id),
     constraint messages_session_id_fkey foreign key (session_id) references sessions(id)
 );
 
-create index messages_session_time_idx on messages using btree (session_id, created_at);
+create index messages_session_time_idx on messages using btree (session_id, created_at, id);
 
 create table nested_agents (
     agent_id uuid not null,
@@ -43,18 +47,111 @@ create table knowledge_groups(
     id uuid not null,
     name varchar(80) not null,
     description varchar(255),
+    generation bigint not null default 0,
+    embedding_provider varchar(40) not null default 'openai',
+    embedding_model varchar(80) not null,
     primary key (id)
 );
 
 create table knowledge_bases(
     id uuid not null,
     knowledge_group_id uuid not null,
+    document_id uuid not null,
+    chunk_index integer not null default 0,
+    start_offset integer not null default 0,
+    end_offset integer not null default 0,
     name varchar(80) not null,
     content text not null,
+    content_tsv tsvector generated always as (to_tsvector('simple', content)) stored,
     embedding vector(1536) not null,
+    primary key (id, knowledge_group_id),
+    foreign key (knowledge_group_id) references knowledge_groups (id)
+) partition by list (knowledge_group_id);
+
+create table knowledge_bases_shared partition of knowledge_bases default partition by hash (knowledge_group_id);
+create table knowledge_bases_shared_0 partition of knowledge_bases_shared for values with (modulus 8, remainder 0);
+create table knowledge_bases_shared_1 partition of knowledge_bases_shared for values with (modulus 8, remainder 1);
+create table knowledge_bases_shared_2 partition of knowledge_bases_shared for values with (modulus 8, remainder 2);
+create table knowledge_bases_shared_3 partition of knowledge_bases_shared for values with (modulus 8, remainder 3);
+create table knowledge_bases_shared_4 partition of knowledge_bases_shared for values with (modulus 8, remainder 4);
+create table knowledge_bases_shared_5 partition of knowledge_bases_shared for values with (modulus 8, remainder 5);
+create table knowledge_bases_shared_6 partition of knowledge_bases_shared for values with (modulus 8, remainder 6);
+create table knowledge_bases_shared_7 partition of knowledge_bases_shared for values with (modulus 8, remainder 7);
+
+create index knowledge_bases_knowledge_group_id_idx on knowledge_bases using btree (knowledge_group_id, id);
+create index knowledge_bases_document_id_idx on knowledge_bases using btree (document_id, chunk_index);
+create index knowledge_bases_content_tsv_idx on knowledge_bases using gin (content_tsv);
+create index knowledge_bases_embedding_hnsw_cos_idx on knowledge_bases using hnsw (embedding vector_cosine_ops) WITH (m='16', ef_construction='64');
+
+create table document_signatures(
+    knowledge_group_id uuid not null,
+    document_id uuid not null,
+    signature bytea not null,
+    bands bigint[] not null,
+    primary key (knowledge_group_id, document_id),
+    foreign key (knowledge_group_id) references knowledge_groups (id)
+);
+
+create index document_signatures_bands_idx on document_signatures using gin (bands);
+
+create table reembedding_jobs(
+    id uuid not null,
+    knowledge_group_id uuid not null,
+    embedding_provider varchar(40) not null,
+    embedding_model varchar(80) not null,
+    status varchar(20) not null default 'pending',
+    cursor uuid,
+    processed bigint not null default 0,
+    total bigint not null default 0,
+    attempts integer not null default 0,
+    error text,
+    locked_by varchar(80),
+    locked_until timestamp with time zone,
+    created_at timestamp with time zone not null default current_timestamp,
+    updated_at timestamp with time zone not null default current_timestamp,
     primary key (id),
     foreign key (knowledge_group_id) references knowledge_groups (id)
 );
 
-create index knowledge_bases_knowledge_group_id_idx on knowledge_bases using btree (knowledge_group_id);
-create index knowledge_bases_embedding_hnsw_cos_idx on knowledge_bases using hnsw (embedding vector_cosine_ops) WITH (m='16', ef_construction='64');
\ No newline at end of file
+create index reembedding_jobs_status_idx on reembedding_jobs using btree (status, created_at);
+
+create table knowledge_base_embeddings(
+    job_id uuid not null,
+    knowledge_base_id uuid not null,
+    embedding vector(1536) not null,
+    primary key (job_id, knowledge_base_id),
+    foreign key (job_id) references reembedding_jobs (id)
+);
+
+create table ingestion_jobs(
+    id uuid not null,
+    knowledge_group_id uuid not null,
+    status varchar(20) not null default 'pending',
+    payload jsonb,
+    documents integer not null default 0,
+    duplicates integer not null default 0,
+    document_ids jsonb,
+    attempts integer not null default 0,
+    error text,
+    locked_by varchar(80),
+    locked_until timestamp with time zone,
+    available_at timestamp with time zone not null default current_timestamp,
+    created_at timestamp with time zone not null default current_timestamp,
+    started_at timestamp with time zone,
+    finished_at timestamp with time zone,
+    primary key (id),
+    foreign key (knowledge_group_id) references knowledge_groups (id)
+);
+
+create index ingestion_jobs_pending_idx on ingestion_jobs using btree (available_at) where status = 'pending';
+create index ingestion_jobs_running_idx on ingestion_jobs using btree (locked_until) where status = 'running';
+
+create table embedding_cache(
+    model varchar(80) not null,
+    text_hash char(64) not null,
+    embedding vector(1536) not null,
+    created_at timestamp with time zone not null default current_timestamp,
+    primary key (model, text_hash)
+);
+
+create index embedding_cache_created_at_idx on embedding_cache using btree (created_at);
\ No newline at end of file
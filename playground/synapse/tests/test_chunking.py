@@ -0,0 +1,36 @@
+import pytest
+
+from app.chunking import chunk_text
+from app.tokenizer import count_tokens, get_encoding
+
+try:
+    get_encoding()
+except Exception as e:
+    pytest.skip(f"tokenizer encoding unavailable: {e}", allow_module_level=True)
+
+def covered(text, chunks):
+    position = 0
+    for chunk in chunks:
+        assert chunk.start <= position, "chunks leave a gap"
+        position = max(position, chunk.end)
+    return position == len(text)
+
+def test_long_unbroken_token():
+    text = "ab3f" * 500
+    chunks = list(chunk_text(text, max_tokens=100, overlap=10))
+    assert chunks
+    assert covered(text, chunks)
+    for chunk in chunks:
+        assert chunk.content == text[chunk.start:chunk.end]
+        assert count_tokens(chunk.content) <= 100
+
+def test_oversized_sentence_keeps_every_word():
+    words = [f"term{i}" for i in range(400)]
+    text = "Short opening sentence. " + " ".join(words) + " closing. Final sentence here."
+    chunks = list(chunk_text(text, max_tokens=100, overlap=10))
+    assert covered(text, chunks)
+    content = " ".join(chunk.content for chunk in chunks)
+    assert all(word in content.split() or word + "." in content.split() for word in words)
+    for chunk in chunks:
+        assert count_tokens(chunk.content) <= 100
+        assert abs(chunk.tokens - count_tokens(chunk.content)) <= 2
@@ -0,0 +1,172 @@
+import os
+import uuid
+import asyncio
+
+import numpy as np
+import pytest
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.repositories.knowledge_base import KnowledgeBaseRepository
+from app.repositories.vector_store import NumpyVectorStore
+from app.settings import settings
+
+DIMENSIONS = 1536
+
+def vectors(count, seed=0):
+    return np.random.default_rng(seed).standard_normal((count, DIMENSIONS)).astype(np.float32)
+
+def rows(knowledge_group_id, embeddings, documents=None):
+    return [
+        (uuid.uuid4(), knowledge_group_id, documents[i] if documents else uuid.uuid4(), i, 0, 10, f"chunk-{i}", f"content {i}", embedding.tolist())
+        for i, embedding in enumerate(embeddings)
+    ]
+
+async def numpy_write(tmp_path, knowledge_group_id, data):
+    store = NumpyVectorStore(tmp_path, dimensions=DIMENSIONS)
+    await store.copy(data)
+    return store
+
+async def numpy_session_write(tmp_path, knowledge_group_id, data):
+    session = AsyncSession()
+    async with session.begin():
+        await NumpyVectorStore(tmp_path, dimensions=DIMENSIONS).bind(session).copy(data)
+    return NumpyVectorStore(tmp_path, dimensions=DIMENSIONS)
+
+async def pgvector_write(tmp_path, knowledge_group_id, data):
+    from app.database import AsyncSessionLocal
+    session = AsyncSessionLocal()
+    await session.begin()
+    await session.execute(
+        text(
+            "insert into knowledge_groups (id, name, embedding_provider, embedding_model) "
+            "values (:id, 'conformance', :provider, :model)"
+        ),
+        {"id": knowledge_group_id, "provider": settings.EMBED_PROVIDER, "model": settings.EMBED_MODEL}
+    )
+    repository = KnowledgeBaseRepository(session)
+    await repository.copy(data)
+    return repository
+
+@pytest.fixture(params=["numpy", "numpy-session", "pgvector"])
+def store(request, tmp_path):
+    if request.param == "pgvector" and not os.environ.get("SYNAPSE_TEST_DATABASE_URL"):
+        pytest.skip("SYNAPSE_TEST_DATABASE_URL is not set")
+    write = {"numpy": numpy_write, "numpy-session": numpy_session_write, "pgvector": pgvector_write}[request.param]
+    knowledge_group_id = uuid.uuid4()
+    loop = asyncio.new_event_loop()
+    stores = []
+
+    def load(data):
+        stores.append(loop.run_until_complete(write(tmp_path, knowledge_group_id, data)))
+        return stores[-1]
+
+    yield knowledge_group_id, load, loop.run_until_complete
+    for repository in stores:
+        if isinstance(repository, KnowledgeBaseRepository):
+            loop.run_until_complete(repository.session.rollback())
+            loop.run_until_complete(repository.session.close())
+    loop.close()
+
+def test_nearest_first(store):
+    knowledge_group_id, load, run = store
+    embeddings = vectors(50)
+    data = rows(knowledge_group_id, embeddings)
+    repository = load(data)
+    results = run(repository.search(knowledge_group_id, embeddings[7].tolist(), k=5))
+    assert len(results) == 5
+    assert results[0]["id"] == data[7][0]
+    assert results[0]["similarity"] == pytest.approx(1.0, abs=1e-3)
+    assert [r["similarity"] for r in results] == sorted((r["similarity"] for r in results), reverse=True)
+    assert all(r["distance"] == pytest.approx(1 - r["similarity"], abs=1e-6) for r in results)
+
+def test_threshold(store):
+    knowledge_group_id, load, run = store
+    embeddings = vectors(20)
+    repository = load(rows(knowledge_group_id, embeddings))
+    results = run(repository.search(knowledge_group_id, embeddings[3].tolist(), k=10, threshold=0.9))
+    assert len(results) == 1
+
+def test_collapse(store):
+    knowledge_group_id, load, run = store
+    document = uuid.uuid4()
+    embeddings = vectors(1).repeat(4, axis=0) + vectors(4, seed=1) * 0.01
+    repository = load(rows(knowledge_group_id, embeddings, [document] * 3 + [uuid.uuid4()]))
+    results = run(repository.search(knowledge_group_id, embeddings[0].tolist(), k=4, collapse=True))
+    assert len(results) == 2
+    assert len({r["document_id"] for r in results}) == 2
+
+def test_content_modes(store):
+    knowledge_group_id, load, run = store
+    embeddings = vectors(3)
+    repository = load(rows(knowledge_group_id, embeddings))
+    [full] = run(repository.search(knowledge_group_id, embeddings[0].tolist(), k=1))
+    [none] = run(repository.search(knowledge_group_id, embeddings[0].tolist(), k=1, content="none"))
+    [embedded] = run(repository.search(knowledge_group_id, embeddings[0].tolist(), k=1, vectors=True))
+    assert full["content"] == "content 0"
+    assert "content" not in none
+    assert "embedding" in embedded
+
+def test_batch_search(store):
+    knowledge_group_id, load, run = store
+    embeddings = vectors(30)
+    data = rows(knowledge_group_id, embeddings)
+    repository = load(data)
+    results = run(repository.batch_search(knowledge_group_id, [embeddings[2].tolist(), embeddings[9].tolist()], k=3))
+    by_query = {}
+    for query_index, model, distance, similarity in results:
+        by_query.setdefault(query_index, []).append((similarity, model.id))
+    assert sorted(by_query) == [0, 1]
+    assert max(by_query[0])[1] == data[2][0]
+    assert max(by_query[1])[1] == data[9][0]
+    assert all(len(items) == 3 for items in by_query.values())
+
+def test_count(store):
+    knowledge_group_id, load, run = store
+    repository = load(rows(knowledge_group_id, vectors(12)))
+    assert run(repository.count(knowledge_group_id, 100)) == 12
+    assert run(repository.count(knowledge_group_id, 5)) == 5
+
+def test_rollback_discards_writes(tmp_path):
+    knowledge_group_id = uuid.uuid4()
+
+    async def write():
+        session = AsyncSession()
+        async with session.begin():
+            await NumpyVectorStore(tmp_path, dimensions=DIMENSIONS).bind(session).copy(rows(knowledge_group_id, vectors(5)))
+            assert await NumpyVectorStore(tmp_path, dimensions=DIMENSIONS).count(knowledge_group_id, 100) == 0
+            await session.rollback()
+
+    asyncio.run(write())
+    store = NumpyVectorStore(tmp_path, dimensions=DIMENSIONS)
+    assert asyncio.run(store.count(knowledge_group_id, 100)) == 0
+    assert not list((tmp_path / str(knowledge_group_id) / "pending").iterdir())
+
+def test_other_instances_see_appends(tmp_path):
+    knowledge_group_id = uuid.uuid4()
+    reader = NumpyVectorStore(tmp_path, dimensions=DIMENSIONS)
+    writer = NumpyVectorStore(tmp_path, dimensions=DIMENSIONS)
+    assert asyncio.run(reader.count(knowledge_group_id, 100)) == 0
+    asyncio.run(writer.copy(rows(knowledge_group_id, vectors(4))))
+    assert asyncio.run(reader.count(knowledge_group_id, 100)) == 4
+    asyncio.run(writer.copy(rows(knowledge_group_id, vectors(3, seed=1))))
+    assert asyncio.run(reader.count(knowledge_group_id, 100)) == 7
+
+def test_compaction_keeps_rows(tmp_path):
+    knowledge_group_id = uuid.uuid4()
+    store = NumpyVectorStore(tmp_path, dimensions=DIMENSIONS, max_segments=2)
+    for seed in range(3):
+        asyncio.run(store.copy(rows(knowledge_group_id, vectors(2, seed=seed))))
+    assert len(store.segments(knowledge_group_id)) == 1
+    assert asyncio.run(store.count(knowledge_group_id, 100)) == 6
+
+def test_float16_scores_in_chunks(tmp_path):
+    knowledge_group_id = uuid.uuid4()
+    store = NumpyVectorStore(tmp_path, dtype="float16", dimensions=DIMENSIONS, score_rows=7)
+    embeddings = vectors(40)
+    data = rows(knowledge_group_id, embeddings)
+    asyncio.run(store.copy(data))
+    results = asyncio.run(store.search(knowledge_group_id, embeddings[31].tolist(), k=3))
+    assert results[0]["id"] == data[31][0]
+    assert results[0]["similarity"] == pytest.approx(1.0, abs=1e-2)